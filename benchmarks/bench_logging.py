@@ -0,0 +1,121 @@
+"""日志开销基准：在替身服务器上批量下载，比较不同日志设置下每个请求的额外耗时
+
+    python benchmarks/bench_logging.py --items 5000
+
+模式（每个模式在单独的子进程中运行）：
+    none        关闭日志，作为基准
+    sync        改动前的设置：文件和控制台处理器在下载线程中同步写入，文件级别 DEBUG
+    queue       setup_logger：队列 + 日志线程写入，文件级别 DEBUG
+    queue-info  setup_logger --log-level INFO：逐请求的调试记录不生成
+
+每请求开销 = (下载线程的 CPU 时间 - none 的) / 请求数：只统计下载线程自己花在日志上的时间，
+写线程、日志线程和同一台机器上替身服务器的负载不计入。seconds 为批量下载的总耗时，
+drain 为下载结束后等待日志线程写完的时间。
+控制台输出到 /dev/null，不计终端的耗时。
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import resource
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MODES = ["none", "sync", "queue", "queue-info"]
+
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def configure(mode, log_dir):
+    from engine.log import LOG_FORMAT, setup_logger
+
+    os.makedirs(log_dir, exist_ok=True)
+    if mode == "none":
+        logging.disable(logging.CRITICAL)
+    elif mode == "sync":
+        logging.basicConfig(filename=os.path.join(log_dir, "sync.log"), level=logging.DEBUG, format=LOG_FORMAT,
+                            encoding="utf-8")
+        console = logging.StreamHandler()
+        console.setLevel(logging.INFO)
+        console.setFormatter(logging.Formatter(LOG_FORMAT))
+        logging.getLogger().addHandler(console)
+    else:
+        setup_logger(log_dir, logging.INFO, logging.INFO if mode == "queue-info" else logging.DEBUG)
+
+
+def child(base_url, mode, items):
+    """子进程：按 mode 设置日志后运行批量下载，输出一行 JSON 结果"""
+    with tempfile.TemporaryDirectory() as tmp:
+        # 控制台输出（StreamHandler 默认写 stderr）丢弃
+        sys.stderr = open(os.devnull, "w")
+        configure(mode, os.path.join(tmp, "logs"))
+        from engine import NovelDownloader, PixivAPI, RateLimiter
+        from engine.log import stop_logging
+        from engine.session import create_session
+
+        api = PixivAPI(base_url=base_url, session=create_session(), limiter=RateLimiter(rate=0), cache=False)
+        downloader = NovelDownloader(os.path.join(tmp, "out"), "TXT", api=api, library=False, fsync=False)
+        cpu_start = cpu_seconds()
+        thread_start = time.thread_time()
+        start = time.perf_counter()
+        result = downloader.batch_download([("novel", str(i + 1)) for i in range(items)])
+        elapsed = time.perf_counter() - start
+        thread_cpu = time.thread_time() - thread_start
+        cpu = cpu_seconds() - cpu_start
+        requests = api.session.stats.snapshot()["requests"]
+        # 下载结束后日志线程还需要写完队列中的记录
+        drain_start = time.perf_counter()
+        stop_logging()
+        drain = time.perf_counter() - drain_start
+        logging.shutdown()
+        log_bytes = sum(os.path.getsize(os.path.join(directory, name))
+                        for directory, _, names in os.walk(os.path.join(tmp, "logs")) for name in names)
+    print(json.dumps({"seconds": elapsed, "drain": drain, "cpu": cpu, "thread_cpu": thread_cpu, "requests": requests,
+                      "success": result.success, "log_mb": log_bytes / 1048576}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=5000, help="批量下载的小说数 (默认: 5000)")
+    parser.add_argument("--body-size", type=int, default=2000, help="正文字符数 (默认: 2000)")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--repeat", type=int, default=3, help="每个模式运行的次数，取下载线程 CPU 时间最少的一次 (默认: 3)")
+    parser.add_argument("--child", nargs=3, metavar=("BASE_URL", "MODE", "ITEMS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child(args.child[0], args.child[1], int(args.child[2]))
+
+    from stub_server import StubConfig, start_server
+    server, base_url = start_server(StubConfig(latency=0, body_size=args.body_size))
+    results = {}
+    try:
+        print(f"{args.items} 本小说, 正文 {args.body_size} 字符, 替身服务器无延迟, 每个模式取 {args.repeat} 次中最少的一次")
+        print(f"{'mode':>10} {'seconds':>8} {'drain s':>8} {'CPU s':>7} {'thread s':>8} {'requests':>8} "
+              f"{'log MB':>7} {'us/request':>11}")
+        # none 最先运行，之后的模式与它比较
+        for mode in ["none"] + [mode for mode in args.modes if mode != "none"]:
+            command = [sys.executable, os.path.abspath(__file__), "--child", base_url, mode, str(args.items)]
+            runs = []
+            for _ in range(args.repeat):
+                output = subprocess.run(command, capture_output=True, text=True, check=True, cwd=ROOT).stdout
+                runs.append(json.loads(output.strip().splitlines()[-1]))
+            # 取下载线程 CPU 时间最少的一次，减少机器负载的干扰
+            snap = results[mode] = min(runs, key=lambda run: run["thread_cpu"])
+            overhead = (snap["thread_cpu"] - results["none"]["thread_cpu"]) / max(1, snap["requests"]) * 1e6
+            print(f"{mode:>10} {snap['seconds']:>8.2f} {snap['drain']:>8.2f} {snap['cpu']:>7.2f} "
+                  f"{snap['thread_cpu']:>8.2f} {snap['requests']:>8} {snap['log_mb']:>7.1f} {overhead:>11.1f}")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
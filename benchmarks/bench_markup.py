@@ -0,0 +1,83 @@
+"""Pixiv 标记转换吞吐量基准：在合成的大正文上测量各格式的转换速度（MB/s）
+
+    python benchmarks/bench_markup.py --size-mb 50 --formats TXT HTML Markdown
+
+正文为中日文混排并按 --density 插入注音、链接、分页等标记；MB 按 UTF-8 编码后的输入大小计算。
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine.markup import RENDERERS, iter_markup  # noqa: E402
+
+SENTENCES = [
+    "彼は静かに窓の外を眺めていた。",
+    "雨の音だけが部屋に響いている。",
+    "「行こう」と彼女は言った。",
+    "这是一段没有任何标记的普通正文，用来模拟小说中最常见的内容。",
+    "A line with <angle> brackets & ampersands \"quoted\".",
+]
+TAGS = [
+    "[[rb:漢字 > かんじ]]",
+    "[[jumpuri:公式サイト > https://www.pixiv.net/]]",
+    "[jump:2]",
+    "[pixivimage:12345678-1]",
+]
+
+
+def corpus(size_mb, density, seed=0):
+    """生成约 size_mb MB（UTF-8）的正文；density 为每行插入行内标记的概率"""
+    rng = random.Random(seed)
+    target = int(size_mb * 1024 * 1024)
+    lines = []
+    size = 0
+    chapter = 0
+    while size < target:
+        if rng.random() < 0.002:
+            chapter += 1
+            line = f"[newpage]\n[chapter:第{chapter}章 [[rb:物語 > ものがたり]]]"
+        else:
+            line = "".join(rng.choice(SENTENCES) for _ in range(rng.randint(1, 4)))
+            if rng.random() < density:
+                cut = rng.randint(0, len(line))
+                line = line[:cut] + rng.choice(TAGS) + line[cut:]
+        lines.append(line)
+        size += len(line.encode("utf-8")) + 1
+    return "\n".join(lines)
+
+
+def measure(content, file_format, repeat):
+    """返回 (最快一次的秒数, 输出字符数)"""
+    best = None
+    for _ in range(repeat):
+        renderer = RENDERERS[file_format]()
+        start = time.perf_counter()
+        output = sum(len(chunk) for chunk in iter_markup(content, renderer))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, output
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=float, default=50)
+    parser.add_argument("--density", type=float, default=0.3, help="每行插入行内标记的概率")
+    parser.add_argument("--formats", nargs="+", default=list(RENDERERS))
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    content = corpus(args.size_mb, args.density)
+    size_mb = len(content.encode("utf-8")) / 1024 / 1024
+    print(f"正文 {size_mb:.1f} MB (UTF-8), {len(content)} 字符, 标记密度 {args.density}")
+    print(f"{'format':>9} {'seconds':>8} {'MB/s':>8} {'output/input':>13}")
+    for file_format in args.formats:
+        elapsed, output = measure(content, file_format, args.repeat)
+        print(f"{file_format:>9} {elapsed:>8.3f} {size_mb / elapsed:>8.1f} {output / len(content):>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
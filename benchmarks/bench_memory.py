@@ -0,0 +1,80 @@
+"""大正文下载的峰值内存基准：在子进程中下载一本合成的大小说，报告峰值 RSS
+
+    python benchmarks/bench_memory.py --size-mb 50 --formats TXT HTML Markdown
+
+正文为中文（UTF-8 每字 3 字节），--size-mb 为 UTF-8 编码后的正文大小。
+"""
+import os
+import sys
+import json
+import argparse
+import resource
+import subprocess
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def peak_rss_mb():
+    # Linux 上 ru_maxrss 会继承父进程（替身服务器）的峰值，优先读取本进程的 VmHWM
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss 在 Linux 上单位为 KB，macOS 上为字节
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def child(base_url, file_format, use_cache):
+    """子进程：下载一本小说并输出峰值内存"""
+    from engine import NovelDownloader, PixivAPI, RateLimiter, ResponseCache
+    from engine.session import create_session
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ResponseCache(os.path.join(tmp, "cache.sqlite3")) if use_cache else False
+        api = PixivAPI(base_url=base_url, session=create_session(), limiter=RateLimiter(rate=0), cache=cache)
+        downloader = NovelDownloader(os.path.join(tmp, "out"), file_format, api=api, library=False)
+        baseline = peak_rss_mb()
+        result = downloader.save_novel("1")
+        downloader.flush()
+        size = os.path.getsize(result.path)
+    print(json.dumps({"baseline": baseline, "peak": peak_rss_mb(), "file": size / 1024 / 1024}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=float, default=50)
+    parser.add_argument("--formats", nargs="+", default=["TXT", "HTML", "Markdown"])
+    parser.add_argument("--no-cache", action="store_true", help="不使用API缓存")
+    parser.add_argument("--child", nargs=2, metavar=("BASE_URL", "FORMAT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child(args.child[0], args.child[1], not args.no_cache)
+
+    from stub_server import StubConfig, start_server
+    body_size = int(args.size_mb * 1024 * 1024 / 3)
+    server, base_url = start_server(StubConfig(latency=0, body_size=body_size))
+    try:
+        print(f"正文 {args.size_mb:.0f} MB (UTF-8), API缓存: {'关' if args.no_cache else '开'}")
+        print(f"{'format':>9} {'file MB':>8} {'baseline MB':>12} {'peak MB':>8} {'delta MB':>9} {'x body':>7}")
+        for file_format in args.formats:
+            command = [sys.executable, os.path.abspath(__file__), "--child", base_url, file_format]
+            if args.no_cache:
+                command.append("--no-cache")
+            output = subprocess.run(command, capture_output=True, text=True, check=True, cwd=ROOT).stdout
+            snap = json.loads(output.strip().splitlines()[-1])
+            delta = snap["peak"] - snap["baseline"]
+            print(f"{file_format:>9} {snap['file']:>8.1f} {snap['baseline']:>12.1f} {snap['peak']:>8.1f} "
+                  f"{delta:>9.1f} {delta / args.size_mb:>6.1f}x")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
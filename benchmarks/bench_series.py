@@ -0,0 +1,53 @@
+"""系列并发下载基准：对比不同线程数下载同一系列的耗时
+
+    python benchmarks/bench_series.py --chapters 300 --latency 0.05 --workers 1 4 8
+"""
+import os
+import sys
+import time
+import tempfile
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine import NovelDownloader, PixivAPI, RateLimiter  # noqa: E402
+from engine.session import create_session  # noqa: E402
+from stub_server import StubConfig, start_server  # noqa: E402
+
+
+def run(base_url, workers, series_id=42):
+    session = create_session(pool_size=max(workers, 1))
+    with tempfile.TemporaryDirectory() as save_path:
+        # 基准只衡量并发本身，不限速也不使用缓存
+        api = PixivAPI(base_url=base_url, session=session, limiter=RateLimiter(rate=0), cache=False)
+        downloader = NovelDownloader(save_path, "TXT", workers=workers, api=api, library=False)
+        start = time.perf_counter()
+        result = downloader.download_series(str(series_id))
+        elapsed = time.perf_counter() - start
+    assert result.success == result.total, f"{result.total - result.success} 章下载失败"
+    return elapsed, result.total, session.stats.snapshot()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chapters", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--body-size", type=int, default=20000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    args = parser.parse_args()
+
+    server, base_url = start_server(StubConfig(args.latency, args.body_size, args.chapters))
+    try:
+        baseline = None
+        print(f"{'workers':>8} {'chapters':>9} {'seconds':>9} {'speedup':>8} {'requests':>9} {'new conns':>10}")
+        for workers in args.workers:
+            elapsed, total, stats = run(base_url, workers)
+            baseline = baseline or elapsed
+            print(f"{workers:>8} {total:>9} {elapsed:>9.2f} {baseline / elapsed:>7.1f}x "
+                  f"{stats['requests']:>9} {stats['new_connections']:>10}")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""启动时间基准：从导入 main 到主窗口第一次绘制的耗时
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --repeat 10 --budget-ms 300
+
+每次在新的子进程中启动（与双击启动程序相同，没有已导入的模块），分别记录：
+    import      导入 main（PyQt6 和界面用到的引擎模块）
+    app         创建 QApplication 并设置样式表
+    construct   创建主窗口
+    paint       从开始导入到主窗口第一次收到绘制事件
+同时检查启动过程中是否导入了 requests、aiohttp、sqlite3（它们应在第一次下载时才导入）。
+没有图形界面时（DISPLAY 未设置）使用 Qt 的 offscreen 平台。
+结果取多次运行的中位数；paint 超过 --budget-ms 时以退出码 1 结束。
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_BUDGET_MS = 300
+# 启动时不应导入的模块
+DEFERRED_MODULES = ("requests", "aiohttp", "sqlite3")
+STAGES = ("import", "app", "construct", "paint")
+
+
+def child():
+    """子进程：启动主窗口，第一次绘制后退出，输出一行 JSON 结果"""
+    start = time.perf_counter()
+    sys.path.insert(0, ROOT)
+    import main
+    imported = time.perf_counter()
+
+    from PyQt6.QtCore import QEvent, QObject, QTimer
+
+    app = main.create_application([])
+    created = time.perf_counter()
+    window = main.PixivNovelDownloader()
+    constructed = time.perf_counter()
+    # 启动时的模块在第一次绘制前记录；之后的 resume_jobs 等不计入
+    loaded = [name for name in DEFERRED_MODULES if name in sys.modules]
+    painted = []
+
+    class PaintFilter(QObject):
+        def eventFilter(self, obj, event):
+            if event.type() == QEvent.Type.Paint and not painted:
+                painted.append(time.perf_counter())
+                QTimer.singleShot(0, app.quit)
+            return False
+
+    paint_filter = PaintFilter()
+    window.installEventFilter(paint_filter)
+    window.show()
+    app.exec()
+    print(json.dumps({
+        "import": (imported - start) * 1000,
+        "app": (created - imported) * 1000,
+        "construct": (constructed - created) * 1000,
+        "paint": (painted[0] - start) * 1000,
+        "loaded": loaded,
+    }))
+
+
+def run_once(workdir):
+    env = dict(os.environ)
+    if sys.platform.startswith("linux") and not env.get("DISPLAY") and not env.get("WAYLAND_DISPLAY"):
+        env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    # 在临时目录中运行，日志和下载记录不写入程序目录
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), "--child"], capture_output=True, text=True,
+                            check=True, cwd=workdir, env=env).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="启动次数，结果取中位数 (默认: 5)")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help=f"第一次绘制的目标耗时（毫秒），超过时退出码为 1 (默认: {DEFAULT_BUDGET_MS})")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child()
+
+    runs = []
+    with tempfile.TemporaryDirectory() as workdir:
+        # 第一次运行生成 .pyc 和 Qt 的字体缓存，不计入结果
+        run_once(workdir)
+        for _ in range(args.repeat):
+            runs.append(run_once(workdir))
+
+    print(f"{args.repeat} 次启动的中位数:")
+    for stage in STAGES:
+        print(f"  {stage:<10} {statistics.median(run[stage] for run in runs):>8.1f} ms")
+    loaded = sorted({name for run in runs for name in run["loaded"]})
+    print(f"  启动时导入的下载模块: {', '.join(loaded) if loaded else '无'}")
+
+    paint = statistics.median(run["paint"] for run in runs)
+    if paint > args.budget_ms:
+        print(f"第一次绘制 {paint:.1f} ms，超过目标 {args.budget_ms:.0f} ms")
+        return 1
+    print(f"第一次绘制 {paint:.1f} ms，目标 {args.budget_ms:.0f} ms 以内")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
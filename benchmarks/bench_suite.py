@@ -0,0 +1,297 @@
+"""离线基准套件：在本地 API 替身上运行固定场景，结果写入 JSON，便于在版本之间比较
+
+    python benchmarks/bench_suite.py --output bench.json
+    python benchmarks/bench_suite.py --scenarios single series500 --error-rate 0.02 --throttle-rate 0.005
+    python benchmarks/bench_suite.py --output new.json --baseline old.json --max-regression 10
+
+场景：
+    single     单本大正文小说，重复下载 --repeat 次
+    series500  500 章的系列（线程池并发）
+    batch5000  5000 本小说的批量任务（安装了 aiohttp 时使用异步管线，否则使用同步批量下载）
+
+替身服务器在父进程中运行，每个场景在单独的子进程中下载，峰值 RSS 和 CPU 时间只统计下载进程。
+延迟为每次 HTTP 请求从限速等待开始到响应解析完成的耗时（不含排队等待并发名额和重试前的退避）；重试退避按 --retry-scale 缩短。
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import resource
+import tempfile
+import contextvars
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_memory import peak_rss_mb  # noqa: E402
+from stub_server import StubConfig, start_server  # noqa: E402
+
+RESULT_VERSION = 1
+
+# 各场景的替身服务器参数和下载参数
+SCENARIOS = {
+    "single": {"body_size": 1_000_000, "items": 1},
+    "series500": {"body_size": 20_000, "chapters": 500, "items": 500},
+    "batch5000": {"body_size": 5_000, "items": 5000},
+}
+
+# 与版本比较时的指标：(路径, 数值越大越好)
+COMPARED = [
+    (("items_per_second",), True),
+    (("latency_ms", "p50"), False),
+    (("latency_ms", "p99"), False),
+    (("peak_rss_mb",), False),
+    (("cpu_seconds",), False),
+]
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def directory_size(path):
+    total = 0
+    for directory, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(directory, name))
+    return total
+
+
+# 当前请求取得并发名额、开始限速等待的时间；异步批量中排队等待信号量的时间不计入请求延迟
+request_start = contextvars.ContextVar("request_start", default=None)
+
+
+def marked(method):
+    """在限速等待开始时记录请求开始时间"""
+    def wrapper(*args, **kwargs):
+        request_start.set(time.perf_counter())
+        return method(*args, **kwargs)
+    return wrapper
+
+
+def marked_async(method):
+    async def wrapper(*args, **kwargs):
+        request_start.set(time.perf_counter())
+        return await method(*args, **kwargs)
+    return wrapper
+
+
+def elapsed_since(start):
+    started = request_start.get()
+    request_start.set(None)
+    return time.perf_counter() - (started if started is not None else start)
+
+
+def timed(method, latencies):
+    """记录每次请求的耗时（失败的请求同样记录）"""
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            latencies.append(elapsed_since(start))
+    return wrapper
+
+
+def timed_async(method, latencies):
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await method(*args, **kwargs)
+        finally:
+            latencies.append(elapsed_since(start))
+    return wrapper
+
+
+def child(name, base_url, options):
+    """子进程：运行一个场景，输出一行 JSON 结果"""
+    from engine import NovelDownloader, PixivAPI, RateLimiter, Retrier
+    from engine.retry import DEFAULT_POLICIES, RetryPolicy
+    from engine.session import create_session
+
+    logging.basicConfig(level=logging.ERROR)
+    scenario = SCENARIOS[name]
+    scale = options["retry_scale"]
+    policies = {category: RetryPolicy(policy.max_attempts, policy.base_delay * scale, policy.max_delay * scale)
+                for category, policy in DEFAULT_POLICIES.items()}
+    latencies = []
+    api = PixivAPI(base_url=base_url, session=create_session(pool_size=max(options["workers"], options["concurrency"])),
+                   limiter=RateLimiter(rate=0), retrier=Retrier(policies), cache=False)
+    api.get_json_once = timed(api.get_json_once, latencies)
+    api.limiter.acquire = marked(api.limiter.acquire)
+    mode = "sync"
+
+    with tempfile.TemporaryDirectory() as save_path:
+        downloader = NovelDownloader(save_path, "TXT", workers=options["workers"], api=api, library=False)
+        baseline_rss = peak_rss_mb()
+        cpu_start = cpu_seconds()
+        start = time.perf_counter()
+        if name == "single":
+            items = options["repeat"]
+            success = sum(downloader.download_novel(str(i + 1)) is not None for i in range(items))
+        elif name == "series500":
+            result = downloader.download_series("42")
+            items, success = result.total, result.success
+        else:
+            content_ids = [("novel", str(i + 1)) for i in range(scenario["items"])]
+            try:
+                from engine.aio import AsyncBatchDownloader, AsyncPixivAPI, aiohttp
+            except ImportError:
+                aiohttp = None
+            if aiohttp is not None:
+                mode = "async"
+                AsyncPixivAPI.get_json_once = timed_async(AsyncPixivAPI.get_json_once, latencies)
+                api.limiter.acquire_async = marked_async(api.limiter.acquire_async)
+                result = AsyncBatchDownloader(downloader, options["concurrency"]).batch_download(content_ids)
+            else:
+                result = downloader.batch_download(content_ids)
+            items = len(result.outcomes)
+            success = sum(outcome.ok for outcome in result.outcomes)
+        elapsed = time.perf_counter() - start
+        cpu = cpu_seconds() - cpu_start
+        written = directory_size(save_path)
+
+    retries = api.retrier.snapshot()
+    print(json.dumps({
+        "mode": mode,
+        "items": items,
+        "failed": items - success,
+        "seconds": round(elapsed, 3),
+        "items_per_second": round(items / elapsed, 2),
+        "mb_per_second": round(written / 1048576 / elapsed, 2),
+        "written_mb": round(written / 1048576, 2),
+        "requests": len(latencies),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50) * 1000, 2),
+            "p99": round(percentile(latencies, 0.99) * 1000, 2),
+            "max": round(max(latencies, default=0) * 1000, 2),
+        },
+        "retries": retries["retries"],
+        "retry_budget_exhausted": retries["budget_exhausted"],
+        "throttles": api.limiter.snapshot()["throttles"],
+        "baseline_rss_mb": round(baseline_rss, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "cpu_seconds": round(cpu, 3),
+    }))
+
+
+def run_scenario(name, args):
+    scenario = SCENARIOS[name]
+    config = StubConfig(args.latency, scenario["body_size"], scenario.get("chapters", 300),
+                        error_rate=args.error_rate, throttle_rate=args.throttle_rate, retry_after=args.retry_after,
+                        seed=args.seed)
+    server, base_url = start_server(config)
+    options = {"workers": args.workers, "concurrency": args.concurrency, "repeat": args.repeat,
+               "retry_scale": args.retry_scale}
+    try:
+        command = [sys.executable, os.path.abspath(__file__), "--child", name, base_url, json.dumps(options)]
+        output = subprocess.run(command, capture_output=True, text=True, check=True, cwd=ROOT).stdout
+    finally:
+        server.shutdown()
+    result = json.loads(output.strip().splitlines()[-1])
+    result["injected"] = dict(config.injected)
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=ROOT, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def metric(result, path):
+    for key in path:
+        result = result.get(key, {}) if isinstance(result, dict) else {}
+    return result if isinstance(result, (int, float)) else None
+
+
+def compare(results, baseline, max_regression=None):
+    """打印与基准结果的差异；超过 max_regression（百分比）的退化返回 True"""
+    regressed = False
+    print(f"\n与 {baseline.get('revision') or '基准'} 比较:")
+    for name, result in results["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(name)
+        if old is None:
+            continue
+        for path, higher_is_better in COMPARED:
+            before, after = metric(old, path), metric(result, path)
+            if not before or after is None:
+                continue
+            change = (after - before) / before * 100
+            worse = -change if higher_is_better else change
+            flag = ""
+            if max_regression is not None and worse > max_regression:
+                flag = "  <-- 退化"
+                regressed = True
+            print(f"  {name:<10} {'.'.join(path):<18} {before:>10} -> {after:<10} {change:+7.1f}%{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--output", default="bench-results.json", help="结果 JSON 文件 (默认: bench-results.json)")
+    parser.add_argument("--latency", type=float, default=0.02, help="每个请求的模拟延迟（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.01, help="API 请求返回 HTTP 500 的比例")
+    parser.add_argument("--throttle-rate", type=float, default=0.001, help="API 请求返回 HTTP 429 的比例")
+    parser.add_argument("--retry-after", type=int, default=1, help="429 响应的 Retry-After 秒数")
+    parser.add_argument("--retry-scale", type=float, default=0.05, help="重试退避时间的缩放比例")
+    parser.add_argument("--workers", type=int, default=8, help="系列章节并发线程数")
+    parser.add_argument("--concurrency", type=int, default=32, help="异步批量的全局并发请求数")
+    parser.add_argument("--repeat", type=int, default=5, help="single 场景重复下载的次数")
+    parser.add_argument("--seed", type=int, default=0, help="错误注入的随机种子")
+    parser.add_argument("--baseline", help="与之前的结果 JSON 比较")
+    parser.add_argument("--max-regression", type=float, default=None,
+                        help="任一指标退化超过该百分比时以退出码 1 结束（需要 --baseline）")
+    parser.add_argument("--child", nargs=3, metavar=("SCENARIO", "BASE_URL", "OPTIONS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child(args.child[0], args.child[1], json.loads(args.child[2]))
+
+    results = {
+        "version": RESULT_VERSION,
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {key: getattr(args, key) for key in ("latency", "error_rate", "throttle_rate", "retry_after",
+                                                      "retry_scale", "workers", "concurrency", "repeat", "seed")},
+        "scenarios": {},
+    }
+    print(f"{'scenario':<10} {'mode':>5} {'items':>6} {'failed':>6} {'seconds':>8} {'items/s':>8} "
+          f"{'p50 ms':>7} {'p99 ms':>7} {'RSS MB':>7} {'CPU s':>6} {'retries':>7}")
+    for name in args.scenarios:
+        result = results["scenarios"][name] = run_scenario(name, args)
+        print(f"{name:<10} {result['mode']:>5} {result['items']:>6} {result['failed']:>6} {result['seconds']:>8} "
+              f"{result['items_per_second']:>8} {result['latency_ms']['p50']:>7} {result['latency_ms']['p99']:>7} "
+              f"{result['peak_rss_mb']:>7} {result['cpu_seconds']:>6} {sum(result['retries'].values()):>7}")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=1)
+    print(f"结果已写入: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.max_regression):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+"""本地 Pixiv Ajax API 替身，用于离线基准测试
+
+    python benchmarks/stub_server.py --port 8765 --latency 0.05
+
+提供 /ajax/novel/{id}、/ajax/novel/series/{id} 和 /ajax/novel/series_content/{id}；
+images=True 时小说带封面、上传插图和作品插图，另提供 /ajax/illust/{id}/pages 和 /img/ 下的图片。
+error_rate / throttle_rate 按比例让 API 请求返回 HTTP 500 或 429（带 Retry-After），随机数使用固定种子。
+系列 {sid} 的第 i 章（从 0 开始）ID 为 sid * 100000 + i + 1。
+"""
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+
+class StubConfig:
+    def __init__(self, latency=0.05, body_size=20000, chapters=300, etag=False, page_size=30, images=False,
+                 error_rate=0.0, throttle_rate=0.0, retry_after=1, seed=0):
+        self.latency = latency        # 每个请求的模拟延迟（秒）
+        self.body_size = body_size    # 小说正文字符数
+        self.chapters = chapters      # 每个系列的章节数
+        self.etag = etag              # 小说详情是否返回 ETag 并支持 If-None-Match
+        self.page_size = page_size    # 系列内容API每页最多返回的条数（与 Pixiv 一样忽略更大的 limit）
+        self.images = images          # 小说是否引用封面和插图（所有小说共用同一封面和作品插图）
+        self.error_rate = error_rate        # API 请求返回 HTTP 500 的比例
+        self.throttle_rate = throttle_rate  # API 请求返回 HTTP 429 的比例
+        self.retry_after = retry_after      # 429 响应的 Retry-After（整数秒）
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.injected = {"500": 0, "429": 0}
+
+    def inject(self):
+        """按比例决定是否注入错误，返回状态码或 None"""
+        if not self.error_rate and not self.throttle_rate:
+            return None
+        with self._lock:
+            value = self._random.random()
+            status = 429 if value < self.throttle_rate else (
+                500 if value < self.throttle_rate + self.error_rate else None)
+            if status is not None:
+                self.injected[str(status)] += 1
+        return status
+
+
+# 作品插图与封面内容相同，用于验证按内容去重
+ILLUST_ID = 777
+PNG_HEADER = b"\x89PNG\r\n\x1a\n"
+
+# 与小说详情中的 uploadDate 对应
+UPLOAD_TIMESTAMP = 1704034800
+
+
+def chapter_id(series_id, index):
+    return series_id * 100000 + index + 1
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # keep-alive 下响应头和正文分两次发送，关闭 Nagle 避免 40ms 的延迟确认
+    disable_nagle_algorithm = True
+    config = StubConfig()
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, data, status=200, etag=None, headers=None):
+        if etag and self.config.etag and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        payload = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        if etag and self.config.etag:
+            self.send_header("ETag", etag)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        config = self.config
+        if config.latency:
+            time.sleep(config.latency)
+
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+
+        status = config.inject() if url.path.startswith("/ajax/") else None
+        if status == 429:
+            return self.send_json({"error": True, "message": "rate limited", "body": []}, status=429,
+                                  headers={"Retry-After": str(config.retry_after)})
+        if status == 500:
+            return self.send_json({"error": True, "message": "internal error", "body": []}, status=500)
+
+        match = re.fullmatch(r"/ajax/novel/(\d+)", url.path)
+        if match:
+            novel_id = int(match.group(1))
+            # 每 40 字一行，让换行转换等格式化处理有实际工作量
+            line = "本文" * 20 + "\n"
+            content = (f"第 {novel_id} 章\n" + line * (config.body_size // len(line) + 1))[:config.body_size]
+            body = {
+                "id": str(novel_id),
+                "title": f"Chapter {novel_id}",
+                "content": content,
+                "uploadDate": "2024-01-01T00:00:00+09:00",
+            }
+            if config.images:
+                host = f"http://{self.headers['Host']}"
+                body["content"] += f"\n[uploadedimage:{novel_id}]\n[pixivimage:{ILLUST_ID}-1]\n"
+                body["coverUrl"] = f"{host}/img/cover.png"
+                body["textEmbeddedImages"] = {str(novel_id): {"urls": {"original": f"{host}/img/upload-{novel_id}.png"}}}
+            return self.send_json({"error": False, "message": "", "body": body}, etag=f'"{novel_id}-1"')
+
+        match = re.fullmatch(r"/ajax/illust/(\d+)/pages", url.path)
+        if match:
+            host = f"http://{self.headers['Host']}"
+            return self.send_json({"error": False, "message": "", "body": [
+                {"urls": {"original": f"{host}/img/illust-{match.group(1)}-p0.png"}},
+            ]})
+
+        match = re.fullmatch(r"/img/([\w-]+)\.png", url.path)
+        if match:
+            name = match.group(1)
+            payload = PNG_HEADER + (b"cover" if name == "cover" or name.startswith("illust-") else name.encode())
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        match = re.fullmatch(r"/ajax/novel/series/(\d+)", url.path)
+        if match:
+            series_id = int(match.group(1))
+            return self.send_json({"error": False, "message": "", "body": {
+                "id": str(series_id),
+                "title": f"Series {series_id}",
+                "caption": "",
+                "total": config.chapters,
+            }})
+
+        match = re.fullmatch(r"/ajax/novel/series_content/(\d+)", url.path)
+        if match:
+            series_id = int(match.group(1))
+            limit = min(int(query.get("limit", ["30"])[0]), config.page_size)
+            offset = int(query.get("offset", ["0"])[0])
+            end = min(offset + limit, config.chapters)
+            contents = [{"id": str(chapter_id(series_id, i)), "title": f"Chapter {i + 1}",
+                         "uploadTimestamp": UPLOAD_TIMESTAMP}
+                        for i in range(offset, end)]
+            return self.send_json({"error": False, "message": "", "body": {
+                "total": config.chapters,
+                "page": {"seriesContents": contents},
+            }})
+
+        self.send_json({"error": True, "message": "not found", "body": []}, status=404)
+
+
+def start_server(config=None, host="127.0.0.1", port=0):
+    """在后台线程中启动替身服务器，返回 (server, base_url)"""
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"config": config or StubConfig()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}/ajax"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pixiv Ajax API 替身服务器")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--body-size", type=int, default=20000)
+    parser.add_argument("--chapters", type=int, default=300)
+    parser.add_argument("--etag", action="store_true", help="小说详情返回 ETag 并支持条件请求")
+    parser.add_argument("--page-size", type=int, default=30, help="系列内容API每页最多返回的条数")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="API 请求返回 HTTP 500 的比例")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="API 请求返回 HTTP 429 的比例")
+    parser.add_argument("--retry-after", type=int, default=1, help="429 响应的 Retry-After 秒数")
+    args = parser.parse_args()
+    server, base_url = start_server(StubConfig(args.latency, args.body_size, args.chapters, args.etag, args.page_size,
+                                               error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+                                               retry_after=args.retry_after),
+                                    port=args.port)
+    print(f"Stub API: {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,45 @@
+"""Pixiv Novel Downloader 下载引擎（不依赖 PyQt6）
+
+包中的名字在第一次访问时才导入对应的模块：GUI 启动时只需要 Translator 和 setup_logger，
+不必先导入 requests、sqlite3 等下载时才用到的模块。
+"""
+import importlib
+
+# 名字 -> 所在的子模块
+_EXPORTS = {
+    "PixivAPI": "api", "Chapter": "api",
+    "ArchiveReader": "archive", "ArchiveStore": "archive", "get_archive_store": "archive",
+    "ResponseCache": "cache", "configure_cache": "cache", "get_cache": "cache",
+    "EpubBook": "epub",
+    "DownloadError": "errors", "InvalidResponseError": "errors",
+    "NovelDownloader": "downloader", "DownloadListener": "listener", "NovelResult": "downloader",
+    "SeriesResult": "downloader", "BatchResult": "downloader", "ItemOutcome": "downloader",
+    "DEFAULT_WORKERS": "downloader",
+    "FORMATS": "formats", "format_novel": "formats", "safe_filename": "formats",
+    "Translator": "i18n",
+    "extract_content_id": "ids", "ContentIdStream": "ids",
+    "ImageStore": "images",
+    "BatchJob": "jobs", "JobItem": "jobs",
+    "DownloadLibrary": "library", "DownloadRecord": "library", "configure_library": "library",
+    "get_library": "library",
+    "setup_logger": "log",
+    "Metrics": "metrics", "MetricsServer": "metrics", "get_metrics": "metrics",
+    "RateLimiter": "ratelimit", "get_limiter": "ratelimit",
+    "Retrier": "retry", "RetryPolicy": "retry", "RetryBudget": "retry",
+    "create_session": "session", "get_session": "session",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,428 @@
+"""基于 asyncio + aiohttp 的批量下载管线
+
+整个批量任务（单本小说 + 展开后的系列章节）在一个事件循环中执行，
+所有 HTTP 请求共享一个全局并发上限，每本小说一到达就写入磁盘。
+"""
+import time
+import asyncio
+import logging
+
+from .api import (BODY_CHUNK, NO_CACHE_HEADERS, PAGE_SIZE, Chapter, collect_chapters, caption_ids,
+                  conditional_headers, decode_json, text_decoder)
+from .cache import SERIES_TTL
+from .errors import DownloadError
+from .downloader import BatchFeed, BatchResult, ItemOutcome, finished_item, streamed
+from .jobs import INFLIGHT, DONE, FAILED
+from .metrics import get_metrics
+from .session import HEADERS, ConnectionStats
+
+try:
+    import aiohttp
+except ImportError:  # aiohttp 是可选依赖，只有异步批量模式需要
+    aiohttp = None
+
+# 全局并发请求数的默认值
+DEFAULT_CONCURRENCY = 16
+
+
+class AsyncPixivAPI:
+    """PixivAPI 的异步版本，响应检查逻辑与同步客户端共用"""
+
+    def __init__(self, api, session, semaphore):
+        self.api = api
+        self.session = session
+        self.semaphore = semaphore
+
+    async def get_json(self, path, params=None, not_found_key="invalid_response", updated=0, ttl=None, **fmt):
+        # 缓存的 SQLite 查询、解压和 JSON 解析都在线程中进行，不阻塞事件循环上的其他请求
+        key, entry, data = await asyncio.to_thread(self.api.cache_lookup, path, params, updated)
+        if data is not None:
+            return data
+        return await self.api.retrier.call_async(self.get_json_once, path, params, not_found_key, key, entry, ttl,
+                                                 **fmt)
+
+    async def get_json_once(self, path, params=None, not_found_key="invalid_response", key=None, entry=None,
+                            ttl=None, unconditional=False, **fmt):
+        url = f"{self.api.base_url}{path}"
+        logging.debug("请求API: %s %s", url, params or "")
+        limiter = self.api.limiter
+        headers = NO_CACHE_HEADERS if unconditional else conditional_headers(entry)
+        async with self.semaphore:
+            await limiter.acquire_async()
+            async with self.session.get(url, params=params, headers=headers) as response:
+                status = response.status
+                limiter.on_response(status, response.headers.get("Retry-After"))
+                text = ""
+                if status != 304:
+                    if status != 404:
+                        response.raise_for_status()
+                    # 分块读取并解码，不在 aiohttp 响应对象中缓存完整的原始字节
+                    metrics = get_metrics()
+                    size = 0
+                    with metrics.timer("body"):
+                        decoder = text_decoder(response.charset)
+                        parts = []
+                        async for chunk in response.content.iter_chunked(BODY_CHUNK):
+                            size += len(chunk)
+                            parts.append(decoder.decode(chunk))
+                        parts.append(decoder.decode(b"", final=True))
+                    metrics.add_bytes("received", size)
+                    text = "".join(parts)
+                    del parts
+                headers = response.headers
+        logging.debug("API响应状态码: %s", status)
+        # 以下在并发信号量之外进行；JSON 解析和缓存写入在线程中进行
+        if status == 304:
+            if entry is not None:
+                return await asyncio.to_thread(self.api.cache_revalidated, key, entry)
+            if not unconditional:
+                return await self.api.refetch_after_304(self.get_json_once, path, params, not_found_key, key, ttl,
+                                                        **fmt)
+        data = await asyncio.to_thread(self.api.check_response, status, lambda: decode_json(text), not_found_key,
+                                       **fmt)
+        text = None
+        await asyncio.to_thread(self.api.cache_store, key, data, headers, ttl)
+        return data
+
+    async def get_novel(self, novel_id, updated=0):
+        data = await self.get_json(f"/novel/{novel_id}", not_found_key="novel_not_found", updated=updated,
+                                   id=novel_id)
+        return data["body"]
+
+    async def get_series(self, series_id):
+        data = await self.get_json(f"/novel/series/{series_id}", not_found_key="series_not_found", ttl=SERIES_TTL,
+                                   id=series_id)
+        return data["body"]
+
+    async def get_series_page(self, series_id, offset=0, limit=PAGE_SIZE):
+        params = {"limit": limit, "offset": offset, "order": "asc"}
+        body = (await self.get_json(f"/novel/series_content/{series_id}", params=params, ttl=SERIES_TTL))["body"]
+        return body.get("total", 0), collect_chapters(body.get("page", {}).get("seriesContents", []))
+
+    async def iter_series_content(self, series_id, limit=PAGE_SIZE):
+        """与 PixivAPI.iter_series_content 相同：第一页之后的各页并发获取，按顺序生成"""
+        total, chapters = await self.get_series_page(series_id, 0, limit)
+        logging.info(f"系列总项目数: {total}")
+        yield chapters
+        if not chapters or len(chapters) >= total:
+            return
+        tasks = [asyncio.ensure_future(self.get_series_page(series_id, offset, len(chapters)))
+                 for offset in range(len(chapters), total, len(chapters))]
+        try:
+            for task in tasks:
+                yield (await task)[1]
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def iter_series_chapters(self, series_id, series_body):
+        """与 PixivAPI.iter_series_chapters 相同的三级回退"""
+        pages = self.iter_series_content(series_id)
+        try:
+            first = await pages.__anext__()
+        except Exception as e:
+            logging.warning(f"系列内容API失败，尝试其他来源: {str(e)}")
+            first = []
+        if first:
+            yield first
+            async for page in pages:
+                yield page
+            return
+        await pages.aclose()
+
+        logging.info("系列内容API未返回内容，尝试主API")
+        chapters = collect_chapters(series_body.get("seriesContents", {}).get("contents", []))
+        if not chapters:
+            chapters = [Chapter(novel_id) for novel_id in caption_ids(series_body)]
+        if chapters:
+            yield chapters
+
+
+class AsyncBatchDownloader:
+    """把整个批量输入解析成一张任务图并发执行
+
+    复用 NovelDownloader 的格式、保存路径、翻译和进度回调；
+    写文件放到线程池中进行，不阻塞事件循环。
+    """
+
+    def __init__(self, downloader, concurrency=DEFAULT_CONCURRENCY):
+        if aiohttp is None:
+            raise RuntimeError("异步批量下载需要安装 aiohttp: pip install aiohttp")
+        self.downloader = downloader
+        self.concurrency = max(1, int(concurrency))
+        self._ = downloader._
+        self.listener = downloader.listener
+
+    def batch_download(self, content_ids):
+        """同步入口，在新的事件循环中运行整个批量任务"""
+        return asyncio.run(self.run(content_ids))
+
+    async def run(self, content_ids):
+        # 迭代器（文件、标准输入）在读取线程中逐个取出，见 arriving
+        arriving = None
+        if streamed(content_ids):
+            arriving, content_ids = content_ids, []
+        # 去重，保持输入顺序
+        content_ids = list(dict.fromkeys((t, str(i)) for t, i in content_ids))
+        self.job = job = self.downloader.job
+        self.result = BatchResult(total=len(content_ids))
+        self.outcomes = []
+        known = content_ids
+        if job is not None:
+            # 按任务日志执行，已完成的条目直接计入结果
+            job.add(content_ids)
+            items = job.items()
+            known = [(item.content_type, item.content_id) for item in items]
+            self.result.total = len(items)
+            content_ids = []
+            for item in items:
+                if finished_item(item):
+                    self.result.success += 1
+                    self.outcomes.extend(self.downloader.job_outcomes(item))
+                else:
+                    content_ids.append((item.content_type, item.content_id))
+        self.pending = len(content_ids)  # 已知的下载条目数，系列展开后增加
+        self.finished = 0
+        logging.info(f"开始异步批量下载 {self.result.total} 个项目"
+                     f"{f', 其中 {self.result.success} 个已完成' if self.result.success else ''}, "
+                     f"并发数 {self.concurrency}{', 其余条目边读取边下载' if arriving is not None else ''}")
+        self.listener.on_status(self._("status_downloading"))
+        self.listener.on_progress(0)
+
+        timeout = aiohttp.ClientTimeout(total=120, connect=10)
+        connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=30)
+        async with aiohttp.ClientSession(headers=HEADERS, timeout=timeout, connector=connector,
+                                         trace_configs=[self.trace_config()]) as session:
+            self.client = AsyncPixivAPI(self.downloader.api, session, asyncio.Semaphore(self.concurrency))
+            with self.downloader.retry_scope(len(content_ids)) as budget:
+                tasks = [asyncio.create_task(self.run_item(content_type, content_id))
+                         for content_type, content_id in content_ids]
+                if arriving is not None:
+                    feed = BatchFeed(job, known, self.result, budget)
+                    async for content_type, content_id in self.arriving(arriving, feed):
+                        tasks.append(asyncio.create_task(self.run_item(content_type, content_id)))
+                await asyncio.gather(*tasks)
+                await asyncio.to_thread(self.downloader.flush)
+                self.downloader.apply_write_failures(self.result, self.outcomes)
+                self.stats.log("aiohttp")
+                self.downloader.log_stats(connections=False)
+                self.downloader.export_metrics(self.stats.snapshot())
+
+        self.result.outcomes = self.outcomes
+        self.listener.on_progress(100)
+        self.listener.on_status(self._("status_completed"))
+        self.listener.on_info(self._("batch_success", success=self.result.success, total=self.result.total))
+        logging.info(f"异步批量下载完成! 成功: {self.result.success}/{self.result.total}, "
+                     f"条目 {sum(o.ok for o in self.outcomes)}/{len(self.outcomes)}")
+        return self.result
+
+    async def arriving(self, content_ids, feed):
+        """在读取线程中迭代 content_ids（读取文件或标准输入会阻塞），需要下载的条目交给事件循环"""
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+
+        def read():
+            # 新条目加入任务日志也在读取线程中进行
+            try:
+                for key in feed(content_ids):
+                    loop.call_soon_threadsafe(queue.put_nowait, key)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, None)
+
+        reader = loop.run_in_executor(None, read)
+        while (key := await queue.get()) is not None:
+            self.pending += 1
+            yield key
+        # 读取出错时在这里抛出
+        await reader
+
+    def trace_config(self):
+        """用 aiohttp 的请求追踪统计新建连接与请求数，与同步会话的 ConnectionStats 一致；
+        同时记录建立连接和收到响应头的耗时"""
+        self.stats = ConnectionStats()
+        metrics = get_metrics()
+        trace = aiohttp.TraceConfig()
+
+        async def on_request_start(session, context, params):
+            self.stats.add_request()
+            context.request_start = time.perf_counter()
+
+        async def on_request_end(session, context, params):
+            metrics.observe("ttfb", time.perf_counter() - context.request_start)
+            metrics.add_status(params.response.status)
+
+        async def on_connection_create_start(session, context, params):
+            context.connect_start = time.perf_counter()
+
+        async def on_connection_create_end(session, context, params):
+            self.stats.add_connection()
+            metrics.observe("connect", time.perf_counter() - context.connect_start)
+
+        trace.on_request_start.append(on_request_start)
+        trace.on_request_end.append(on_request_end)
+        trace.on_connection_create_start.append(on_connection_create_start)
+        trace.on_connection_create_end.append(on_connection_create_end)
+        return trace
+
+    async def run_item(self, content_type, content_id):
+        """执行一个顶层条目，失败只记录不影响其他条目"""
+        try:
+            self.downloader.validate_id(content_id, self._)
+            if content_type == "series":
+                error = await self.run_series(content_id)
+            else:
+                await self.journal("mark", "novel", content_id, INFLIGHT)
+                outcome = await self.run_novel(content_id)
+                error = outcome.error
+                if outcome.ok:
+                    self.listener.on_saved(outcome.title, outcome.path)
+        except Exception as e:
+            error = str(e)
+            logging.error(f"内容 {content_id} 下载失败: {error}", exc_info=True)
+            self.listener.on_info(f"内容 {content_id} 下载失败: {error}")
+            self.outcomes.append(ItemOutcome(content_type, content_id, False, error=error))
+            self.item_finished(content_id)
+            await self.journal("mark", content_type, content_id, FAILED, error=error)
+        if not error:
+            self.result.success += 1
+        else:
+            self.result.failures.append((content_type, content_id, error))
+
+    async def run_novel(self, novel_id, directory=None, series_id="", updated=0, manifest=None, series_title="",
+                        book=None):
+        """下载一本小说，到达后立即写盘，返回 ItemOutcome"""
+        try:
+            saved = await asyncio.to_thread(self.downloader.downloaded, novel_id, book)
+            if saved is None:
+                novel = await self.client.get_novel(novel_id, updated)
+                saved = await asyncio.to_thread(self.downloader.write_novel, novel_id, novel, directory, manifest, book)
+                if saved.written is not None:
+                    # 等待写线程写完（不占用事件循环），清单和下载记录中才有内容的哈希
+                    await asyncio.wrap_future(saved.written)
+            outcome = ItemOutcome("novel", novel_id, True, saved.title, saved.path, series_id=series_id)
+            if manifest is not None:
+                # 清单只在事件循环线程中更新
+                self.downloader.record_chapter(manifest, Chapter(novel_id, updated=updated), saved)
+            await asyncio.to_thread(self.downloader.remember, saved, series_id, series_title)
+        except Exception as e:
+            logging.error(f"小说 {novel_id} 下载失败: {str(e)}", exc_info=True)
+            self.listener.on_info(f"小说 {novel_id} 下载失败: {str(e)}")
+            if book is not None and self.downloader.merge:
+                book.skip(novel_id)
+            outcome = ItemOutcome("novel", novel_id, False, error=str(e), series_id=series_id)
+        await self.journal("mark", "novel", novel_id, DONE if outcome.ok else FAILED, series_id,
+                           outcome.title if outcome.ok else None, outcome.path if outcome.ok else None, outcome.error)
+        self.outcomes.append(outcome)
+        self.item_finished(novel_id)
+        return outcome
+
+    async def run_series(self, series_id):
+        """展开系列，章节随目录逐页到达加入同一个并发池；返回错误信息，全部成功时为空"""
+        downloader = self.downloader
+        await self.journal("mark", "series", series_id, INFLIGHT)
+        series_title, pages = await self.series_pages(series_id)
+        series_dir = await asyncio.to_thread(downloader.series_directory, series_title)
+        manifest = await asyncio.to_thread(downloader.load_manifest, series_dir, series_id, series_title)
+        book = await asyncio.to_thread(downloader.open_book, series_dir, series_id, series_title)
+        finished = await asyncio.to_thread(downloader.job_done, series_id)
+        novel_ids = []
+        tasks = []
+        skipped = 0
+        listing_error = ""
+        try:
+            try:
+                async for page in pages:
+                    await self.journal("expand", series_id, series_title, page, complete=False)
+                    # 清单中的文件检查和归档索引查询在线程中进行
+                    skipped_novels = await asyncio.to_thread(downloader.skipped_chapters, manifest, page,
+                                                             downloader.sync, finished)
+                    submit = []
+                    for chapter, novel in zip(page, skipped_novels):
+                        novel_ids.append(chapter.id)
+                        if novel is None:
+                            submit.append(chapter)
+                            continue
+                        skipped += 1
+                        self.outcomes.append(ItemOutcome("novel", novel.novel_id, True, novel.title, novel.path,
+                                                         series_id=series_id))
+                    await self.journal("mark_many", "novel", [chapter.id for chapter in submit], INFLIGHT,
+                                       parent=series_id)
+                    if downloader.merge:
+                        book.extend([chapter.id for chapter in page])
+                    self.pending += len(submit)
+                    tasks.extend(asyncio.ensure_future(self.run_novel(chapter.id, series_dir, series_id, chapter.updated,
+                                                                      manifest, series_title, book))
+                                 for chapter in submit)
+            except Exception as e:
+                # 已经获取到的章节照常下载；系列记为失败，恢复任务时重新获取目录
+                listing_error = f"获取系列目录失败: {str(e)}"
+                logging.error(listing_error, exc_info=True)
+                self.listener.on_info(listing_error)
+            else:
+                manifest.order = list(novel_ids)
+                await self.journal("expand", series_id, series_title, [], complete=True)
+            logging.info(f"系列《{series_title}》展开为 {len(novel_ids)} 章, 需要下载 {len(tasks)} 章")
+            if skipped:
+                self.listener.on_info(self._("sync_skipped", skipped=skipped, total=len(novel_ids)))
+            outcomes = await asyncio.gather(*tasks)
+        finally:
+            await asyncio.to_thread(manifest.save)
+            titles = {outcome.content_id: outcome.title for outcome in self.outcomes
+                      if outcome.ok and outcome.series_id == series_id}
+            await asyncio.to_thread(downloader.finish_book, book, manifest, novel_ids, titles)
+        # 系列本身算一个条目，展开后由需要下载的章节代替；没有需要下载的章节时仍算一个条目
+        if tasks:
+            self.pending -= 1
+        else:
+            self.item_finished(series_id)
+        success = skipped + sum(outcome.ok for outcome in outcomes)
+        self.listener.on_info(self._("series_completed", title=series_title, success=success, total=len(novel_ids)))
+        self.listener.on_saved(f"系列: {series_title}", series_dir)
+        error = listing_error or ("" if success == len(novel_ids)
+                                  else f"{len(novel_ids) - success}/{len(novel_ids)} 章下载失败")
+        await self.journal("mark", "series", series_id, FAILED if error else DONE, title=series_title, path=series_dir,
+                           error=error)
+        return error
+
+    async def series_pages(self, series_id):
+        """返回 (系列标题, 逐页生成 [Chapter] 的异步迭代器)；任务日志中已展开的系列不再请求目录"""
+        item = await self.journal("get", "series", series_id)
+        if item is not None and item.expanded:
+            rows = await self.journal("items", series_id)
+            chapters = [Chapter(row.content_id, row.title, row.updated) for row in rows]
+            logging.info(f"从任务日志恢复系列《{item.title}》的 {len(chapters)} 章")
+            return item.title, single_page(chapters)
+
+        series = await self.client.get_series(series_id)
+        series_title = series.get("title", "未命名系列")
+        pages = self.client.iter_series_chapters(series_id, series)
+        try:
+            first = await pages.__anext__()
+        except StopAsyncIteration:
+            first = []
+        if not first:
+            raise DownloadError(f"系列《{series_title}》中没有找到有效的小说ID")
+        return series_title, chain_pages(first, pages)
+
+    async def journal(self, method, *args, **kwargs):
+        """在线程中调用任务日志的 method（SQLite 提交不阻塞事件循环）；没有任务日志时返回 None"""
+        if self.job is None:
+            return None
+        return await asyncio.to_thread(getattr(self.job, method), *args, **kwargs)
+
+    def item_finished(self, content_id):
+        self.finished += 1
+        self.listener.on_progress(int(self.finished / max(self.pending, 1) * 100))
+        self.listener.on_info(self._("batch_progress", current=self.finished, total=self.pending, id=content_id))
+
+
+async def single_page(chapters):
+    yield chapters
+
+
+async def chain_pages(first, pages):
+    """先生成已经取得的第一页，再继续生成其余各页"""
+    yield first
+    async for page in pages:
+        yield page
@@ -0,0 +1,328 @@
+import re
+import json
+import codecs
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+
+from .cache import DEFAULT_TTL, SERIES_TTL, cache_key, get_cache
+from .errors import DownloadError, InvalidResponseError
+from .log import LazyJSON
+from .metrics import get_metrics
+from .ratelimit import get_limiter
+from .retry import Retrier
+from .session import DEFAULT_TIMEOUT, get_session
+
+API_BASE = "https://www.pixiv.net/ajax"
+# 系列内容API每页条数，以及第一页之后并发获取的页数
+PAGE_SIZE = 100
+PAGE_WORKERS = 4
+# 流式读取响应体时每块的字节数
+BODY_CHUNK = 1 << 20
+# 收到没有对应缓存的 304 后重新请求时使用的请求头
+NO_CACHE_HEADERS = {"Cache-Control": "no-cache", "Pragma": "no-cache"}
+
+
+@dataclass
+class Chapter:
+    """系列目录中的一章"""
+    id: str
+    title: str = ""
+    updated: int = 0  # 最后更新时间（Unix 秒），目录未提供时为 0
+
+
+class PixivAPI:
+    """Pixiv 小说 Ajax API 客户端，不依赖任何GUI组件"""
+
+    def __init__(self, translator=None, base_url=API_BASE, session=None, timeout=DEFAULT_TIMEOUT, limiter=None,
+                 retrier=None, cache=None, page_workers=PAGE_WORKERS):
+        self._ = translator.translate if translator else (lambda key, **kwargs: key)
+        self.base_url = base_url.rstrip("/")
+        # 默认使用进程内共享的连接池会话和限速器
+        self.session = session or get_session()
+        self.limiter = limiter or get_limiter()
+        self.retrier = retrier or Retrier()
+        # cache=False 表示不使用缓存
+        self.cache = get_cache() if cache is None else (cache or None)
+        self.timeout = timeout
+        self.page_workers = max(1, page_workers)
+
+    def get_json(self, path, params=None, not_found_key="invalid_response", updated=0, ttl=None, **fmt):
+        """请求API并返回解析后的JSON；优先使用缓存，瞬时错误按重试策略自动重试
+
+        updated 为目录中给出的更新时间，缓存过期但内容未更新时仍可直接使用。
+        """
+        key, entry, data = self.cache_lookup(path, params, updated)
+        if data is not None:
+            return data
+        return self.retrier.call(self.get_json_once, path, params, not_found_key, key, entry, ttl, **fmt)
+
+    def get_json_once(self, path, params=None, not_found_key="invalid_response", key=None, entry=None, ttl=None,
+                      unconditional=False, **fmt):
+        """请求一次API，处理304、404、JSON解析错误和API错误
+
+        unconditional=True 时不带验证头，并要求中间缓存不返回 304。
+        """
+        url = f"{self.base_url}{path}"
+        logging.debug("请求API: %s %s", url, params or "")
+        self.limiter.acquire()
+        headers = NO_CACHE_HEADERS if unconditional else conditional_headers(entry)
+        # 流式读取响应体，避免 requests 同时保留分块列表和拼接后的完整正文
+        with self.session.get(url, params=params, headers=headers, timeout=self.timeout,
+                              stream=True) as response:
+            self.limiter.on_response(response.status_code, response.headers.get("Retry-After"))
+            logging.debug("API响应状态码: %s", response.status_code)
+            if response.status_code != 200:
+                # 304 和错误响应体很小，读完以便连接放回连接池
+                response.content
+            if response.status_code == 304:
+                if entry is not None:
+                    return self.cache_revalidated(key, entry)
+                if not unconditional:
+                    return self.refetch_after_304(self.get_json_once, path, params, not_found_key, key, ttl, **fmt)
+            if response.status_code != 404:
+                response.raise_for_status()
+            data = self.check_response(response.status_code,
+                                       lambda: decode_json(read_text(response)),
+                                       not_found_key, **fmt)
+            headers = response.headers
+        self.cache_store(key, data, headers, ttl)
+        return data
+
+    def cache_lookup(self, path, params=None, updated=0):
+        """查找缓存，返回 (key, entry, data)；data 不为 None 表示命中，无需请求网络"""
+        if self.cache is None:
+            return None, None, None
+        key = cache_key(path, params)
+        entry = self.cache.get(key)
+        if entry is not None:
+            if entry.fresh:
+                self.cache.record("hit")
+                logging.debug("缓存命中: %s", key)
+                return key, entry, entry.data
+            if entry.is_current(updated):
+                # 服务端不支持条件请求时，用目录中的更新时间判断内容是否变化
+                self.cache.record("date_hit")
+                self.cache.touch(key)
+                logging.debug("缓存按更新时间命中: %s", key)
+                return key, entry, entry.data
+        return key, entry, None
+
+    def cache_revalidated(self, key, entry):
+        """条件请求返回 304，继续使用缓存内容"""
+        self.cache.record("revalidated")
+        self.cache.touch(key)
+        logging.debug("缓存重新验证 (304): %s", key)
+        return entry.data
+
+    def refetch_after_304(self, get_once, path, params, not_found_key, key, ttl, **fmt):
+        """304 但没有对应的缓存内容（缓存已被清除，或由中间代理返回）：视为未命中，不带验证头重新请求"""
+        logging.debug("304 响应没有对应的缓存内容，重新请求: %s", path)
+        return get_once(path, params, not_found_key, key, None, ttl, unconditional=True, **fmt)
+
+    def cache_store(self, key, data, headers, ttl=None):
+        if self.cache is None or key is None:
+            return
+        self.cache.record("miss")
+        body = data.get("body")
+        updated = updated_timestamp(body) if isinstance(body, dict) else 0
+        self.cache.put(key, data, headers.get("ETag", ""), headers.get("Last-Modified", ""), updated, ttl)
+
+    def check_response(self, status_code, decode, not_found_key="invalid_response", **fmt):
+        """检查响应状态与结构；decode 为返回解析后JSON的函数。同步与异步客户端共用"""
+        # 检查响应内容
+        if status_code == 404:
+            error_msg = self._(not_found_key, **fmt)
+            logging.error(error_msg)
+            raise DownloadError(error_msg)
+
+        # 尝试解析JSON响应
+        try:
+            data = decode()
+        except ValueError as e:
+            # 截断的响应体会由重试策略处理，这里不记录完整堆栈
+            error_msg = self._("invalid_response")
+            logging.warning(f"{error_msg}: {str(e)}")
+            raise InvalidResponseError(error_msg)
+
+        if data.get("error"):
+            error_msg = (data.get("message") or self._("api_error"))
+            logging.error(f"API返回错误: {error_msg}")
+            raise DownloadError(error_msg)
+
+        # 检查响应结构
+        if not data.get("body"):
+            error_msg = self._("invalid_response")
+            logging.error(error_msg)
+            raise DownloadError(error_msg)
+        return data
+
+    def get_novel(self, novel_id, updated=0):
+        """获取小说详情（标题、正文等）；updated 为系列目录中的更新时间"""
+        data = self.get_json(f"/novel/{novel_id}", not_found_key="novel_not_found", updated=updated, id=novel_id)
+        # 只记录部分响应，避免日志过大；只在输出 DEBUG 日志时序列化
+        logging.debug("API响应: %s", LazyJSON(data["body"], exclude=("content",)))
+        return data["body"]
+
+    def get_illust_image(self, illust_id, page=1):
+        """插入小说的作品插图 [pixivimage:ID-页] 的原图地址"""
+        pages = self.get_json(f"/illust/{illust_id}/pages", ttl=DEFAULT_TTL)["body"]
+        if not 1 <= page <= len(pages):
+            raise DownloadError(f"作品 {illust_id} 没有第 {page} 页")
+        return pages[page - 1]["urls"]["original"]
+
+    def get_image(self, url):
+        """下载图片，返回 (字节, Content-Type)；与API请求共用限速器，瞬时错误自动重试"""
+        return self.retrier.call(self.get_image_once, url)
+
+    def get_image_once(self, url):
+        logging.debug("下载图片: %s", url)
+        self.limiter.acquire()
+        response = self.session.get(url, headers={"Accept": "image/*"}, timeout=self.timeout)
+        self.limiter.on_response(response.status_code, response.headers.get("Retry-After"))
+        response.raise_for_status()
+        get_metrics().add_bytes("received", len(response.content))
+        return response.content, response.headers.get("Content-Type", "")
+
+    def get_series(self, series_id):
+        """获取系列信息"""
+        data = self.get_json(f"/novel/series/{series_id}", not_found_key="series_not_found", ttl=SERIES_TTL,
+                             id=series_id)
+        logging.debug("完整API响应: %s", LazyJSON(data, limit=1000))
+        return data["body"]
+
+    def get_series_page(self, series_id, offset=0, limit=PAGE_SIZE):
+        """获取系列内容API的一页，返回 (总章节数, [Chapter])"""
+        params = {
+            "limit": limit,
+            "offset": offset,
+            "order": "asc"  # 确保顺序正确
+        }
+        body = self.get_json(f"/novel/series_content/{series_id}", params=params, ttl=SERIES_TTL)["body"]
+        contents = body.get("page", {}).get("seriesContents", [])
+        return body.get("total", 0), collect_chapters(contents)
+
+    def iter_series_content(self, series_id, limit=PAGE_SIZE):
+        """逐页生成系列章节 [Chapter]：第一页得到总数后并发获取其余各页，按顺序生成"""
+        total, chapters = self.get_series_page(series_id, 0, limit)
+        logging.info(f"系列总项目数: {total}")
+        yield chapters
+        if not chapters or len(chapters) >= total:
+            return
+        # 服务端可能限制每页数量，按第一页的实际条数分页
+        offsets = range(len(chapters), total, len(chapters))
+        logging.info(f"并发获取系列内容其余 {len(offsets)} 页")
+        with ThreadPoolExecutor(max_workers=min(self.page_workers, len(offsets))) as pool:
+            futures = [pool.submit(self.get_series_page, series_id, offset, len(chapters)) for offset in offsets]
+            try:
+                for future in futures:
+                    yield future.result()[1]
+            finally:
+                # 出错或调用方提前停止时不再请求剩余的页
+                for future in futures:
+                    future.cancel()
+
+    def iter_series_chapters(self, series_id, series_body):
+        """逐页生成系列章节：系列内容API（分页） -> 主API -> 描述中的ID
+
+        第一页之后的错误会抛给调用方，已经生成的章节仍然有效。
+        """
+        pages = self.iter_series_content(series_id)
+        try:
+            first = next(pages)
+        except Exception as e:
+            logging.warning(f"系列内容API失败，尝试其他来源: {str(e)}")
+            first = []
+        if first:
+            yield first
+            yield from pages
+            return
+
+        # 尝试直接使用系列API中的内容
+        logging.info("系列内容API未返回内容，尝试主API")
+        chapters = collect_chapters(series_body.get("seriesContents", {}).get("contents", []))
+        # 如果仍然没有小说ID，尝试从描述中提取
+        if not chapters:
+            chapters = [Chapter(novel_id) for novel_id in caption_ids(series_body)]
+        if chapters:
+            yield chapters
+
+
+def text_decoder(encoding=None):
+    """响应体的增量解码器：边读边解码，不保留完整的原始字节"""
+    return codecs.getincrementaldecoder(encoding or "utf-8")()
+
+
+def read_text(response):
+    """分块读取并解码 requests 响应体，耗时记为 body"""
+    metrics = get_metrics()
+    size = 0
+    with metrics.timer("body"):
+        decoder = text_decoder(response.encoding)
+        parts = []
+        for chunk in response.iter_content(BODY_CHUNK):
+            size += len(chunk)
+            parts.append(decoder.decode(chunk))
+        parts.append(decoder.decode(b"", final=True))
+    metrics.add_bytes("received", size)
+    return "".join(parts)
+
+
+def decode_json(text):
+    """解析 JSON，耗时记为 decode"""
+    with get_metrics().timer("decode"):
+        return json.loads(text)
+
+
+def conditional_headers(entry):
+    """根据缓存条目生成条件请求头"""
+    headers = {}
+    if entry is not None:
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+    return headers
+
+
+def updated_timestamp(item):
+    """条目的最后更新时间（Unix 秒）：目录项的 reuploadTimestamp / uploadTimestamp，
+    或小说详情的 reuploadDate / uploadDate；都没有时返回 0"""
+    for key in ("reuploadTimestamp", "uploadTimestamp"):
+        if item.get(key):
+            try:
+                return int(item[key])
+            except (TypeError, ValueError):
+                pass
+    for key in ("reuploadDate", "uploadDate"):
+        if item.get(key):
+            try:
+                return int(datetime.fromisoformat(str(item[key])).timestamp())
+            except ValueError:
+                pass
+    return 0
+
+
+def collect_chapters(contents):
+    """从 seriesContents 列表中提取有效的章节"""
+    chapters = []
+    for item in contents:
+        if isinstance(item, dict) and "id" in item:
+            novel_id = str(item["id"])
+            if novel_id.isdigit() and int(novel_id) > 0:
+                chapters.append(Chapter(novel_id, item.get("title", ""), updated_timestamp(item)))
+                logging.debug("添加小说ID: %s", novel_id)
+    return chapters
+
+
+def caption_ids(series_body):
+    """最后手段：从系列描述中提取可能的小说ID"""
+    logging.info("尝试从描述中提取小说ID")
+    novel_ids = []
+    # 使用正则表达式查找可能的ID
+    for id_str in re.findall(r'\b\d{7,9}\b', series_body.get("caption", "")):
+        if id_str not in novel_ids:
+            novel_ids.append(id_str)
+            logging.debug("从描述中提取小说ID: %s", id_str)
+    return novel_ids
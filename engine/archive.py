@@ -0,0 +1,266 @@
+"""归档输出：小说追加写入保存目录 archives/ 中按大小滚动的 ZIP 文件，不再每本一个文件
+
+- 每本小说是一个单独压缩（deflate）的 ZIP 条目，读取一本时只解压这一个条目
+- 当前归档超过 max_bytes 后换用下一个 novels-00002.zip ……
+- 旁边的 index.sqlite3 记录 小说ID -> (归档, 条目, 本地文件头偏移, 大小, CRC, 哈希, 更新时间)，
+  读取时直接定位到偏移，不需要解析 ZIP 的中央目录
+- ZIP 的中央目录在 flush / 换新归档时写入；进程中途退出时，已写入的条目仍可以通过索引读取，
+  下次写入时 zipfile 把新的条目和目录追加在其后
+- 同一进程中写入同一归档目录的下载任务通过 get_archive_store 共用一个 ArchiveStore，
+  同一时间只有一个条目在写入
+"""
+import os
+import re
+import time
+import zlib
+import struct
+import sqlite3
+import hashlib
+import logging
+import zipfile
+import threading
+from dataclasses import dataclass, fields
+
+from .formats import novel_extension, safe_filename
+
+ARCHIVE_DIR = "archives"
+INDEX_NAME = "index.sqlite3"
+# 单个归档的大小上限（字节），超过后换用新的归档
+DEFAULT_ARCHIVE_SIZE = 256 * 1024 * 1024
+READ_BLOCK = 1 << 20
+ARCHIVE_NAME = re.compile(r"novels-(\d+)\.zip$")
+
+
+@dataclass
+class ArchiveEntry:
+    novel_id: str
+    archive: str            # 归档文件名（相对于归档目录）
+    name: str               # ZIP 中的条目名
+    offset: int             # 本地文件头在归档中的偏移
+    size: int = 0
+    compress_size: int = 0
+    compress_type: int = zipfile.ZIP_DEFLATED
+    crc: int = 0
+    title: str = ""
+    format: str = ""
+    sha256: str = ""
+    updated: int = 0        # 小说的最后更新时间（Unix 秒）
+    added_at: float = 0.0
+
+
+COLUMNS = [f.name for f in fields(ArchiveEntry)]
+
+
+class ArchiveReader:
+    """按小说ID从归档中读取单本小说"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(directory, INDEX_NAME), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                novel_id TEXT PRIMARY KEY,
+                archive TEXT NOT NULL,
+                name TEXT NOT NULL,
+                offset INTEGER NOT NULL,
+                size INTEGER,
+                compress_size INTEGER,
+                compress_type INTEGER,
+                crc INTEGER,
+                title TEXT,
+                format TEXT,
+                sha256 TEXT,
+                updated INTEGER,
+                added_at REAL NOT NULL
+            )""")
+        self.conn.commit()
+
+    def __contains__(self, novel_id):
+        return self.get(novel_id) is not None
+
+    def __len__(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def get(self, novel_id):
+        """小说在归档中的 ArchiveEntry，没有时返回 None"""
+        with self._lock:
+            row = self.conn.execute(f"SELECT {', '.join(COLUMNS)} FROM entries WHERE novel_id = ?",
+                                    (str(novel_id),)).fetchone()
+        return ArchiveEntry(*row) if row is not None else None
+
+    def archive_path(self, entry):
+        return os.path.join(self.directory, entry.archive)
+
+    def iter_bytes(self, novel_id):
+        """逐块生成解压后的内容；只读取这一个条目的压缩数据，并校验 CRC"""
+        entry = self.get(novel_id)
+        if entry is None:
+            raise KeyError(f"归档中没有小说 {novel_id}")
+        if entry.compress_type not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            raise zipfile.BadZipFile(f"不支持的压缩方式 {entry.compress_type}: {entry.name}")
+        with open(self.archive_path(entry), "rb") as f:
+            f.seek(entry.offset)
+            header = f.read(zipfile.sizeFileHeader)
+            if len(header) != zipfile.sizeFileHeader or header[:4] != zipfile.stringFileHeader:
+                raise zipfile.BadZipFile(f"归档索引与文件不一致: {entry.archive}:{entry.offset}")
+            name_length, extra_length = struct.unpack("<HH", header[26:30])
+            f.seek(name_length + extra_length, os.SEEK_CUR)
+            decompressor = zlib.decompressobj(-15) if entry.compress_type == zipfile.ZIP_DEFLATED else None
+            crc = 0
+            remaining = entry.compress_size
+            while remaining:
+                block = f.read(min(READ_BLOCK, remaining))
+                if not block:
+                    raise zipfile.BadZipFile(f"条目数据不完整: {entry.archive}:{entry.name}")
+                remaining -= len(block)
+                data = decompressor.decompress(block) if decompressor is not None else block
+                crc = zlib.crc32(data, crc)
+                yield data
+            if decompressor is not None:
+                data = decompressor.flush()
+                crc = zlib.crc32(data, crc)
+                yield data
+        if crc != entry.crc:
+            raise zipfile.BadZipFile(f"CRC 校验失败: {entry.archive}:{entry.name}")
+
+    def read(self, novel_id):
+        """读取单本小说，返回文本"""
+        return b"".join(self.iter_bytes(novel_id)).decode("utf-8")
+
+    def extract(self, novel_id, directory="."):
+        """把单本小说解压为 directory 中的普通文件，返回文件路径"""
+        entry = self.get(novel_id)
+        if entry is None:
+            raise KeyError(f"归档中没有小说 {novel_id}")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, os.path.basename(entry.name))
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            for data in self.iter_bytes(novel_id):
+                f.write(data)
+        os.replace(tmp_path, path)
+        return path
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+class ArchiveStore(ArchiveReader):
+    """线程安全的滚动归档写入；写入一个条目时持有锁（ZIP 同一时间只能写一个条目）
+
+    锁只保护这一个实例，写入同一目录时应通过 get_archive_store 取得共享的实例。
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_ARCHIVE_SIZE):
+        super().__init__(directory)
+        self.max_bytes = max(1, int(max_bytes))
+        self._write_lock = threading.Lock()
+        self.zip = None
+        self.current = None   # 当前归档的文件名
+        self.stats = {"added": 0, "unchanged": 0, "rotated": 0}
+
+    def unchanged(self, novel_id, sha256, file_format):
+        """归档中已有内容相同的同一格式版本"""
+        entry = self.get(novel_id)
+        if entry is None or entry.sha256 != sha256 or entry.format != file_format:
+            return False
+        with self._lock:
+            self.stats["unchanged"] += 1
+        return True
+
+    def add(self, novel_id, title, chunks, file_format="TXT", updated=0):
+        """把一本小说逐块写入当前归档并登记索引，返回 (归档路径, SHA-256)"""
+        digest = hashlib.sha256()
+        name = f"{novel_id}/{safe_filename(title) or novel_id}.{novel_extension(file_format)}"
+        with self._write_lock:
+            archive = self.open_current()
+            if name in archive.NameToInfo:
+                # 同一归档中已有旧版本时用新的条目名，索引指向最新的条目
+                name = f"{novel_id}/{int(time.time() * 1000)}-{os.path.basename(name)}"
+            info = zipfile.ZipInfo(name, time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with archive.open(info, "w") as f:
+                for chunk in chunks:
+                    data = chunk.encode("utf-8")
+                    digest.update(data)
+                    f.write(data)
+            entry = ArchiveEntry(str(novel_id), self.current, name, info.header_offset, info.file_size,
+                                 info.compress_size, info.compress_type, info.CRC, title, file_format,
+                                 digest.hexdigest(), updated, time.time())
+            with self._lock:
+                self.conn.execute(f"INSERT OR REPLACE INTO entries ({', '.join(COLUMNS)}) "
+                                  f"VALUES ({', '.join('?' * len(COLUMNS))})",
+                                  tuple(getattr(entry, column) for column in COLUMNS))
+                self.conn.commit()
+                self.stats["added"] += 1
+            path = os.path.join(self.directory, self.current)
+            if archive.fp.tell() >= self.max_bytes:
+                self.close_current()
+                with self._lock:
+                    self.stats["rotated"] += 1
+        logging.debug("写入归档: %s -> %s", name, path)
+        return path, entry.sha256
+
+    def open_current(self):
+        """打开当前归档（持有写锁时调用）：继续写最后一个未满的归档，否则新建下一个"""
+        if self.zip is not None:
+            return self.zip
+        numbers = [int(m.group(1)) for m in map(ARCHIVE_NAME.match, os.listdir(self.directory)) if m]
+        last = max(numbers, default=0)
+        if last:
+            name = f"novels-{last:05d}.zip"
+            path = os.path.join(self.directory, name)
+            if os.path.getsize(path) < self.max_bytes:
+                try:
+                    self.zip = zipfile.ZipFile(path, "a", zipfile.ZIP_DEFLATED)
+                    self.current = name
+                    return self.zip
+                except zipfile.BadZipFile as e:
+                    # 归档已损坏，不再追加；其中的条目仍可以通过索引读取
+                    logging.warning(f"归档无法追加，改为写入新的归档: {path}: {str(e)}")
+        self.current = f"novels-{last + 1:05d}.zip"
+        self.zip = zipfile.ZipFile(os.path.join(self.directory, self.current), "w", zipfile.ZIP_DEFLATED)
+        logging.info(f"新建归档: {os.path.join(self.directory, self.current)}")
+        return self.zip
+
+    def close_current(self):
+        """写入当前归档的中央目录（持有写锁时调用）"""
+        if self.zip is not None:
+            self.zip.close()
+            self.zip = None
+
+    def flush(self):
+        """写入中央目录，使当前归档成为完整的 ZIP；之后的写入会重新打开它"""
+        with self._write_lock:
+            self.close_current()
+
+    def log(self):
+        with self._lock:
+            stats = dict(self.stats)
+        if any(stats.values()):
+            logging.info(f"归档统计: 写入 {stats['added']}, 内容未变化 {stats['unchanged']}, "
+                         f"换用新归档 {stats['rotated']} 次")
+
+    def close(self):
+        self.flush()
+        super().close()
+
+
+_shared_stores = {}  # 归档目录的绝对路径 -> ArchiveStore
+_shared_lock = threading.Lock()
+
+
+def get_archive_store(directory, max_bytes=DEFAULT_ARCHIVE_SIZE):
+    """返回进程内该归档目录共享的 ArchiveStore，第一次调用时创建（大小上限以创建时为准）"""
+    key = os.path.normcase(os.path.abspath(directory))
+    with _shared_lock:
+        store = _shared_stores.get(key)
+        if store is None:
+            store = _shared_stores[key] = ArchiveStore(directory, max_bytes)
+        return store
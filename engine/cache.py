@@ -0,0 +1,274 @@
+"""API 响应的本地持久缓存（SQLite，正文 zlib 压缩）
+
+- 未过期（TTL 内）的条目直接返回，不访问网络
+- 过期条目如果带有 ETag / Last-Modified，则发送条件请求，304 时继续使用
+- 服务端不支持条件请求时，用系列目录中的更新时间与缓存中小说的
+  uploadDate 比较，未更新则视为命中
+- 总大小超过上限时按最近访问时间淘汰（LRU）；读取不单独提交事务，访问时间批量写入
+"""
+import os
+import json
+import time
+import zlib
+import sqlite3
+import logging
+import threading
+from dataclasses import dataclass
+
+DEFAULT_CACHE_PATH = os.path.join("cache", "api_cache.sqlite3")
+# 小说正文很少变化；系列目录会随新章节更新，过期时间更短
+DEFAULT_TTL = 7 * 24 * 3600
+SERIES_TTL = 3600
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# 序列化和压缩时每块的字符数；长正文分段处理，不生成完整的 JSON 文本
+JSON_CHUNK = 1 << 20
+# 读取时的最近访问时间先记在内存中，最多每隔这么多秒（或写入、淘汰、关闭时）写入数据库
+ACCESS_FLUSH_INTERVAL = 30
+
+
+@dataclass
+class CacheEntry:
+    data: dict
+    etag: str
+    last_modified: str
+    updated: int
+    stored_at: float
+    ttl: float
+
+    @property
+    def fresh(self):
+        return time.time() - self.stored_at < self.ttl
+
+    def is_current(self, updated):
+        """缓存的内容不早于目录中给出的更新时间"""
+        return bool(updated) and bool(self.updated) and self.updated >= updated
+
+
+class ResponseCache:
+    """线程安全的 SQLite 响应缓存"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                updated INTEGER,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                ttl REAL NOT NULL,
+                size INTEGER NOT NULL
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at)")
+        self.conn.commit()
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        self._accessed = {}  # key -> 尚未写入的最近访问时间
+        self._last_access_flush = time.monotonic()
+        # 统计
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.date_hits = 0
+        self.stores = 0
+        self.evictions = 0
+        logging.info(f"API缓存: {path}, 已用 {self.total_bytes / 1024 / 1024:.1f} MB")
+
+    def get(self, key):
+        """返回 CacheEntry（可能已过期），不存在时返回 None"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT body, etag, last_modified, updated, stored_at, ttl FROM responses WHERE key = ?",
+                (key,)).fetchone()
+            if row is None:
+                return None
+            self._accessed[key] = time.time()
+            if time.monotonic() - self._last_access_flush >= ACCESS_FLUSH_INTERVAL:
+                self._write_accessed()
+                self.conn.commit()
+        body, etag, last_modified, updated, stored_at, ttl = row
+        try:
+            # 解压后的字节在解码完成后即释放
+            data = json.loads(zlib.decompress(body).decode("utf-8"))
+        except (zlib.error, ValueError):
+            logging.warning(f"缓存条目损坏，已忽略: {key}")
+            self.delete(key)
+            return None
+        return CacheEntry(data, etag or "", last_modified or "", updated or 0, stored_at, ttl)
+
+    def put(self, key, data, etag="", last_modified="", updated=0, ttl=None):
+        body = compress_json(data)
+        now = time.time()
+        with self._lock:
+            old = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._accessed.pop(key, None)
+            # 与这次写入一起提交，淘汰时按最新的访问时间排序
+            self._write_accessed()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, body, etag, last_modified, updated or 0, now, now, ttl or self.ttl, len(body)))
+            self.total_bytes += len(body) - (old[0] if old else 0)
+            self.stores += 1
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+            self.conn.commit()
+
+    def touch(self, key):
+        """条件请求返回 304：重新开始计算 TTL"""
+        with self._lock:
+            now = time.time()
+            self._accessed.pop(key, None)
+            self.conn.execute("UPDATE responses SET stored_at = ?, accessed_at = ? WHERE key = ?", (now, now, key))
+            self.conn.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._accessed.pop(key, None)
+            row = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if row:
+                self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.total_bytes -= row[0]
+                self.conn.commit()
+
+    def _write_accessed(self):
+        """把内存中的访问时间写入数据库，由调用方提交（调用方持有锁）"""
+        if self._accessed:
+            self.conn.executemany("UPDATE responses SET accessed_at = ? WHERE key = ?",
+                                  [(accessed_at, key) for key, accessed_at in self._accessed.items()])
+            self._accessed.clear()
+        self._last_access_flush = time.monotonic()
+
+    def _evict(self):
+        """按最近访问时间淘汰，直到低于上限的 90%（调用方持有锁）"""
+        target = self.max_bytes * 0.9
+        rows = self.conn.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall()
+        removed = []
+        for key, size in rows:
+            if self.total_bytes <= target:
+                break
+            removed.append((key,))
+            self.total_bytes -= size
+        self.conn.executemany("DELETE FROM responses WHERE key = ?", removed)
+        self.evictions += len(removed)
+        logging.info(f"API缓存淘汰 {len(removed)} 条, 当前 {self.total_bytes / 1024 / 1024:.1f} MB")
+
+    def record(self, outcome):
+        """记录一次查找结果：hit / miss / revalidated / date_hit"""
+        with self._lock:
+            if outcome == "hit":
+                self.hits += 1
+            elif outcome == "revalidated":
+                self.revalidated += 1
+            elif outcome == "date_hit":
+                self.date_hits += 1
+            else:
+                self.misses += 1
+
+    def snapshot(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.revalidated + self.date_hits
+            served = self.hits + self.revalidated + self.date_hits
+            return {"hits": self.hits, "misses": self.misses, "revalidated": self.revalidated,
+                    "date_hits": self.date_hits, "stores": self.stores, "evictions": self.evictions,
+                    "hit_ratio": round(served / lookups, 3) if lookups else 0.0,
+                    "bytes": self.total_bytes}
+
+    def log(self):
+        snap = self.snapshot()
+        logging.info(f"API缓存统计: 命中 {snap['hits']}, 按日期命中 {snap['date_hits']}, 304 {snap['revalidated']}, "
+                     f"未命中 {snap['misses']} (命中率 {snap['hit_ratio'] * 100:.1f}%), 淘汰 {snap['evictions']}, "
+                     f"大小 {snap['bytes'] / 1024 / 1024:.1f} MB")
+
+    def flush(self):
+        """写入缓冲的访问时间"""
+        with self._lock:
+            self._write_accessed()
+            self.conn.commit()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self.conn.close()
+
+
+def iter_json(value):
+    """逐块序列化 JSON；长字符串分段转义"""
+    if isinstance(value, dict):
+        yield "{"
+        for i, (key, item) in enumerate(value.items()):
+            yield (", " if i else "") + json.dumps(str(key), ensure_ascii=False) + ": "
+            yield from iter_json(item)
+        yield "}"
+    elif isinstance(value, list):
+        yield "["
+        for i, item in enumerate(value):
+            if i:
+                yield ", "
+            yield from iter_json(item)
+        yield "]"
+    elif isinstance(value, str) and len(value) > JSON_CHUNK:
+        yield '"'
+        for start in range(0, len(value), JSON_CHUNK):
+            yield json.dumps(value[start:start + JSON_CHUNK], ensure_ascii=False)[1:-1]
+        yield '"'
+    else:
+        yield json.dumps(value, ensure_ascii=False)
+
+
+def compress_json(data):
+    """序列化并 zlib 压缩，内存中只保留压缩后的结果和一块未压缩的文本"""
+    compressor = zlib.compressobj()
+    output = []
+    parts = []
+    size = 0
+    for piece in iter_json(data):
+        parts.append(piece)
+        size += len(piece)
+        if size >= JSON_CHUNK:
+            output.append(compressor.compress("".join(parts).encode("utf-8")))
+            parts = []
+            size = 0
+    output.append(compressor.compress("".join(parts).encode("utf-8")))
+    output.append(compressor.flush())
+    return b"".join(output)
+
+
+def cache_key(path, params=None):
+    if not params:
+        return path
+    return path + "?" + "&".join(f"{k}={params[k]}" for k in sorted(params))
+
+
+_shared_cache = None
+_cache_enabled = True
+_shared_lock = threading.Lock()
+
+
+def configure_cache(enabled=True, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+    """设置进程内共享缓存；enabled=False 时 get_cache 返回 None"""
+    global _shared_cache, _cache_enabled
+    with _shared_lock:
+        _cache_enabled = enabled
+        if _shared_cache is not None:
+            _shared_cache.close()
+        _shared_cache = ResponseCache(path, ttl, max_bytes) if enabled else None
+        return _shared_cache
+
+
+def get_cache():
+    """返回进程内共享的缓存，首次调用时使用默认设置创建"""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None and _cache_enabled:
+            _shared_cache = ResponseCache()
+        return _shared_cache
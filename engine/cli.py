@@ -0,0 +1,249 @@
+"""命令行入口：python -m engine {single,series,batch,sync,extract} ...
+
+不会导入 PyQt6，适合在服务器 / 定时任务中运行。
+"""
+import os
+import sys
+import json
+import time
+import logging
+import zipfile
+import argparse
+from dataclasses import asdict
+
+from .archive import ARCHIVE_DIR, DEFAULT_ARCHIVE_SIZE, INDEX_NAME as ARCHIVE_INDEX, ArchiveReader
+from .downloader import NovelDownloader, DownloadListener, DEFAULT_WORKERS, streamed
+from .formats import FORMATS
+from .i18n import Translator
+from .jobs import DEFAULT_JOB_DIR, BatchJob, input_job_path, job_path
+from .ids import ContentIdStream, extract_content_id, read_lines
+from .cache import DEFAULT_CACHE_PATH, configure_cache
+from .library import DEFAULT_LIBRARY_PATH, configure_library
+from .log import setup_logger
+from .manifest import find_manifests
+from .merge import DEFAULT_MERGE_MEMORY
+from .metrics import MetricsServer
+from .ratelimit import DEFAULT_RATE, DEFAULT_BURST, get_limiter
+from .session import DEFAULT_POOL_SIZE, get_session
+
+
+class ConsoleListener(DownloadListener):
+    """把进度信息输出到 stderr"""
+
+    def on_info(self, text):
+        print(text, file=sys.stderr)
+
+
+def write_report(path, result):
+    """每行一个条目结果（JSON Lines）"""
+    with open(path, "w", encoding="utf-8") as f:
+        for outcome in result.outcomes:
+            f.write(json.dumps(asdict(outcome), ensure_ascii=False) + "\n")
+    logging.info(f"批量结果已写入: {path}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m engine", description="Pixiv Novel Downloader (CLI)")
+    parser.add_argument("-o", "--save-path", default="downloads", help="保存目录 (默认: downloads)")
+    parser.add_argument("-f", "--format", default="TXT", choices=list(FORMATS), help="保存格式 (默认: TXT)")
+    parser.add_argument("-j", "--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"系列章节并发下载数 (默认: {DEFAULT_WORKERS})")
+    parser.add_argument("--pool-size", type=int, default=None,
+                        help=f"HTTP 连接池大小 (默认: max({DEFAULT_POOL_SIZE}, workers))")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE,
+                        help=f"每秒最多请求数，0 表示不限速 (默认: {DEFAULT_RATE})")
+    parser.add_argument("--burst", type=int, default=DEFAULT_BURST, help=f"突发请求数 (默认: {DEFAULT_BURST})")
+    parser.add_argument("--retry-budget", type=int, default=None,
+                        help="每个批量任务最多重试次数 (默认: 条目数的一半，至少 20)")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help=f"API缓存文件 (默认: {DEFAULT_CACHE_PATH})")
+    parser.add_argument("--cache-size", type=int, default=512, help="API缓存上限 MB (默认: 512)")
+    parser.add_argument("--no-cache", action="store_true", help="不使用API缓存")
+    parser.add_argument("--library", default=DEFAULT_LIBRARY_PATH,
+                        help=f"下载记录数据库 (默认: {DEFAULT_LIBRARY_PATH})")
+    parser.add_argument("--no-library", action="store_true", help="不记录下载历史")
+    parser.add_argument("--skip-downloaded", action="store_true", help="跳过下载记录中已有且文件仍在的小说")
+    parser.add_argument("--images", action="store_true",
+                        help="下载封面和插图到保存目录的 images/ 中，HTML 和 Markdown 链接到本地文件")
+    parser.add_argument("--merge", action="store_true",
+                        help="系列按目录顺序合并为一个带目录的文件（TXT / HTML / Markdown）")
+    parser.add_argument("--merge-memory", type=int, default=DEFAULT_MERGE_MEMORY // (1024 * 1024),
+                        help=f"合并时乱序章节的内存暂存上限 MB，超过时写入临时文件 "
+                             f"(默认: {DEFAULT_MERGE_MEMORY // (1024 * 1024)})")
+    parser.add_argument("--archive", action="store_true",
+                        help=f"每本小说写入保存目录 {ARCHIVE_DIR}/ 中按大小滚动的 ZIP 归档，而不是单独的文件")
+    parser.add_argument("--archive-size", type=int, default=DEFAULT_ARCHIVE_SIZE // (1024 * 1024),
+                        help=f"单个归档的大小上限 MB (默认: {DEFAULT_ARCHIVE_SIZE // (1024 * 1024)})")
+    parser.add_argument("--no-fsync", action="store_true",
+                        help="写入文件后不等待数据落盘（仍先写临时文件再重命名）")
+    parser.add_argument("--metrics", default=None,
+                        help="每次系列/批量下载结束时把阶段耗时和统计写入该 JSON 文件")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="运行期间在 127.0.0.1:端口/metrics 提供 Prometheus 文本格式的指标")
+    parser.add_argument("--job", default=None,
+                        help=f"系列/批量任务日志文件，中断后重新运行会从中断处继续 "
+                             f"(默认: 按输入内容在 {DEFAULT_JOB_DIR}/ 下生成)")
+    parser.add_argument("--no-job", action="store_true", help="不记录任务日志")
+    parser.add_argument("--lang", default="zh_cn", help="消息语言 zh_cn / en_us / ja_jp")
+    parser.add_argument("--log-dir", default="logs", help="日志目录")
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING"],
+                        help="日志文件的级别 (默认: INFO)；DEBUG 时额外记录逐请求的调试信息")
+    parser.add_argument("-q", "--quiet", action="store_true", help="不输出进度信息")
+
+    sub = parser.add_subparsers(dest="command", required=True)
+    single = sub.add_parser("single", help="下载单本小说（ID或链接）")
+    single.add_argument("target")
+    series = sub.add_parser("series", help="下载整个系列（ID或链接）")
+    series.add_argument("target")
+    series.add_argument("--sync", action="store_true", help="只下载新增或更新过的章节")
+    batch = sub.add_parser("batch", help="从文件批量下载，每行一个ID或链接，'-' 为标准输入")
+    batch.add_argument("file")
+    batch.add_argument("--sync", action="store_true", help="系列只下载新增或更新过的章节")
+    batch.add_argument("--bad-lines", default=None,
+                       help="把无法解析的行（行号和内容）写入该文件，而不是逐行输出警告")
+    sync = sub.add_parser("sync", help="同步保存目录中所有已下载的系列，只下载新增或更新过的章节")
+    for command in (batch, sync):
+        command.add_argument("--async", dest="use_async", action="store_true",
+                             help="使用 asyncio 管线并发下载整个批量任务（需要 aiohttp）")
+        command.add_argument("-c", "--concurrency", type=int, default=None,
+                             help="异步模式下的全局并发请求数 (默认: 16)")
+        command.add_argument("--report", help="把每个条目的结果以 JSON Lines 写入该文件")
+    extract = sub.add_parser("extract", help="从保存目录的归档中取出单本小说（只解压这一本）")
+    extract.add_argument("novel_ids", nargs="+")
+    extract.add_argument("-d", "--directory", default=".", help="输出目录 (默认: 当前目录)")
+    extract.add_argument("--stdout", action="store_true", help="输出到标准输出而不是文件")
+    return parser
+
+
+def open_job(args, content_ids):
+    """打开（或恢复）任务日志；--no-job 时返回 None"""
+    if args.no_job:
+        return None
+    # 同步任务每天使用新的日志，避免前一天未完成的日志让已同步的系列被跳过
+    prefix = args.command + (time.strftime("-%Y%m%d") if args.command == "sync" else "")
+    if args.job:
+        return BatchJob(args.job)
+    if not streamed(content_ids):
+        return BatchJob(job_path(content_ids, prefix=prefix))
+    # 边读取边下载：文件按内容生成日志路径；标准输入无法预先知道内容，每次使用新的日志
+    if args.file == "-":
+        return BatchJob(os.path.join(DEFAULT_JOB_DIR, f"{prefix}-stdin-{time.strftime('%Y%m%d-%H%M%S')}.sqlite3"))
+    return BatchJob(input_job_path(args.file, prefix=prefix))
+
+
+def close_job(job, rerun=True):
+    """全部完成时删除任务日志，否则保留以便下次继续；rerun 为 False 时提示用 --job 继续"""
+    if job is None:
+        return
+    if job.succeeded:
+        job.delete()
+    elif rerun:
+        job.close()
+        print(f"任务未全部完成，重新运行同样的命令将从中断处继续: {job.path}", file=sys.stderr)
+    else:
+        job.close()
+        print(f"任务未全部完成，加上 --job {job.path} 重新运行将从中断处继续", file=sys.stderr)
+
+
+def run_batch(args, downloader, content_ids):
+    """执行批量任务并写出报告，返回退出码"""
+    downloader.job = open_job(args, content_ids)
+    try:
+        if args.use_async:
+            from .aio import AsyncBatchDownloader, DEFAULT_CONCURRENCY
+            result = AsyncBatchDownloader(downloader, args.concurrency or DEFAULT_CONCURRENCY).batch_download(content_ids)
+        else:
+            result = downloader.batch_download(content_ids)
+    finally:
+        close_job(downloader.job, rerun=getattr(args, "file", None) != "-" or bool(args.job))
+    if args.report:
+        write_report(args.report, result)
+    return 0 if not result.failures else 1
+
+
+def run_extract(args):
+    """从归档中取出小说，返回退出码"""
+    directory = os.path.join(args.save_path, ARCHIVE_DIR)
+    if not os.path.exists(os.path.join(directory, ARCHIVE_INDEX)):
+        print(f"{directory} 中没有归档", file=sys.stderr)
+        return 2
+    reader = ArchiveReader(directory)
+    code = 0
+    try:
+        for novel_id in args.novel_ids:
+            try:
+                if args.stdout:
+                    for data in reader.iter_bytes(novel_id):
+                        sys.stdout.buffer.write(data)
+                    sys.stdout.buffer.flush()
+                else:
+                    print(reader.extract(novel_id, args.directory))
+            except KeyError as e:
+                print(e.args[0], file=sys.stderr)
+                code = 1
+            except (OSError, zipfile.BadZipFile) as e:
+                print(f"小说 {novel_id} 解压失败: {str(e)}", file=sys.stderr)
+                code = 1
+    finally:
+        reader.close()
+    return code
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    setup_logger(args.log_dir, logging.WARNING if args.quiet else logging.INFO, getattr(logging, args.log_level))
+    if args.command == "extract":
+        # 只读取本地归档，不需要网络会话
+        return run_extract(args)
+
+    # 先按命令行参数创建共享会话，之后所有请求复用它
+    get_session(args.pool_size or max(DEFAULT_POOL_SIZE, args.workers))
+    get_limiter(args.rate, args.burst)
+    configure_cache(not args.no_cache, args.cache, max_bytes=args.cache_size * 1024 * 1024)
+    configure_library(not args.no_library, args.library)
+    translator = Translator(args.lang)
+    _ = translator.translate
+    listener = DownloadListener() if args.quiet else ConsoleListener()
+    downloader = NovelDownloader(args.save_path, args.format, translator, listener, args.workers,
+                                 retry_budget=args.retry_budget,
+                                 sync=args.command == "sync" or getattr(args, "sync", False),
+                                 skip_downloaded=args.skip_downloaded, images=args.images,
+                                 merge=args.merge, merge_memory=args.merge_memory * 1024 * 1024,
+                                 archive=args.archive, archive_size=args.archive_size * 1024 * 1024,
+                                 fsync=not args.no_fsync, metrics_path=args.metrics)
+    metrics_server = MetricsServer(downloader.metrics_snapshot, args.metrics_port) if args.metrics_port else None
+
+    try:
+        if args.command == "sync":
+            manifests = find_manifests(args.save_path)
+            if not manifests:
+                print(f"{args.save_path} 中没有找到已下载的系列", file=sys.stderr)
+                return 2
+            logging.info(f"同步 {len(manifests)} 个系列: {args.save_path}")
+            return run_batch(args, downloader, [("series", manifest.series_id) for manifest in manifests])
+
+        if args.command == "batch":
+            # 逐行解析并去重，读到一个条目就开始下载
+            content_ids = ContentIdStream(read_lines(args.file), args.bad_lines)
+            code = run_batch(args, downloader, content_ids)
+            if not content_ids.valid:
+                print(_("no_valid_ids"), file=sys.stderr)
+                return 2
+            return code
+
+        content_type, content_id = extract_content_id(args.target, _)
+        if args.command == "series" or content_type == "series":
+            downloader.job = open_job(args, [("series", content_id)])
+            try:
+                result = downloader.download_series(content_id)
+            finally:
+                close_job(downloader.job)
+            return 0 if result.success == result.total else 1
+        downloader.download_novel(content_id)
+        return 0
+    except Exception as e:
+        logging.error(f"{_('download_failed')}: {str(e)}", exc_info=True)
+        print(f"{_('download_failed')}: {str(e)}", file=sys.stderr)
+        return 1
+    finally:
+        if metrics_server is not None:
+            metrics_server.close()
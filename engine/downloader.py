@@ -0,0 +1,739 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from functools import partial
+from itertools import chain
+
+from .api import PixivAPI, Chapter, updated_timestamp
+from .archive import ARCHIVE_DIR, DEFAULT_ARCHIVE_SIZE, get_archive_store
+from .epub import EpubBook
+from .errors import DownloadError
+from .formats import iter_novel, iter_section, novel_extension, safe_filename
+from .i18n import Translator
+from .images import DEFAULT_IMAGE_WORKERS, IMAGE_DIR, ImageStore, collect_images
+from .jobs import INFLIGHT, DONE, FAILED
+from .library import DownloadRecord, get_library
+from .listener import DownloadListener
+from .manifest import SeriesManifest, content_hash
+from .merge import DEFAULT_MERGE_MEMORY, MergedWriter, chapter_anchor, merged_path
+from .metrics import get_metrics, write_snapshot
+from .session import DEFAULT_POOL_SIZE, get_session
+from .writer import FileWriter, write_error
+
+# 系列章节并发下载的默认线程数
+DEFAULT_WORKERS = 6
+
+
+@dataclass
+class NovelResult:
+    novel_id: str
+    title: str
+    path: str
+    sha256: str = ""
+    updated: int = 0
+    unchanged: bool = False  # 内容未变化或已下载过，没有重写文件
+    author: str = ""
+    written: object = None   # 由写线程写入时为 Future，写入完成后 sha256 才确定，见 when_written
+
+
+def when_written(novel, callback):
+    """novel 的文件写入完成后以 SHA-256 调用 callback（在写线程中，已完成时立即调用）；写入失败时不调用"""
+    if novel.written is None:
+        callback(novel.sha256)
+        return
+
+    def done(future):
+        if future.exception() is None:
+            callback(future.result())
+
+    novel.written.add_done_callback(done)
+
+
+@dataclass
+class SeriesResult:
+    series_id: str
+    title: str
+    directory: str
+    success: int = 0
+    total: int = 0
+    skipped: int = 0  # 同步模式下未变化、没有重新下载的章节数
+    novel_ids: list = field(default_factory=list)
+    novels: list = field(default_factory=list)  # 与 novel_ids 对应的 NovelResult，失败的章节为 None
+
+
+@dataclass
+class ItemOutcome:
+    """批量任务中单个条目（单本小说或系列章节）的结果"""
+    content_type: str
+    content_id: str
+    ok: bool
+    title: str = ""
+    path: str = ""
+    error: str = ""
+    series_id: str = ""
+    written: object = None   # 本次运行中写线程写入该文件的 Future，见 apply_write_failures
+
+
+@dataclass
+class BatchResult:
+    success: int = 0
+    total: int = 0
+    failures: list = field(default_factory=list)  # [(类型, ID, 错误信息)]
+    outcomes: list = field(default_factory=list)  # 每本小说（含系列章节）的 ItemOutcome
+
+
+def format_hash(chunks):
+    """生成一遍格式化内容并计算哈希，耗时记为 format"""
+    with get_metrics().timer("format"):
+        return content_hash(chunks())
+
+
+class BatchFeed:
+    """批量输入为迭代器（如 ContentIdStream）时逐个接收到达的条目
+
+    任务日志中已有的条目跳过（已在日志的顺序中执行），新条目加入任务日志，并增加总数和重试预算
+    """
+
+    def __init__(self, job, known, result, budget):
+        self.job = job
+        self.known = set(known)
+        self.result = result
+        self.budget = budget
+
+    def accept(self, content_type, content_id):
+        """接收一个条目，需要下载时返回 (类型, ID)，否则返回 None"""
+        key = (content_type, str(content_id))
+        if key in self.known:
+            return None
+        if self.job is not None:
+            self.job.add([key])
+        self.result.total += 1
+        self.budget.add_items(1)
+        return key
+
+    def __call__(self, content_ids):
+        for content_type, content_id in content_ids:
+            key = self.accept(content_type, content_id)
+            if key is not None:
+                yield key
+
+
+def streamed(content_ids):
+    """content_ids 是否为逐个到达的迭代器（列表和元组一次性处理）"""
+    return not isinstance(content_ids, (list, tuple))
+
+
+def finished_item(item):
+    """任务日志中已完成的条目；写线程没有写成功（或之后被删除）的文件重新下载"""
+    return item.state == DONE and (not item.path or os.path.exists(item.path))
+
+
+class NovelDownloader:
+    """无GUI的下载引擎：获取、解析并保存小说和系列"""
+
+    def __init__(self, save_path="downloads", file_format="TXT", translator=None, listener=None,
+                 workers=DEFAULT_WORKERS, api=None, retry_budget=None, sync=False, library=None,
+                 skip_downloaded=False, job=None, images=False, image_workers=DEFAULT_IMAGE_WORKERS, merge=False,
+                 merge_memory=DEFAULT_MERGE_MEMORY, archive=False, archive_size=DEFAULT_ARCHIVE_SIZE,
+                 fsync=True, metrics_path=None):
+        self.save_path = save_path
+        self.file_format = file_format
+        self.translator = translator or Translator()
+        self._ = self.translator.translate
+        self.listener = listener or DownloadListener()
+        self.workers = max(1, int(workers))
+        # 每个批量任务的重试次数上限，None 表示按条目数自动计算
+        self.retry_budget = retry_budget
+        # 同步模式：系列只下载清单中没有或已更新的章节
+        self.sync = sync
+        # 下载记录数据库，library=False 表示不记录；skip_downloaded 时跳过已下载且文件仍在的小说
+        self.library = get_library() if library is None else (None if library is False else library)
+        self.skip_downloaded = skip_downloaded
+        # 可恢复的任务日志（BatchJob），中断后重新运行时跳过已完成的条目
+        self.job = job
+        # 下载封面和插图到保存目录的内容寻址缓存中（HTML 和 Markdown 链接到本地文件）
+        self.images = images
+        self.image_workers = max(1, int(image_workers))
+        self._image_store = None
+        self._store_lock = threading.Lock()
+        # 归档输出：每本小说写入保存目录 archives/ 中按大小滚动的 ZIP，不再单独成文件（不适用于 EPUB）
+        self.archive = bool(archive) and file_format != "EPUB"
+        self.archive_size = archive_size
+        self._archive_store = None
+        # 系列合并为一个文件（EPUB 本来就是每个系列一本书，归档输出时按单本归档）；
+        # merge_memory 为乱序章节的内存暂存上限
+        self.merge = bool(merge) and file_format != "EPUB" and not self.archive
+        self.merge_memory = merge_memory
+        # 小说文件由后台写线程原子写入，下载线程不等待磁盘；fsync=False 时不等待数据落盘
+        self.writer = FileWriter(fsync=fsync)
+        # 每次系列 / 批量下载结束时把指标快照写成 JSON
+        self.metrics = get_metrics()
+        self.metrics_path = metrics_path
+        # 连接池大小不小于并发线程数，避免线程之间争抢连接
+        self.api = api or PixivAPI(self.translator, session=get_session(max(DEFAULT_POOL_SIZE, self.workers)))
+
+    @staticmethod
+    def validate_id(content_id, _):
+        """验证ID格式，返回字符串形式的ID"""
+        content_id = str(content_id)
+        if not content_id.isdigit():
+            error_msg = _("invalid_id", id=content_id)
+            logging.error(error_msg)
+            raise ValueError(error_msg)
+        return content_id
+
+    def save_novel(self, novel_id, directory=None, updated=0, manifest=None, book=None):
+        """下载并保存单本小说，不发送进度通知；updated 为系列目录中的更新时间，book 为系列的 EPUB 或合并文件
+
+        TXT / HTML / Markdown 文件由写线程写入，调用 flush 之后才确定已写入
+        """
+        novel_id = self.validate_id(novel_id, self._)
+        existing = self.downloaded(novel_id, book)
+        if existing is not None:
+            return existing
+        return self.write_novel(novel_id, self.api.get_novel(novel_id, updated), directory, manifest, book)
+
+    def downloaded(self, novel_id, book=None):
+        """skip_downloaded 时返回已下载过（同一格式且文件仍在）的 NovelResult，否则返回 None
+
+        合并输出的章节需要正文，不跳过
+        """
+        if not self.skip_downloaded or self.library is None or novel_id not in self.library or \
+                (self.merge and book is not None):
+            return None
+        record = self.library.get(novel_id)
+        if record is None or record.format != self.file_format or not os.path.exists(record.path):
+            return None
+        logging.info(f"小说 {novel_id} 已下载，跳过: {record.path}")
+        return NovelResult(novel_id, record.title, record.path, record.sha256, record.updated, unchanged=True,
+                           author=record.author)
+
+    def remember(self, novel, series_id="", series_title=""):
+        """把下载结果加入下载记录数据库（批量写入）；由写线程写入的文件在写入完成后才记录"""
+        if self.library is None or (novel.unchanged and novel.novel_id in self.library):
+            return
+        library = self.library
+        when_written(novel, lambda sha256: library.add(DownloadRecord(
+            novel.novel_id, novel.title, series_id, series_title, novel.author, os.path.abspath(novel.path),
+            self.file_format, sha256, novel.updated)))
+
+    def write_novel(self, novel_id, novel, directory=None, manifest=None, book=None):
+        """把已获取的小说数据按设置的格式写入磁盘；内容与系列清单一致时不重写
+
+        EPUB 格式下写入系列的 book，没有 book 时单独生成一本 EPUB；合并输出时 book 为系列的 MergedWriter
+        """
+        directory = directory or self.save_path
+        novel_title = novel.get("title", "未命名小说")
+        novel_content = novel.get("content", "")
+        author = novel.get("userName", "")
+        logging.info(f"获取小说成功: 《{novel_title}》, 内容长度: {len(novel_content)} 字符")
+
+        # 根据选择的格式逐块生成并写入，内存中只保留一份正文
+        images = self.save_images(novel, directory)
+        single = None
+        if self.file_format == "EPUB":
+            if book is None:
+                os.makedirs(directory, exist_ok=True)
+                single = book = EpubBook(os.path.join(directory, f"{safe_filename(novel_title)}.epub"), novel_title,
+                                         f"urn:pixiv:novel:{novel_id}", author, novel.get("language") or "ja")
+            book.author = book.author or author
+            images = {key: book.add_image(os.path.normpath(os.path.join(directory, link)), key == "cover")
+                      for key, link in images.items()}
+        if self.merge and book is not None:
+            chunks = partial(iter_section, novel_title, novel_content, self.file_format, chapter_anchor(novel_id),
+                             images=images)
+        else:
+            chunks = partial(iter_novel, novel_title, novel_content, self.file_format, images=images)
+        if self.archive:
+            return self.archive_novel(novel_id, novel, chunks)
+        sha256 = None
+        # 合并文件每次重新拼接，内容未变化的章节也要写入
+        if manifest is not None and novel_id in manifest.chapters and not self.merge:
+            sha256 = format_hash(chunks)
+            if manifest.unchanged(novel_id, sha256, self.file_format):
+                file_path = os.path.join(directory, manifest.chapters[novel_id].path)
+                logging.info(f"小说内容未变化，跳过写入: {file_path}")
+                return NovelResult(novel_id, novel_title, file_path, sha256, updated_timestamp(novel),
+                                   unchanged=True, author=author)
+
+        written = None
+        if book is not None:
+            file_path = book.path
+            try:
+                with self.metrics.write_timer(chunks()) as timed:
+                    sha256 = book.add_chapter(novel_id, novel_title, timed)
+                if single is not None:
+                    single.finish([(novel_id, novel_title)])
+            except BaseException:
+                if single is not None:
+                    single.abort()
+                raise
+        else:
+            # 内容只在写线程中生成一遍并同时计算哈希，写入完成后填入结果；flush 时确认写入
+            file_path = os.path.join(directory, f"{safe_filename(novel_title)}.{novel_extension(self.file_format)}")
+            written = self.writer.write(file_path, chunks, len(novel_content))
+
+        logging.info(f"小说保存成功: {file_path}")
+        result = NovelResult(novel_id, novel_title, file_path, sha256 or "", updated_timestamp(novel), author=author,
+                             written=written)
+        when_written(result, partial(setattr, result, "sha256"))
+        return result
+
+    def archive_novel(self, novel_id, novel, chunks):
+        """把小说写入归档；与归档中已有的版本内容相同时不重写"""
+        store = self.archive_store()
+        novel_title = novel.get("title", "未命名小说")
+        author = novel.get("userName", "")
+        # 归档中已有这本小说时才需要先计算哈希判断是否变化；新的小说在写入时计算
+        if novel_id in store:
+            sha256 = format_hash(chunks)
+            if store.unchanged(novel_id, sha256, self.file_format):
+                file_path = store.archive_path(store.get(novel_id))
+                logging.info(f"小说内容未变化，跳过写入归档: {file_path}")
+                return NovelResult(novel_id, novel_title, file_path, sha256, updated_timestamp(novel),
+                                   unchanged=True, author=author)
+        with self.metrics.write_timer(chunks()) as timed:
+            file_path, sha256 = store.add(novel_id, novel_title, timed, self.file_format, updated_timestamp(novel))
+        logging.info(f"小说保存到归档: {file_path}")
+        return NovelResult(novel_id, novel_title, file_path, sha256, updated_timestamp(novel), author=author)
+
+    def archive_store(self):
+        """保存目录中的滚动归档，第一次需要时打开；同时运行的下载任务共用同一目录的归档"""
+        with self._store_lock:
+            if self._archive_store is None:
+                self._archive_store = get_archive_store(os.path.join(self.save_path, ARCHIVE_DIR), self.archive_size)
+            return self._archive_store
+
+    def save_images(self, novel, directory):
+        """并发下载小说的封面和插图，返回 {image_key: 相对于 directory 的链接}；单张失败时保留远程链接"""
+        # 归档中的小说没有对应的目录，不能链接到本地图片
+        if not self.images or self.file_format == "TXT" or self.archive:
+            return {}
+        refs = collect_images(novel)
+        if not refs:
+            return {}
+        store = self.image_store()
+        links = {}
+        with ThreadPoolExecutor(max_workers=min(self.image_workers, len(refs))) as pool:
+            futures = {pool.submit(self.fetch_image, store, ref): ref for ref in refs}
+            for future in as_completed(futures):
+                ref = futures[future]
+                try:
+                    path = future.result()
+                except Exception as e:
+                    logging.warning(f"图片下载失败 {ref.key}: {str(e)}")
+                    continue
+                links[ref.key] = os.path.relpath(path, directory).replace(os.sep, "/")
+        logging.info(f"小说图片: {len(links)}/{len(refs)} 张已保存到本地")
+        return links
+
+    def fetch_image(self, store, ref):
+        if ref.url:
+            return store.fetch(ref.url, self.api.get_image)
+        # 作品插图在索引中以 "pixivimage:ID-页" 记录，之后不必再请求作品信息
+        return store.fetch(ref.key, lambda _: self.api.get_image(self.api.get_illust_image(ref.illust_id, ref.page)))
+
+    def image_store(self):
+        """保存目录中的图片缓存，第一次需要时打开"""
+        with self._store_lock:
+            if self._image_store is None:
+                self._image_store = ImageStore(os.path.join(self.save_path, IMAGE_DIR))
+            return self._image_store
+
+    def series_directory(self, series_title):
+        """创建并返回系列目录"""
+        series_dir = os.path.join(self.save_path, safe_filename(series_title))
+        if not os.path.exists(series_dir):
+            os.makedirs(series_dir, exist_ok=True)
+            logging.info(f"创建系列目录: {series_dir}")
+        return series_dir
+
+    def download_novel(self, novel_id):
+        """下载单本小说并通知进度"""
+        listener = self.listener
+        logging.info(f"开始下载单本小说: ID {novel_id}")
+        listener.on_progress(0)
+        listener.on_status(self._("status_downloading"))
+        listener.on_info(self._("getting_info", id=novel_id))
+
+        result = self.save_novel(novel_id)
+        self.remember(result)
+        self.flush()
+        error = write_error(result.written)
+        if error is not None:
+            raise DownloadError(f"文件写入失败: {result.path}: {error}")
+
+        listener.on_progress(100)
+        listener.on_status(self._("status_completed"))
+        listener.on_info(self._("completed", title=result.title))
+        listener.on_saved(result.title, result.path)
+        return result
+
+    def download_series(self, series_id, sync=None):
+        """下载整个系列，单本失败不会中断整个系列
+
+        sync 为 True 时只下载系列清单中没有或已更新的章节（默认使用 self.sync）
+        """
+        series_id = self.validate_id(series_id, self._)
+        sync = self.sync if sync is None else sync
+        listener = self.listener
+        job = self.job
+        logging.info(f"开始{'同步' if sync else '下载'}系列: ID {series_id}")
+        listener.on_progress(0)
+        listener.on_status(self._("status_downloading"))
+        listener.on_info(self._("series_info", id=series_id))
+        if job is not None:
+            job.add([("series", series_id)])
+            job.mark("series", series_id, INFLIGHT)
+
+        try:
+            series_title, expected, pages = self.series_pages(series_id)
+        except Exception as e:
+            if job is not None:
+                job.mark("series", series_id, FAILED, error=str(e))
+            raise
+
+        series_dir = self.series_directory(series_title)
+        result = SeriesResult(series_id, series_title, series_dir)
+        manifest = self.load_manifest(series_dir, series_id, series_title)
+        book = self.open_book(series_dir, series_id, series_title)
+        finished = self.job_done(series_id)
+        listener.on_status(self._("series_progress", title=series_title))
+        chapters = []
+        listing_error = ""
+
+        # 目录逐页到达，每页的章节立即提交下载；进度通知和清单更新只在调用线程中进行，结果按系列顺序保存
+        with self.retry_scope(expected), ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {}
+            try:
+                try:
+                    for page in pages:
+                        if job is not None:
+                            job.expand(series_id, series_title, page, complete=False)
+                        submit = []
+                        for chapter in page:
+                            chapters.append(chapter)
+                            result.novel_ids.append(chapter.id)
+                            novel = self.skipped_chapter(manifest, chapter, sync, finished)
+                            result.novels.append(novel)
+                            if novel is None:
+                                submit.append(len(chapters) - 1)
+                            else:
+                                result.success += 1
+                                result.skipped += 1
+                        if job is not None:
+                            job.mark_many("novel", [chapters[i].id for i in submit],
+                                          INFLIGHT, parent=series_id)
+                        if self.merge:
+                            book.extend([chapter.id for chapter in page])
+                        for i in submit:
+                            futures[pool.submit(self.save_novel, chapters[i].id, series_dir, chapters[i].updated,
+                                                manifest, book)] = i
+                except Exception as e:
+                    # 已经获取到的章节照常下载；系列记为失败，恢复任务时重新获取目录
+                    listing_error = f"获取系列目录失败: {str(e)}"
+                    logging.error(listing_error, exc_info=True)
+                    listener.on_info(listing_error)
+                else:
+                    manifest.order = list(result.novel_ids)
+                    if job is not None:
+                        job.expand(series_id, series_title, [], complete=True)
+                result.total = len(chapters)
+                logging.info(f"系列中包含 {result.total} 个小说ID, 需要下载 {len(futures)} 章")
+                if result.skipped:
+                    logging.info(f"系列{'同步' if sync else '恢复'}: {result.skipped} 章未变化或已完成")
+                    listener.on_info(self._("sync_skipped", skipped=result.skipped, total=result.total))
+
+                for done, future in enumerate(as_completed(futures), 1):
+                    i = futures[future]
+                    novel_id = result.novel_ids[i]
+                    try:
+                        novel = result.novels[i] = future.result()
+                        result.success += 1
+                        self.record_chapter(manifest, chapters[i], novel)
+                        self.remember(novel, series_id, series_title)
+                        if job is not None:
+                            job.mark("novel", novel_id, DONE, series_id, novel.title, novel.path)
+                        logging.info(f"小说 {novel_id} 下载成功 ({i+1}/{result.total})")
+                        listener.on_info(self._("batch_progress", current=done, total=len(futures), id=novel_id))
+                    except Exception as e:
+                        error_msg = f"小说 {novel_id} 下载失败: {str(e)}"
+                        logging.error(error_msg, exc_info=True)
+                        listener.on_info(error_msg)
+                        if self.merge:
+                            book.skip(novel_id)
+                        if job is not None:
+                            job.mark("novel", novel_id, FAILED, series_id, error=str(e))
+                    listener.on_progress(int((done / len(futures)) * 100))
+            finally:
+                # 先等待写线程写完；写入失败的章节记为失败，不写入清单
+                self.flush()
+                for i, novel in enumerate(result.novels):
+                    error = None if novel is None else write_error(novel.written)
+                    if error is not None:
+                        result.novels[i] = None
+                        result.success -= 1
+                        manifest.chapters.pop(novel.novel_id, None)
+                        listener.on_info(f"小说 {novel.novel_id} 文件写入失败: {error}")
+                        if job is not None:
+                            job.mark("novel", novel.novel_id, FAILED, series_id, error=f"文件写入失败: {error}")
+                # 中途出错时也保存已完成的章节，下次同步不必重新下载
+                manifest.save()
+                self.finish_book(book, manifest, result.novel_ids,
+                                 {novel.novel_id: novel.title for novel in result.novels if novel is not None})
+        if futures:
+            self.log_stats()
+            self.export_metrics()
+        else:
+            logging.info(f"系列《{series_title}》没有需要下载的章节")
+
+        if job is not None:
+            failed = result.total - result.success
+            error = listing_error or (f"{failed}/{result.total} 章下载失败" if failed else "")
+            job.mark("series", series_id, FAILED if error else DONE, title=series_title, path=series_dir, error=error)
+        listener.on_progress(100)
+        listener.on_status(self._("status_completed"))
+        listener.on_info(self._("series_completed", title=series_title, success=result.success, total=result.total))
+        listener.on_saved(f"系列: {series_title}", series_dir)
+        return result
+
+    def series_pages(self, series_id):
+        """返回 (系列标题, 预计章节数, 逐页生成 [Chapter] 的迭代器)
+
+        任务日志中已展开的系列不再请求目录；否则先取得第一页，没有章节时抛出 DownloadError
+        """
+        item = self.job.get("series", series_id) if self.job is not None else None
+        if item is not None and item.expanded:
+            chapters = [Chapter(row.content_id, row.title, row.updated) for row in self.job.items(series_id)]
+            logging.info(f"从任务日志恢复系列《{item.title}》的 {len(chapters)} 章")
+            return item.title, len(chapters), iter([chapters])
+
+        series = self.api.get_series(series_id)
+        series_title = series.get("title", "未命名系列")
+        logging.info(f"获取系列成功: 《{series_title}》")
+        pages = self.api.iter_series_chapters(series_id, series)
+        first = next(pages, [])
+        if not first:
+            error_msg = f"系列《{series_title}》中没有找到有效的小说ID"
+            logging.warning(error_msg)
+            raise DownloadError(error_msg)
+        return series_title, max(series.get("total", 0), len(first)), chain([first], pages)
+
+    def job_done(self, series_id):
+        """任务日志中该系列已完成且文件仍在的章节 {小说ID: JobItem}"""
+        # EPUB 和合并文件在整个系列完成时才落盘，中断后任务日志中已完成的章节需要重新写入
+        if self.job is None or self.file_format == "EPUB" or self.merge:
+            return {}
+        return {row.content_id: row for row in self.job.items(series_id) if finished_item(row)}
+
+    def load_manifest(self, series_dir, series_id, series_title):
+        """读取系列清单，并按最新的系列目录更新标题（章节顺序在目录全部获取后更新）"""
+        manifest = SeriesManifest.load(series_dir, series_id, series_title)
+        manifest.series_id = series_id
+        manifest.title = series_title
+        return manifest
+
+    def open_book(self, series_dir, series_id, series_title):
+        """EPUB 格式下为系列打开一本书，合并输出时打开 MergedWriter（章节到达时写入），其他情况返回 None"""
+        if self.merge:
+            return MergedWriter(merged_path(series_dir, series_title, self.file_format), series_title,
+                                self.file_format, self.merge_memory)
+        if self.file_format != "EPUB":
+            return None
+        return EpubBook(os.path.join(series_dir, f"{safe_filename(series_title)}.epub"), series_title,
+                        f"urn:pixiv:series:{series_id}")
+
+    def finish_book(self, book, manifest, novel_ids, titles):
+        """按系列顺序生成目录并完成 EPUB；titles 为 {小说ID: 标题}，没有重新下载的章节从旧书中复制"""
+        if book is None:
+            return
+        if self.merge:
+            book.finish()
+            return
+        listed = set(novel_ids)
+        # 目录没有获取完整时，保留旧书中其余的章节
+        order = list(novel_ids) + [novel_id for novel_id in manifest.order if novel_id not in listed]
+        book.finish([(novel_id, titles.get(novel_id) or getattr(manifest.chapters.get(novel_id), "title", "")
+                      or novel_id) for novel_id in order])
+
+    def skipped_chapter(self, manifest, chapter, sync, finished):
+        """章节不需要下载时返回 NovelResult（同步模式下未变化，或任务日志中已完成），否则返回 None"""
+        if sync and self.archive:
+            return self.archived_chapter(chapter)
+        if sync and not self.merge and not manifest.needs_update(chapter, self.file_format):
+            record = manifest.chapters[chapter.id]
+            return NovelResult(chapter.id, record.title, os.path.join(manifest.series_dir, record.path),
+                               record.sha256, record.updated, unchanged=True)
+        row = finished.get(chapter.id)
+        if row is not None:
+            return NovelResult(row.content_id, row.title, row.path or manifest.series_dir, unchanged=True)
+        return None
+
+    def skipped_chapters(self, manifest, chapters, sync, finished):
+        """对一页章节逐个调用 skipped_chapter，返回与 chapters 对应的列表"""
+        return [self.skipped_chapter(manifest, chapter, sync, finished) for chapter in chapters]
+
+    def archived_chapter(self, chapter):
+        """归档输出的同步：归档中已有同一格式、且不早于目录中更新时间的版本时返回 NovelResult"""
+        store = self.archive_store()
+        entry = store.get(chapter.id)
+        if entry is None or entry.format != self.file_format or not chapter.updated or entry.updated < chapter.updated:
+            return None
+        return NovelResult(chapter.id, entry.title, store.archive_path(entry), entry.sha256, entry.updated,
+                           unchanged=True)
+
+    def record_chapter(self, manifest, chapter, novel):
+        """把下载结果写入系列清单（只在调用线程中调用）；由写线程写入的章节在写入完成后填入哈希"""
+        # 合并输出记为不同的格式，之后改回逐章输出时重新下载各章
+        manifest.record(novel.novel_id, novel.title, max(chapter.updated, novel.updated),
+                        novel.path, novel.sha256, f"{self.file_format}-merged" if self.merge else self.file_format)
+        when_written(novel, partial(setattr, manifest.chapters[novel.novel_id], "sha256"))
+
+    def batch_download(self, content_ids):
+        """批量下载 [(类型, ID)]，单项失败只记录不中断
+
+        设置了任务日志时，content_ids 加入日志后按日志中的全部条目执行，已完成的条目直接跳过。
+        content_ids 也可以是迭代器（如从文件或标准输入读取的 ContentIdStream）：先执行任务日志中
+        已有的条目，之后读到一个条目就下载一个，总数随之增加
+        """
+        listener = self.listener
+        job = self.job
+        finished = {}
+        arriving = ()
+        if streamed(content_ids):
+            arriving, content_ids = content_ids, []
+        if job is not None:
+            job.add(content_ids)
+            items = job.items()
+            content_ids = [(item.content_type, item.content_id) for item in items]
+            finished = {(item.content_type, item.content_id): item for item in items if finished_item(item)}
+        result = BatchResult(total=len(content_ids))
+        logging.info(f"开始批量下载 {result.total} 个项目" + (f", 其中 {len(finished)} 个已完成" if finished else "")
+                     + (", 其余条目边读取边下载" if arriving else ""))
+
+        with self.retry_scope(result.total - len(finished)) as budget:
+            feed = BatchFeed(job, content_ids, result, budget)
+            for i, (content_type, content_id) in enumerate(chain(content_ids, feed(arriving))):
+                listener.on_progress(int((i / result.total) * 100))
+                listener.on_info(self._("batch_progress", current=i+1, total=result.total, id=content_id))
+                if (content_type, content_id) in finished:
+                    result.success += 1
+                    result.outcomes.extend(self.job_outcomes(finished[content_type, content_id]))
+                    continue
+                try:
+                    logging.info(f"下载项目 {i+1}/{result.total}: 类型 '{content_type}', ID '{content_id}'")
+                    if content_type == "series":
+                        series = self.download_series(content_id)
+                        for novel_id, novel in zip(series.novel_ids, series.novels):
+                            result.outcomes.append(
+                                ItemOutcome("novel", novel_id, True, novel.title, novel.path, series_id=content_id)
+                                if novel else ItemOutcome("novel", novel_id, False, error="下载失败", series_id=content_id))
+                    else:
+                        if job is not None:
+                            job.mark("novel", content_id, INFLIGHT)
+                        novel = self.save_novel(content_id)
+                        self.remember(novel)
+                        if job is not None:
+                            job.mark("novel", content_id, DONE, title=novel.title, path=novel.path)
+                        result.outcomes.append(ItemOutcome("novel", novel.novel_id, True, novel.title, novel.path,
+                                                           written=novel.written))
+                        listener.on_saved(novel.title, novel.path)
+                    result.success += 1
+                    logging.info(f"项目 {i+1}/{result.total} 下载成功")
+                except Exception as e:
+                    error_msg = f"内容 {content_id} 下载失败: {str(e)}"
+                    logging.error(error_msg, exc_info=True)
+                    listener.on_info(error_msg)
+                    if job is not None and content_type != "series":
+                        job.mark(content_type, content_id, FAILED, error=str(e))
+                    result.failures.append((content_type, content_id, str(e)))
+                    result.outcomes.append(ItemOutcome(content_type, str(content_id), False, error=str(e)))
+            self.flush()
+            self.apply_write_failures(result, result.outcomes)
+            self.log_stats()
+            self.export_metrics()
+
+        listener.on_progress(100)
+        listener.on_status(self._("status_completed"))
+        listener.on_info(self._("batch_success", success=result.success, total=result.total))
+        logging.info(f"批量下载完成! 成功: {result.success}/{result.total}")
+        return result
+
+    def job_outcomes(self, item):
+        """任务日志中已完成的顶层条目对应的 ItemOutcome"""
+        if item.content_type != "series":
+            return [ItemOutcome(item.content_type, item.content_id, True, item.title, item.path)]
+        return [ItemOutcome("novel", row.content_id, row.state == DONE, row.title, row.path, row.error,
+                            series_id=item.content_id)
+                for row in self.job.items(item.content_id)]
+
+    def apply_write_failures(self, result, outcomes):
+        """flush 之后调用：写线程写入失败的文件对应的条目改为失败，任务日志中同样标记，恢复时重新下载"""
+        for outcome in outcomes:
+            error = write_error(outcome.written) if outcome.ok else None
+            if error is None:
+                continue
+            outcome.ok = False
+            outcome.error = f"文件写入失败: {error}"
+            self.listener.on_info(f"小说 {outcome.content_id} {outcome.error}")
+            if self.job is not None:
+                self.job.mark(outcome.content_type, outcome.content_id, FAILED, outcome.series_id, error=outcome.error)
+            if not outcome.series_id:
+                result.success -= 1
+                result.failures.append((outcome.content_type, outcome.content_id, outcome.error))
+
+    def flush(self):
+        """等待写线程写完全部文件，写入缓冲的下载记录、缓存访问时间和当前归档的 ZIP 目录"""
+        self.writer.close()
+        if self.library is not None:
+            self.library.flush()
+        if self.api.cache is not None:
+            self.api.cache.flush()
+        if self._archive_store is not None:
+            self._archive_store.flush()
+
+    def retry_scope(self, count):
+        """为一次系列或批量下载设置重试预算"""
+        return self.api.retrier.budget_scope(count, self.retry_budget)
+
+    def metrics_snapshot(self, connections=None):
+        """阶段耗时、状态码、字节数和各组件统计的快照；connections 为异步管线自己的连接统计"""
+        snapshot = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z")}
+        snapshot.update(self.metrics.snapshot())
+        snapshot["connections"] = connections or self.api.session.stats.snapshot()
+        snapshot["cache"] = self.api.cache.snapshot() if self.api.cache is not None else {}
+        snapshot["retries"] = self.api.retrier.snapshot()
+        snapshot["rate_limit"] = self.api.limiter.snapshot()
+        snapshot["writer"] = dict(self.writer.stats)
+        if self._image_store is not None:
+            snapshot["images"] = dict(self._image_store.stats)
+        if self._archive_store is not None:
+            snapshot["archive"] = dict(self._archive_store.stats)
+        return snapshot
+
+    def export_metrics(self, connections=None):
+        """设置了 metrics_path 时写入指标快照"""
+        if not self.metrics_path:
+            return
+        try:
+            write_snapshot(self.metrics_path, self.metrics_snapshot(connections))
+        except OSError as e:
+            logging.warning(f"指标快照写入失败: {self.metrics_path}: {str(e)}")
+
+    def log_stats(self, connections=True):
+        """记录连接、限速、重试和缓存统计；异步管线自己记录连接统计"""
+        if connections:
+            self.api.session.stats.log()
+        self.metrics.log()
+        self.api.limiter.log()
+        self.api.retrier.log()
+        if self.api.cache is not None:
+            self.api.cache.log()
+        if self._image_store is not None:
+            self._image_store.log()
+        if self._archive_store is not None:
+            self._archive_store.log()
+        self.writer.log()
@@ -0,0 +1,226 @@
+"""EPUB 输出：单本小说或整个系列写成一本 EPUB 3
+
+- 章节文档（XHTML）和图片在到达时直接写入 ZIP 条目，不在内存中组装整本书
+- 目录（nav.xhtml 和 toc.ncx）、content.opf 在最后按系列顺序生成
+- 重新同步系列时，新书写到临时文件，未重新下载的章节和图片从旧书中按原始压缩数据
+  复制，不解压也不重新压缩；完成后替换旧书
+"""
+import os
+import re
+import copy
+import time
+import struct
+import hashlib
+import logging
+import zipfile
+import threading
+
+from .markup import escape_html
+
+MEDIA_TYPES = {
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+    "gif": "image/gif",
+    "webp": "image/webp",
+}
+
+CONTAINER = """<?xml version="1.0" encoding="utf-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+<rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/></rootfiles>
+</container>
+"""
+
+# 每次生成的元数据文件，不从旧书复制
+GENERATED = {"mimetype", "META-INF/container.xml", "OEBPS/content.opf", "OEBPS/nav.xhtml", "OEBPS/toc.ncx",
+             "OEBPS/cover.xhtml"}
+CHAPTER_DIR = "OEBPS/text/"
+IMAGE_DIR = "OEBPS/images/"
+COPY_BLOCK = 1 << 20
+
+
+def chapter_entry(novel_id):
+    return f"{CHAPTER_DIR}{novel_id}.xhtml"
+
+
+def copy_raw(source, target, info):
+    """把 source 中的条目按原始压缩数据追加到 target，不解压也不重新压缩
+
+    zipfile 没有公开这个操作：按本地文件头定位压缩数据，写入新的本地文件头和数据，
+    再登记到 target 的中央目录（与 ZipFile.write 登记条目的方式相同）。
+    """
+    source.fp.seek(info.header_offset)
+    header = source.fp.read(zipfile.sizeFileHeader)
+    name_length, extra_length = struct.unpack("<HH", header[26:30])
+    source.fp.seek(info.header_offset + zipfile.sizeFileHeader + name_length + extra_length)
+
+    entry = copy.copy(info)
+    entry.flag_bits &= ~0x08  # 大小和 CRC 直接写在本地文件头中，不再使用数据描述符
+    entry.extra = b""
+    entry.header_offset = target.fp.tell()
+    target.fp.write(entry.FileHeader())
+    remaining = info.compress_size
+    while remaining:
+        block = source.fp.read(min(COPY_BLOCK, remaining))
+        if not block:
+            raise zipfile.BadZipFile(f"条目数据不完整: {info.filename}")
+        target.fp.write(block)
+        remaining -= len(block)
+    target.filelist.append(entry)
+    target.NameToInfo[entry.filename] = entry
+    target.start_dir = target.fp.tell()
+    target._didModify = True
+
+
+class EpubBook:
+    """逐章写入的 EPUB；add_chapter / add_image 可以在多个线程中调用"""
+
+    def __init__(self, path, title, book_id, author="", language="ja"):
+        self.path = path
+        self.title = title
+        self.book_id = book_id
+        self.author = author
+        self.language = language
+        self.cover = None     # 封面图片的条目名
+        self._lock = threading.Lock()
+        self._titles = {}     # 本次写入的章节: 小说ID -> 标题
+        self.tmp_path = path + ".tmp"
+        self.zip = zipfile.ZipFile(self.tmp_path, "w", zipfile.ZIP_DEFLATED)
+        # mimetype 必须是第一个条目且不压缩
+        self.zip.writestr(zipfile.ZipInfo("mimetype"), "application/epub+zip", compress_type=zipfile.ZIP_STORED)
+        self.zip.writestr("META-INF/container.xml", CONTAINER)
+
+    def add_chapter(self, novel_id, title, chunks):
+        """逐块写入章节文档，返回与 content_hash 相同的 SHA-256"""
+        digest = hashlib.sha256()
+        name = chapter_entry(novel_id)
+        with self._lock:
+            if name in self.zip.NameToInfo:
+                logging.warning(f"EPUB 中已有章节 {novel_id}，跳过重复的章节")
+                return ""
+            info = zipfile.ZipInfo(name, time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with self.zip.open(info, "w") as f:
+                for chunk in chunks:
+                    digest.update(chunk.encode("utf-8"))
+                    f.write(chunk.encode("utf-8"))
+            self._titles[novel_id] = title
+        return digest.hexdigest()
+
+    def add_image(self, path, cover=False):
+        """把本地图片加入书中（已压缩的图片不再压缩），返回章节文档中使用的链接"""
+        name = IMAGE_DIR + os.path.basename(path)
+        with self._lock:
+            if name not in self.zip.NameToInfo:
+                self.zip.write(path, name, compress_type=zipfile.ZIP_STORED)
+            if cover and self.cover is None:
+                self.cover = name
+        return "../images/" + os.path.basename(path)
+
+    def finish(self, chapters):
+        """按 [(小说ID, 标题)] 的顺序生成目录并完成写入，替换旧书；返回书中的章节数"""
+        with self._lock:
+            old = self.open_previous()
+            try:
+                if old is not None:
+                    self.copy_previous(old, {novel_id for novel_id, _ in chapters})
+            finally:
+                if old is not None:
+                    old.close()
+            toc = [(novel_id, self._titles.get(novel_id) or title) for novel_id, title in chapters
+                   if chapter_entry(novel_id) in self.zip.NameToInfo]
+            missing = len(chapters) - len(toc)
+            if missing:
+                logging.warning(f"EPUB《{self.title}》缺少 {missing} 章（下载失败且旧书中没有）")
+            self.write_metadata(toc)
+            self.zip.close()
+        os.replace(self.tmp_path, self.path)
+        logging.info(f"EPUB 保存成功: {self.path}, {len(toc)} 章, 本次写入 {len(self._titles)} 章")
+        return len(toc)
+
+    def abort(self):
+        """放弃本次写入，保留旧书"""
+        with self._lock:
+            self.zip.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def open_previous(self):
+        if not os.path.exists(self.path):
+            return None
+        try:
+            return zipfile.ZipFile(self.path)
+        except zipfile.BadZipFile as e:
+            logging.warning(f"旧的 EPUB 已损坏，重新生成: {self.path}: {str(e)}")
+            return None
+
+    def copy_previous(self, old, novel_ids):
+        """从旧书复制本次没有重新写入、且仍属于本书的章节和全部图片"""
+        copied = 0
+        for info in old.infolist():
+            name = info.filename
+            if name in GENERATED or name in self.zip.NameToInfo:
+                continue
+            if name.startswith(CHAPTER_DIR) and name[len(CHAPTER_DIR):-len(".xhtml")] not in novel_ids:
+                continue
+            copy_raw(old, self.zip, info)
+            copied += 1
+        if self.cover is None:
+            # 沿用旧书的封面
+            match = re.search(r'href="(images/[^"]+)"[^>]*properties="cover-image"',
+                              old.read("OEBPS/content.opf").decode("utf-8"))
+            if match and "OEBPS/" + match.group(1) in self.zip.NameToInfo:
+                self.cover = "OEBPS/" + match.group(1)
+        logging.info(f"从旧的 EPUB 复制 {copied} 个未变化的条目（不重新压缩）")
+
+    def write_metadata(self, toc):
+        title = escape_html(self.title)
+        images = sorted(name for name in self.zip.NameToInfo if name.startswith(IMAGE_DIR))
+        items = []
+        spine = []
+        if self.cover is not None:
+            cover = self.cover[len("OEBPS/"):]
+            self.zip.writestr("OEBPS/cover.xhtml", (
+                '<?xml version="1.0" encoding="utf-8"?>\n<!DOCTYPE html>\n'
+                '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops">'
+                f'<head><title>{title}</title></head><body epub:type="cover">'
+                f'<img src="{escape_html(cover)}" alt="cover"/></body></html>'))
+            items.append('<item id="cover" href="cover.xhtml" media-type="application/xhtml+xml"/>')
+            spine.append('<itemref idref="cover" linear="no"/>')
+        for i, name in enumerate(images):
+            href = name[len("OEBPS/"):]
+            extension = os.path.splitext(name)[1].lstrip(".").lower()
+            properties = ' properties="cover-image"' if name == self.cover else ""
+            items.append(f'<item id="img{i}" href="{escape_html(href)}" '
+                         f'media-type="{MEDIA_TYPES.get(extension, "application/octet-stream")}"{properties}/>')
+        for novel_id, _ in toc:
+            items.append(f'<item id="c{novel_id}" href="text/{novel_id}.xhtml" media-type="application/xhtml+xml"/>')
+            spine.append(f'<itemref idref="c{novel_id}"/>')
+        modified = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        creator = f"<dc:creator>{escape_html(self.author)}</dc:creator>" if self.author else ""
+        self.zip.writestr("OEBPS/content.opf", (
+            '<?xml version="1.0" encoding="utf-8"?>\n'
+            '<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="bookid">'
+            '<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">'
+            f'<dc:identifier id="bookid">{escape_html(self.book_id)}</dc:identifier>'
+            f'<dc:title>{title}</dc:title><dc:language>{escape_html(self.language)}</dc:language>{creator}'
+            f'<meta property="dcterms:modified">{modified}</meta></metadata>'
+            '<manifest><item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>'
+            '<item id="ncx" href="toc.ncx" media-type="application/x-dtbncx+xml"/>'
+            f'{"".join(items)}</manifest><spine toc="ncx">{"".join(spine)}</spine></package>'))
+
+        entries = "".join(f'<li><a href="text/{novel_id}.xhtml">{escape_html(name)}</a></li>'
+                          for novel_id, name in toc)
+        self.zip.writestr("OEBPS/nav.xhtml", (
+            '<?xml version="1.0" encoding="utf-8"?>\n<!DOCTYPE html>\n'
+            '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops">'
+            f'<head><title>{title}</title></head><body><nav epub:type="toc" id="toc"><h1>{title}</h1>'
+            f'<ol>{entries}</ol></nav></body></html>'))
+        points = "".join(f'<navPoint id="p{i}" playOrder="{i}"><navLabel><text>{escape_html(name)}</text></navLabel>'
+                         f'<content src="text/{novel_id}.xhtml"/></navPoint>'
+                         for i, (novel_id, name) in enumerate(toc, 1))
+        self.zip.writestr("OEBPS/toc.ncx", (
+            '<?xml version="1.0" encoding="utf-8"?>\n'
+            '<ncx xmlns="http://www.daisy.org/z3986/2005/ncx/" version="2005-1">'
+            f'<head><meta name="dtb:uid" content="{escape_html(self.book_id)}"/></head>'
+            f'<docTitle><text>{title}</text></docTitle><navMap>{points}</navMap></ncx>'))
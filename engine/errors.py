@@ -0,0 +1,6 @@
+class DownloadError(Exception):
+    """下载失败（API错误、响应格式错误等），消息已翻译，可直接展示给用户"""
+
+
+class InvalidResponseError(DownloadError):
+    """响应无法解析为JSON（通常是响应体被截断），属于可重试的错误"""
@@ -0,0 +1,48 @@
+import re
+
+from .markup import CHUNK_CHARS, RENDERERS, TextRenderer, iter_markup
+
+# 支持的保存格式及对应扩展名
+FORMATS = {
+    "TXT": "txt",
+    "HTML": "html",
+    "Markdown": "md",
+    "EPUB": "epub",
+}
+
+
+def safe_filename(name):
+    """清理文件名中的非法字符"""
+    return re.sub(r'[\\/*?:"<>|]', "", name)
+
+
+def novel_extension(file_format):
+    return FORMATS.get(file_format, "txt")
+
+
+def iter_novel(title, content, file_format="TXT", chunk_chars=CHUNK_CHARS, images=None):
+    """按选择的格式逐块生成文件内容（转换 Pixiv 标记），不生成完整的格式化文本
+
+    images 为 {image_key: 相对于输出文件的链接}，HTML 和 Markdown 中的封面和插图链接到本地文件
+    """
+    renderer = RENDERERS.get(file_format, TextRenderer)(images)
+    header = renderer.begin(title)
+    if header:
+        yield header
+    yield from iter_markup(content, renderer, chunk_chars)
+    footer = renderer.end()
+    if footer:
+        yield footer
+
+
+def iter_section(title, content, file_format="TXT", anchor="", chunk_chars=CHUNK_CHARS, images=None):
+    """系列合并输出中的一章：带锚点的章节标题和正文，不含文档头尾（封面只在单独的文件中输出）"""
+    renderer = RENDERERS.get(file_format, TextRenderer)(images)
+    yield renderer.section(title, anchor)
+    yield from iter_markup(content, renderer, chunk_chars)
+    yield renderer.section_end()
+
+
+def format_novel(title, content, file_format="TXT"):
+    """根据选择的格式生成文件内容，返回 (文本, 扩展名)"""
+    return "".join(iter_novel(title, content, file_format)), novel_extension(file_format)
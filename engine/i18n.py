@@ -0,0 +1,62 @@
+import os
+import json
+import logging
+import threading
+
+# 语言文件目录：优先使用程序目录下的 locales，其次是当前工作目录
+LOCALES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "locales")
+if not os.path.isdir(LOCALES_DIR):
+    LOCALES_DIR = "locales"
+
+# 已解析的语言文件，每种语言只读取一次
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def read_catalog(path):
+    """读取并缓存语言文件"""
+    with _catalogs_lock:
+        catalog = _catalogs.get(path)
+        if catalog is None:
+            with open(path, "r", encoding="utf-8") as f:
+                catalog = _catalogs[path] = json.load(f)
+        return catalog
+
+
+class Translator:
+    def __init__(self, language="zh_cn"):
+        self.language = language
+        self.translations = {}
+        self.load_translations()
+
+    def set_language(self, language):
+        """切换语言：替换翻译字典，之后的 translate 调用使用新语言（语言文件已读取过时不再读取）"""
+        self.language = language
+        self.load_translations()
+
+    def load_translations(self):
+        try:
+            lang_file = os.path.join(LOCALES_DIR, f"{self.language}.json")
+            if os.path.exists(lang_file):
+                self.translations = read_catalog(lang_file)
+                logging.info(f"加载语言文件: {lang_file}")
+            else:
+                logging.warning(f"语言文件不存在: {lang_file}")
+                # 尝试加载默认语言
+                default_file = os.path.join(LOCALES_DIR, "zh_cn.json")
+                if os.path.exists(default_file):
+                    self.translations = read_catalog(default_file)
+                    logging.info(f"加载默认语言文件: {default_file}")
+                else:
+                    logging.error("默认语言文件不存在")
+        except Exception as e:
+            logging.error(f"加载语言文件失败: {str(e)}", exc_info=True)
+
+    def translate(self, key, **kwargs):
+        text = self.translations.get(key, key)
+        if kwargs:
+            try:
+                return text.format(**kwargs)
+            except:
+                return text
+        return text
@@ -0,0 +1,123 @@
+import re
+import sys
+import logging
+
+# 支持多种URL格式的正则表达式
+PATTERNS = [
+    r'novel/show\.php\?id=(\d+)',        # 旧版URL
+    r'novel/.*?id=(\d+)',                 # 带参数的URL
+    r'novel/(\d+)',                       # 新版URL
+    r'n/(\d+)',                           # 短链接
+    r'series/(\d+)',                      # 系列URL
+    r'works/(\d+)',                       # 作品URL（可能包含小说）
+    r'id=(\d+)',                          # 直接ID参数
+    r'^(\d+)$'                            # 纯数字ID
+]
+
+
+def compile_patterns(patterns):
+    """把 PATTERNS 合并为一个正则表达式，结果与按顺序逐个 re.search 相同
+
+    每个模式成为一个分支，分支 i 的 ID 为命名组 p{i}。非锚定的模式前加 (?s:.*?)，
+    re.match 先在所有位置尝试第一个分支，失败后才尝试下一个，与按列表顺序搜索的优先级一致。
+    锚定的模式（纯数字ID）放在最前：能匹配它的输入不含字母，不会匹配其他模式。
+    """
+    anchored, searched = [], []
+    for i, pattern in enumerate(patterns):
+        body = pattern.replace(r'(\d+)', rf'(?P<p{i}>\d+)', 1)
+        if body.startswith("^"):
+            anchored.append(body[1:])
+        else:
+            searched.append(r'(?s:.*?)' + body)
+    return re.compile("|".join(anchored + searched))
+
+
+CONTENT_ID_RE = compile_patterns(PATTERNS)
+# 分支编号 -> 内容类型
+PATTERN_TYPES = ["series" if "series" in pattern else "novel" for pattern in PATTERNS]
+
+
+def parse_content_id(input_text):
+    """从一行输入中提取 (类型, ID)，无法提取时返回 None（不记录日志，供大量输入使用）"""
+    match = CONTENT_ID_RE.match(input_text.strip())
+    if match is None:
+        return None
+    return PATTERN_TYPES[int(match.lastgroup[1:])], match.group(match.lastgroup)
+
+
+def extract_content_id(input_text, _=None):
+    """从输入中提取内容ID和类型，返回 (类型, ID)"""
+    # 清除前后空格
+    input_text = input_text.strip()
+    logging.debug("提取内容ID: 输入文本: '%s'", input_text)
+
+    result = parse_content_id(input_text)
+    if result is not None:
+        logging.debug("匹配成功: 类型 '%s', ID '%s'", *result)
+        return result
+
+    # 如果没有匹配任何模式，抛出详细错误
+    error_msg = _("extract_error", input=input_text) if _ else f"无法从输入中提取有效的内容ID: {input_text}"
+    logging.warning(error_msg)
+    raise ValueError(error_msg)
+
+
+def read_lines(path):
+    """逐行读取ID列表文件（'-' 表示标准输入），不把整个文件读入内存"""
+    stream = sys.stdin if path == "-" else open(path, "r", encoding="utf-8-sig")
+    try:
+        yield from stream
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+class ContentIdStream:
+    """逐行解析ID列表的迭代器，产生 (类型, ID)
+
+    跳过空行和 # 注释，按 (类型, ID) 去重。无法解析的行以 "行号<TAB>内容" 写入 bad_lines 文件
+    （第一次遇到时才创建）；bad_lines 为 None 时记录为警告日志。
+    迭代在下载线程中进行，下载引擎读到一个条目就开始下载，不需要等整个列表读完。
+    """
+
+    def __init__(self, lines, bad_lines=None):
+        self.lines = lines
+        self.bad_lines = bad_lines
+        self.seen = set()
+        self.read = 0
+        self.duplicates = 0
+        self.invalid = 0
+
+    @property
+    def valid(self):
+        return len(self.seen)
+
+    def __iter__(self):
+        seen = self.seen
+        bad_file = None
+        try:
+            for number, line in enumerate(self.lines, 1):
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                self.read += 1
+                content = parse_content_id(line)
+                if content is None:
+                    self.invalid += 1
+                    if self.bad_lines is None:
+                        logging.warning(f"第 {number} 行: 无法提取内容ID: {line}")
+                        continue
+                    if bad_file is None:
+                        bad_file = open(self.bad_lines, "w", encoding="utf-8")
+                    bad_file.write(f"{number}\t{line}\n")
+                    continue
+                if content in seen:
+                    self.duplicates += 1
+                    continue
+                seen.add(content)
+                yield content
+        finally:
+            if bad_file is not None:
+                bad_file.close()
+            logging.info(f"读取ID列表 {self.read} 行: 有效 {self.valid}, 重复 {self.duplicates}, 无法解析 {self.invalid}"
+                         + (f", 已写入 {self.bad_lines}" if bad_file is not None else ""))
@@ -0,0 +1,155 @@
+"""小说封面和插图：收集引用、并发下载、内容寻址缓存
+
+图片保存在保存目录的 images/ 中，文件名为内容的 SHA-256，相同的图片只保存一份；
+URL（作品插图为 "pixivimage:ID-页"）-> 文件名的索引保存在 images/index.sqlite3 中，
+下载过的图片不再请求。
+同一 URL 被多个线程同时请求时（例如系列各章共用的封面）只下载一次。
+"""
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass
+from urllib.parse import urlparse
+
+from .markup import image_key
+
+IMAGE_DIR = "images"
+INDEX_NAME = "index.sqlite3"
+# 每本小说并发下载图片的线程数（请求仍受共享限速器约束）
+DEFAULT_IMAGE_WORKERS = 4
+
+EXTENSIONS = {
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "image/gif": "gif",
+    "image/webp": "webp",
+}
+
+IMAGE_TAG = re.compile(r"\[(uploadedimage|pixivimage):(\d+)(?:-(\d+))?\]")
+
+
+@dataclass
+class ImageRef:
+    key: str            # 渲染时使用的标识，见 markup.image_key
+    url: str = ""       # 图片地址；作品插图为空，需要通过 API 获取
+    illust_id: str = ""
+    page: int = 1
+
+
+def collect_images(novel):
+    """收集小说引用的所有图片：封面、上传的插图 [uploadedimage:ID] 和作品插图 [pixivimage:ID-页]"""
+    refs = {}
+    if novel.get("coverUrl"):
+        refs["cover"] = ImageRef("cover", novel["coverUrl"])
+    embedded = novel.get("textEmbeddedImages") or {}
+    for kind, image_id, page in IMAGE_TAG.findall(novel.get("content", "")):
+        key = image_key(kind, image_id, page)
+        if key in refs:
+            continue
+        if kind == "pixivimage":
+            refs[key] = ImageRef(key, illust_id=image_id, page=int(page or 1))
+            continue
+        urls = (embedded.get(image_id) or {}).get("urls") or {}
+        url = urls.get("original") or urls.get("1200x1200")
+        if url:
+            refs[key] = ImageRef(key, url)
+        else:
+            logging.warning(f"小说中的上传插图 {image_id} 没有图片地址，跳过")
+    return list(refs.values())
+
+
+def image_extension(url, content_type=""):
+    extension = EXTENSIONS.get(content_type.split(";")[0].strip().lower())
+    if extension:
+        return extension
+    suffix = os.path.splitext(urlparse(url).path)[1].lstrip(".").lower()
+    return "jpg" if suffix == "jpeg" else (suffix or "bin")
+
+
+class ImageStore:
+    """线程安全的内容寻址图片缓存"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._fetching = {}  # URL -> 下载该 URL 时持有的锁
+        self.stats = {"hit": 0, "fetched": 0, "deduplicated": 0}
+        self.conn = sqlite3.connect(os.path.join(directory, INDEX_NAME), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS images (
+                url TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL
+            )""")
+        self.conn.commit()
+
+    def lookup(self, url):
+        """已缓存且文件仍在时返回本地路径，否则返回 None"""
+        with self._lock:
+            row = self.conn.execute("SELECT name FROM images WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        path = os.path.join(self.directory, row[0])
+        return path if os.path.exists(path) else None
+
+    def fetch(self, url, download):
+        """返回图片的本地路径；未缓存时调用 download(url) -> (字节, Content-Type) 下载"""
+        path = self.lookup(url)
+        if path is not None:
+            self.record("hit")
+            return path
+        with self._lock:
+            lock = self._fetching.setdefault(url, threading.Lock())
+        with lock:
+            # 等待期间其他线程可能已经下载完成
+            path = self.lookup(url)
+            if path is None:
+                data, content_type = download(url)
+                path = self.store(url, data, content_type)
+            else:
+                self.record("hit")
+        with self._lock:
+            self._fetching.pop(url, None)
+        return path
+
+    def store(self, url, data, content_type=""):
+        """按内容哈希保存图片并记录索引；内容相同的图片只写一次"""
+        name = f"{hashlib.sha256(data).hexdigest()}.{image_extension(url, content_type)}"
+        path = os.path.join(self.directory, name)
+        if os.path.exists(path):
+            self.record("deduplicated")
+        else:
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self.record("fetched")
+        with self._lock:
+            self.conn.execute("INSERT OR REPLACE INTO images (url, name, size, fetched_at) VALUES (?, ?, ?, ?)",
+                              (url, name, len(data), time.time()))
+            self.conn.commit()
+        logging.debug("保存图片: %s -> %s", url, name)
+        return path
+
+    def record(self, kind):
+        with self._lock:
+            self.stats[kind] += 1
+
+    def log(self):
+        with self._lock:
+            stats = dict(self.stats)
+        if any(stats.values()):
+            logging.info(f"图片缓存统计: 命中 {stats['hit']}, 下载 {stats['fetched']}, "
+                         f"内容重复 {stats['deduplicated']}")
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
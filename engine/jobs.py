@@ -0,0 +1,216 @@
+"""可恢复的批量下载任务日志（SQLite，WAL）
+
+每个条目（单本小说、系列，以及系列展开后的每一章）都记录状态：
+    pending   等待下载
+    inflight  正在下载
+    done      已完成
+    failed    下载失败
+系列目录逐页写入日志，全部获取后系列标记为已展开，恢复时不必重新获取目录。
+打开已有的日志时，上次中断的 inflight 条目和失败的条目重新变为 pending，
+已完成的条目直接跳过（resume=False 时只读取，不改变任何条目）。
+"""
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass
+
+PENDING = "pending"
+INFLIGHT = "inflight"
+DONE = "done"
+FAILED = "failed"
+
+DEFAULT_JOB_DIR = "jobs"
+# 图形界面的任务日志单独存放，启动时只询问这些任务，不会处理命令行的任务日志
+GUI_JOB_DIR = os.path.join(DEFAULT_JOB_DIR, "gui")
+
+
+@dataclass
+class JobItem:
+    content_type: str
+    content_id: str
+    state: str = PENDING
+    parent: str = ""    # 系列章节为所属系列ID，顶层条目为空
+    title: str = ""     # 小说标题；系列条目为系列标题
+    path: str = ""
+    updated: int = 0    # 系列目录中的更新时间
+    error: str = ""
+    expanded: bool = False  # 系列条目：章节列表已写入日志
+
+
+COLUMNS = "content_type, content_id, state, parent, title, path, updated, error, expanded"
+
+
+class BatchJob:
+    """线程安全的批量任务日志"""
+
+    def __init__(self, path, resume=True):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS items (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                content_type TEXT NOT NULL,
+                content_id TEXT NOT NULL,
+                state TEXT NOT NULL,
+                parent TEXT NOT NULL DEFAULT '',
+                title TEXT NOT NULL DEFAULT '',
+                path TEXT NOT NULL DEFAULT '',
+                updated INTEGER NOT NULL DEFAULT 0,
+                error TEXT NOT NULL DEFAULT '',
+                expanded INTEGER NOT NULL DEFAULT 0,
+                changed_at REAL NOT NULL,
+                UNIQUE (content_type, content_id, parent)
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_items_parent ON items(parent, state)")
+        self.conn.commit()
+        if resume:
+            self.resume()
+
+    def resume(self):
+        """准备继续执行：上次中断时正在下载的条目和失败的条目重新变为 pending"""
+        with self._lock:
+            # 上次运行结束时失败的系列重新获取目录（可能有新章节）；中断的系列沿用已记录的章节列表
+            self.conn.execute("UPDATE items SET expanded = 0 WHERE content_type = 'series' AND state = ?", (FAILED,))
+            # 上次运行中断时正在下载的条目和失败的条目重新下载
+            reset = self.conn.execute("UPDATE items SET state = ?, error = '' WHERE state IN (?, ?)",
+                                      (PENDING, INFLIGHT, FAILED)).rowcount
+            self.conn.commit()
+        counts = self.counts()
+        if counts.get(DONE):
+            logging.info(f"恢复任务日志: {self.path}, 已完成 {counts.get(DONE, 0)} 项, "
+                         f"待下载 {counts.get(PENDING, 0)} 项 (其中 {reset} 项为中断或失败后重试)")
+        else:
+            logging.info(f"任务日志: {self.path}")
+
+    def add(self, content_ids):
+        """加入顶层条目 [(类型, ID)]，已存在的条目保持原状态"""
+        now = time.time()
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO items (content_type, content_id, state, changed_at) VALUES (?, ?, ?, ?)",
+                [(content_type, str(content_id), PENDING, now) for content_type, content_id in content_ids])
+            self.conn.commit()
+
+    def items(self, parent=""):
+        """按加入顺序返回顶层条目，或某个系列的章节"""
+        with self._lock:
+            rows = self.conn.execute(f"SELECT {COLUMNS} FROM items WHERE parent = ? ORDER BY seq",
+                                     (parent,)).fetchall()
+        return [JobItem(*row[:-1], expanded=bool(row[-1])) for row in rows]
+
+    def get(self, content_type, content_id, parent=""):
+        with self._lock:
+            row = self.conn.execute(f"SELECT {COLUMNS} FROM items WHERE content_type = ? AND content_id = ? "
+                                    f"AND parent = ?", (content_type, str(content_id), parent)).fetchone()
+        return JobItem(*row[:-1], expanded=bool(row[-1])) if row else None
+
+    def expand(self, series_id, series_title, chapters, complete=True):
+        """记录系列的章节 [Chapter]；系列条目不存在时一并加入
+
+        目录逐页到达时每页以 complete=False 调用，目录全部获取后才把系列标记为已展开。
+        """
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO items (content_type, content_id, state, changed_at) VALUES ('series', ?, ?, ?)",
+                (series_id, INFLIGHT, now))
+            self.conn.execute("UPDATE items SET title = ?, expanded = MAX(expanded, ?), changed_at = ? "
+                              "WHERE content_type = 'series' AND content_id = ? AND parent = ''",
+                              (series_title, int(complete), now, series_id))
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO items (content_type, content_id, state, parent, title, updated, changed_at) "
+                "VALUES ('novel', ?, ?, ?, ?, ?, ?)",
+                [(chapter.id, PENDING, series_id, chapter.title, chapter.updated, now) for chapter in chapters])
+            self.conn.commit()
+
+    def mark(self, content_type, content_id, state, parent="", title=None, path=None, error=""):
+        """更新一个条目的状态（每次更新单独提交，中断后不会丢失）"""
+        with self._lock:
+            self.conn.execute(
+                "UPDATE items SET state = ?, title = COALESCE(?, title), path = COALESCE(?, path), error = ?, "
+                "changed_at = ? WHERE content_type = ? AND content_id = ? AND parent = ?",
+                (state, title, path, error, time.time(), content_type, str(content_id), parent))
+            self.conn.commit()
+
+    def mark_many(self, content_type, content_ids, state, parent=""):
+        """在一个事务中更新多个条目的状态"""
+        now = time.time()
+        with self._lock:
+            self.conn.executemany(
+                "UPDATE items SET state = ?, changed_at = ? WHERE content_type = ? AND content_id = ? AND parent = ?",
+                [(state, now, content_type, str(content_id), parent) for content_id in content_ids])
+            self.conn.commit()
+
+    def counts(self, parent=None):
+        """各状态的条目数；parent 为 None 时统计所有条目"""
+        query = "SELECT state, COUNT(*) FROM items"
+        params = ()
+        if parent is not None:
+            query += " WHERE parent = ?"
+            params = (parent,)
+        with self._lock:
+            rows = self.conn.execute(query + " GROUP BY state", params).fetchall()
+        return dict(rows)
+
+    @property
+    def succeeded(self):
+        """所有条目都已完成"""
+        counts = self.counts()
+        return sum(counts.values()) == counts.get(DONE, 0)
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    def delete(self):
+        """关闭并删除任务日志（任务全部完成后调用）"""
+        self.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
+        logging.info(f"任务已全部完成，删除任务日志: {self.path}")
+
+
+def job_path(content_ids, directory=DEFAULT_JOB_DIR, prefix="batch"):
+    """根据输入内容生成任务日志路径：同样的输入在中断后重新运行时会恢复同一个任务"""
+    digest = hashlib.sha1("\n".join(f"{t}:{i}" for t, i in content_ids).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(directory, f"{prefix}-{digest}.sqlite3")
+
+
+def input_job_path(path, directory=DEFAULT_JOB_DIR, prefix="batch"):
+    """根据输入文件的内容生成任务日志路径：边读取边下载时无法预先得到全部条目，改为对文件内容求哈希"""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return os.path.join(directory, f"{prefix}-{digest.hexdigest()[:12]}.sqlite3")
+
+
+def unfinished_jobs(directory=DEFAULT_JOB_DIR):
+    """返回目录中还有未完成（等待、中断或失败）条目的任务日志 [(路径, 各状态的条目数)]
+
+    只读取，不改变条目的状态；继续执行时再调用 BatchJob.resume。
+    """
+    jobs = []
+    if not os.path.isdir(directory):
+        return jobs
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".sqlite3"):
+            continue
+        path = os.path.join(directory, name)
+        job = BatchJob(path, resume=False)
+        try:
+            if not job.succeeded:
+                jobs.append((path, job.counts()))
+        finally:
+            job.close()
+    return jobs
@@ -0,0 +1,167 @@
+"""已下载小说的本地索引数据库（SQLite，以小说ID为主键）
+
+- 所有已下载ID常驻内存集合，"是否已下载"的判断不访问磁盘
+- 新记录先放入缓冲区，满 BATCH_SIZE 条或距上次写入超过 FLUSH_INTERVAL 秒时
+  在一个事务中批量写入
+- 取代原来 QSettings 中只保留 20 条的下载历史
+"""
+import os
+import time
+import sqlite3
+import logging
+import threading
+from dataclasses import dataclass, fields
+
+DEFAULT_LIBRARY_PATH = os.path.join("data", "downloads.sqlite3")
+BATCH_SIZE = 200
+FLUSH_INTERVAL = 2.0
+
+
+@dataclass
+class DownloadRecord:
+    novel_id: str
+    title: str = ""
+    series_id: str = ""
+    series_title: str = ""
+    author: str = ""
+    path: str = ""
+    format: str = ""
+    sha256: str = ""
+    updated: int = 0          # 小说的最后更新时间（Unix 秒）
+    downloaded_at: float = 0.0
+
+
+COLUMNS = [f.name for f in fields(DownloadRecord)]
+
+
+def record_row(record):
+    # 比 dataclasses.astuple 快得多（不做深拷贝）
+    return tuple(getattr(record, column) for column in COLUMNS)
+
+
+class DownloadLibrary:
+    """线程安全的下载记录数据库"""
+
+    def __init__(self, path=DEFAULT_LIBRARY_PATH, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pending = {}  # 小说ID -> 尚未写入的 DownloadRecord
+        self._last_flush = time.monotonic()
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS downloads (
+                novel_id TEXT PRIMARY KEY,
+                title TEXT,
+                series_id TEXT,
+                series_title TEXT,
+                author TEXT,
+                path TEXT,
+                format TEXT,
+                sha256 TEXT,
+                updated INTEGER,
+                downloaded_at REAL NOT NULL
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_downloads_time ON downloads(downloaded_at)")
+        self.conn.commit()
+        self._ids = {row[0] for row in self.conn.execute("SELECT novel_id FROM downloads")}
+        logging.info(f"下载记录数据库: {path}, {len(self._ids)} 条记录")
+
+    def __contains__(self, novel_id):
+        with self._lock:
+            return str(novel_id) in self._ids
+
+    def __len__(self):
+        with self._lock:
+            return len(self._ids)
+
+    def add(self, record):
+        """加入一条记录；达到批量大小或时间间隔时写入数据库"""
+        if not record.downloaded_at:
+            record.downloaded_at = time.time()
+        with self._lock:
+            self._pending[record.novel_id] = record
+            self._ids.add(record.novel_id)
+            if (len(self._pending) >= self.batch_size
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self._flush()
+
+    def get(self, novel_id):
+        """返回小说的 DownloadRecord，没有下载过时返回 None"""
+        novel_id = str(novel_id)
+        with self._lock:
+            if novel_id not in self._ids:
+                return None
+            if novel_id in self._pending:
+                return self._pending[novel_id]
+            row = self.conn.execute(f"SELECT {', '.join(COLUMNS)} FROM downloads WHERE novel_id = ?",
+                                    (novel_id,)).fetchone()
+        return DownloadRecord(*row) if row else None
+
+    def recent(self, limit=100):
+        """最近下载的记录，新的在前"""
+        with self._lock:
+            self._flush()
+            rows = self.conn.execute(f"SELECT {', '.join(COLUMNS)} FROM downloads "
+                                     f"ORDER BY downloaded_at DESC LIMIT ?", (limit,)).fetchall()
+        return [DownloadRecord(*row) for row in rows]
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        """把缓冲区写入数据库（调用方持有锁）"""
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+        placeholders = ", ".join("?" * len(COLUMNS))
+        self.conn.executemany(f"INSERT OR REPLACE INTO downloads ({', '.join(COLUMNS)}) VALUES ({placeholders})",
+                              [record_row(record) for record in self._pending.values()])
+        self.conn.commit()
+        logging.debug("写入下载记录 %d 条", len(self._pending))
+        self._pending.clear()
+
+    def clear(self):
+        with self._lock:
+            self._pending.clear()
+            self._ids.clear()
+            self.conn.execute("DELETE FROM downloads")
+            self.conn.commit()
+        logging.info("已清空下载记录数据库")
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self.conn.close()
+
+
+_shared_library = None
+_library_enabled = True
+_shared_lock = threading.Lock()
+
+
+def configure_library(enabled=True, path=DEFAULT_LIBRARY_PATH):
+    """设置进程内共享的下载记录数据库；enabled=False 时 get_library 返回 None"""
+    global _shared_library, _library_enabled
+    with _shared_lock:
+        _library_enabled = enabled
+        if _shared_library is not None:
+            _shared_library.close()
+        _shared_library = DownloadLibrary(path) if enabled else None
+        return _shared_library
+
+
+def get_library():
+    """返回进程内共享的下载记录数据库，首次调用时使用默认设置创建"""
+    global _shared_library
+    with _shared_lock:
+        if _shared_library is None and _library_enabled:
+            _shared_library = DownloadLibrary()
+        return _shared_library
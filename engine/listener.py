@@ -0,0 +1,17 @@
+"""下载进度回调接口；不导入下载引擎的其他模块，GUI 启动时可以直接使用"""
+
+
+class DownloadListener:
+    """下载进度回调，默认什么都不做；GUI 和 CLI 各自实现需要的方法"""
+
+    def on_status(self, text):
+        """状态变化（下载中 / 已完成 / 出错）"""
+
+    def on_progress(self, value):
+        """总体进度 0-100"""
+
+    def on_info(self, text):
+        """详细进度信息"""
+
+    def on_saved(self, title, path):
+        """一本小说或一个系列保存完成，用于记录下载历史"""
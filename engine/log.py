@@ -0,0 +1,147 @@
+import os
+import json
+import atexit
+import logging
+import logging.handlers
+import queue
+from datetime import datetime
+
+LOG_PREFIX = "pixiv_novel_downloader_"
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+# 单个日志文件的大小上限和保留的轮转文件数
+DEFAULT_LOG_SIZE = 10 * 1024 * 1024
+DEFAULT_LOG_BACKUPS = 5
+# 日志目录的总大小上限，超过时删除最早的日志文件
+DEFAULT_LOG_DIR_SIZE = 100 * 1024 * 1024
+# 日志队列中最多等待写入的记录数
+DEFAULT_LOG_QUEUE = 10000
+
+
+class LazyJSON:
+    """日志参数：日志真正输出时才序列化为 JSON；exclude 为不输出的键，limit 为截断长度"""
+
+    __slots__ = ("data", "limit", "exclude")
+
+    def __init__(self, data, limit=None, exclude=()):
+        self.data = data
+        self.limit = limit
+        self.exclude = exclude
+
+    def __str__(self):
+        data = self.data
+        if self.exclude and isinstance(data, dict):
+            data = {k: v for k, v in data.items() if k not in self.exclude}
+        text = json.dumps(data, ensure_ascii=False)
+        if self.limit is not None and len(text) > self.limit:
+            return text[:self.limit] + "..."
+        return text
+
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """把日志记录放入日志线程的队列
+
+    调用线程中只合并消息参数（LazyJSON 等在这里渲染）和异常堆栈，
+    时间格式化、写文件和控制台输出都在日志线程中进行。
+    队列有上限：日志线程跟不上时调用线程等待，而不是丢弃记录或无限占用内存。
+    """
+
+    def enqueue(self, record):
+        self.queue.put(record)
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # 堆栈中的帧在之后可能变化，在调用线程中生成文本
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def prune_logs(log_dir, max_bytes=DEFAULT_LOG_DIR_SIZE, keep=()):
+    """日志目录超过 max_bytes 时从最早的日志文件开始删除（keep 中的文件不删除）"""
+    files = []
+    for name in os.listdir(log_dir):
+        path = os.path.join(log_dir, name)
+        if name.startswith(LOG_PREFIX) and os.path.isfile(path):
+            stat = os.stat(path)
+            files.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        if path in keep:
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
+
+
+def stop_logging():
+    """等待队列中的日志写完并停止日志线程（退出时自动调用）"""
+    listener = getattr(setup_logger, "listener", None)
+    if listener is not None:
+        setup_logger.listener = None
+        listener.stop()
+
+
+# 设置日志记录
+def setup_logger(log_dir="logs", console_level=logging.INFO, file_level=logging.INFO,
+                 max_bytes=DEFAULT_LOG_SIZE, backups=DEFAULT_LOG_BACKUPS, max_dir_bytes=DEFAULT_LOG_DIR_SIZE):
+    """日志写入 log_dir 中按大小轮转的文件和控制台；下载线程只把记录放入队列，不等待磁盘和终端
+
+    根日志级别取文件和控制台中较低的一个，低于它的 logging.debug 调用不会生成记录；
+    默认不记录逐请求的调试信息，需要时传入 file_level=logging.DEBUG
+    """
+    # 避免重复初始化（GUI 与 CLI 可能都会调用）
+    if getattr(setup_logger, "_done", False):
+        return
+    setup_logger._done = True
+
+    # 创建logs目录
+    if not os.path.exists(log_dir):
+        os.makedirs(log_dir)
+
+    # 创建带时间戳的日志文件名
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    log_filename = os.path.join(log_dir, f"{LOG_PREFIX}{timestamp}.log")
+    removed = prune_logs(log_dir, max(0, max_dir_bytes - max_bytes * (backups + 1)))
+
+    formatter = logging.Formatter(LOG_FORMAT, DATE_FORMAT)
+    file_handler = logging.handlers.RotatingFileHandler(log_filename, maxBytes=max_bytes, backupCount=backups,
+                                                        encoding="utf-8", delay=True)
+    file_handler.setLevel(file_level)
+    file_handler.setFormatter(formatter)
+
+    # 添加控制台日志
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(console_level)
+    console_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    # 文件和控制台在日志线程中写入；退出时先等待队列中的记录写完
+    log_queue = queue.Queue(DEFAULT_LOG_QUEUE)
+    listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+    setup_logger.listener = listener
+    atexit.register(stop_logging)
+
+    # 日志格式中没有线程和进程信息，生成记录时不再收集（logging HOWTO 中的优化项）
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    root = logging.getLogger()
+    root.setLevel(min(file_level, console_level))
+    root.addHandler(AsyncQueueHandler(log_queue))
+
+    logging.info("=" * 80)
+    logging.info("Pixiv Novel Downloader 启动")
+    logging.info("=" * 80)
+    if removed:
+        logging.info(f"日志目录超过 {max_dir_bytes / 1048576:.0f} MB，删除了 {removed} 个旧日志文件")
@@ -0,0 +1,113 @@
+"""系列清单：记录系列目录中每一章的更新时间、输出路径和内容哈希
+
+清单保存在系列目录中（.series_manifest.json）。同步模式下，把清单与系列
+目录 API 返回的章节列表比较，只下载新增或更新过的章节。
+"""
+import os
+import json
+import hashlib
+import logging
+from dataclasses import dataclass, asdict
+
+MANIFEST_NAME = ".series_manifest.json"
+MANIFEST_VERSION = 1
+
+
+def content_hash(chunks):
+    """内容的 SHA-256；chunks 为字符串或逐块生成的字符串"""
+    digest = hashlib.sha256()
+    for chunk in ([chunks] if isinstance(chunks, str) else chunks):
+        digest.update(chunk.encode("utf-8"))
+    return digest.hexdigest()
+
+
+@dataclass
+class ChapterRecord:
+    id: str
+    title: str = ""
+    updated: int = 0      # 已下载版本的更新时间（Unix 秒）
+    path: str = ""        # 相对于系列目录的输出文件名
+    sha256: str = ""      # 正文内容的哈希
+    format: str = ""
+
+
+class SeriesManifest:
+    def __init__(self, series_dir, series_id="", title=""):
+        self.series_dir = series_dir
+        self.series_id = series_id
+        self.title = title
+        self.chapters = {}  # 小说ID -> ChapterRecord
+        self.order = []     # 最近一次系列目录中的章节顺序
+
+    @property
+    def path(self):
+        return os.path.join(self.series_dir, MANIFEST_NAME)
+
+    @classmethod
+    def load(cls, series_dir, series_id="", title=""):
+        """读取系列目录中的清单，不存在或损坏时返回空清单"""
+        manifest = cls(series_dir, series_id, title)
+        try:
+            with open(manifest.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            manifest.series_id = data.get("series_id") or series_id
+            manifest.title = data.get("title") or title
+            manifest.order = data.get("order", [])
+            for item in data.get("chapters", []):
+                record = ChapterRecord(**{k: item.get(k, v) for k, v in asdict(ChapterRecord("")).items()})
+                manifest.chapters[record.id] = record
+            logging.debug(f"读取系列清单: {manifest.path}, {len(manifest.chapters)} 章")
+        except FileNotFoundError:
+            pass
+        except (ValueError, TypeError) as e:
+            logging.warning(f"系列清单损坏，将重新下载全部章节: {manifest.path}: {str(e)}")
+        return manifest
+
+    def save(self):
+        """原子写入清单"""
+        data = {
+            "version": MANIFEST_VERSION,
+            "series_id": self.series_id,
+            "title": self.title,
+            "order": self.order,
+            "chapters": [asdict(record) for record in self.chapters.values()],
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+        logging.debug(f"保存系列清单: {self.path}")
+
+    def needs_update(self, chapter, file_format):
+        """章节是否需要下载：新章节、目录中的更新时间更晚、格式变化或文件丢失"""
+        record = self.chapters.get(chapter.id)
+        if record is None or record.format != file_format:
+            return True
+        if not record.path or not os.path.exists(os.path.join(self.series_dir, record.path)):
+            return True
+        # 目录没有提供更新时间时无法判断，重新获取（正文未变时不会重写文件）
+        if not chapter.updated:
+            return True
+        return chapter.updated > record.updated
+
+    def unchanged(self, novel_id, sha256, file_format):
+        """重新获取的正文与清单中的哈希一致，且输出文件仍在"""
+        record = self.chapters.get(novel_id)
+        return (record is not None and record.sha256 == sha256 and record.format == file_format
+                and os.path.exists(os.path.join(self.series_dir, record.path)))
+
+    def record(self, novel_id, title, updated, path, sha256, file_format):
+        self.chapters[novel_id] = ChapterRecord(novel_id, title, updated, os.path.basename(path), sha256, file_format)
+
+
+def find_manifests(save_path):
+    """查找保存目录下所有系列清单，返回 [SeriesManifest]"""
+    manifests = []
+    if not os.path.isdir(save_path):
+        return manifests
+    for entry in os.scandir(save_path):
+        if entry.is_dir() and os.path.exists(os.path.join(entry.path, MANIFEST_NAME)):
+            manifest = SeriesManifest.load(entry.path)
+            if manifest.series_id:
+                manifests.append(manifest)
+    return manifests
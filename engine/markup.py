@@ -0,0 +1,303 @@
+"""Pixiv 小说标记转换：一次线性扫描把正文转换为 HTML、Markdown 或纯文本
+
+支持的标记：
+    [newpage]                       分页
+    [chapter:标题]                  章节标题（标题中可以包含注音）
+    [[rb:漢字 > かんじ]]            注音
+    [[jumpuri:文字 > https://...]]  外部链接
+    [jump:n]                        跳转到第 n 页
+    [pixivimage:作品ID(-页)]        作品插图
+    [uploadedimage:ID]              上传的插图
+
+下载了图片时（images 为 {image_key: 本地链接}），HTML 和 Markdown 中的插图和封面链接到本地文件。
+系列合并输出时，每章用 section / section_end 包围，目录由 toc 生成，页面锚点加上章节前缀。
+
+所有标记都以 "[" 开头，合并为一个预编译的正则；标记之间的普通文本整段转义，
+不逐字符处理。正文按块输出，块边界不会切开标记。
+"""
+import re
+from itertools import chain
+
+# 流式转换时每块的（输入）字符数
+CHUNK_CHARS = 1 << 20
+
+_RUBY = r"\[\[rb:[^\]\n]*\]\]"
+
+# 外层命名分组为标记类型，match.lastgroup 即渲染方法名；
+# 分页和章节标题是块级标记，连同其后的换行一起匹配（HTML 中不再多出 <br>）
+TOKEN = re.compile(r"""\[(?:
+    (?P<newpage>newpage\]\n?)
+  | (?P<chapter>chapter:(?P<chapter_title>(?:""" + _RUBY + r"""|[^\]\n])*)\]\n?)
+  | (?P<ruby>\[rb:(?P<ruby_base>[^>\]\n]*?)\s*>\s*(?P<ruby_text>[^\]\n]*?)\s*\]\])
+  | (?P<link>\[jumpuri:(?P<link_text>[^>\]\n]*?)\s*>\s*(?P<link_url>[^\]\s]+)\s*\]\])
+  | (?P<jump>jump:(?P<jump_page>\d+)\])
+  | (?P<image>pixivimage:(?P<illust_id>\d+)(?:-(?P<illust_page>\d+))?\])
+  | (?P<uploaded>uploadedimage:(?P<upload_id>\d+)\])
+)""", re.VERBOSE)
+
+# 章节标题中只转换注音
+RUBY = re.compile(r"\[\[rb:(?P<ruby_base>[^>\]\n]*?)\s*>\s*(?P<ruby_text>[^\]\n]*?)\s*\]\]")
+
+TAGS = ("newpage", "chapter", "ruby", "link", "jump", "image", "uploaded")
+
+ARTWORK_URL = "https://www.pixiv.net/artworks/{}"
+
+
+def escape_html(text):
+    # 连续的 str.replace 在 C 中执行，比逐字符查表快
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;")
+
+
+def image_key(kind, image_id, page=None):
+    """插图在 images 中的键；作品插图不写页码时为第 1 页"""
+    if kind == "pixivimage":
+        return f"pixivimage:{image_id}-{page or 1}"
+    return f"{kind}:{image_id}"
+
+
+def line_end(match):
+    """块级标记后原有的换行，纯文本和 Markdown 中保留"""
+    return "\n" if match.group().endswith("\n") else ""
+
+
+def safe_url(url):
+    """只保留 http(s) 链接，避免 javascript: 等协议进入输出"""
+    return url if url.startswith(("http://", "https://")) else ""
+
+
+class TextRenderer:
+    """纯文本：去掉标记，保留可读的内容"""
+    # 页面锚点的前缀，合并输出中每章不同
+    prefix = ""
+
+    def __init__(self, images=None):
+        self.page = 1
+        self.images = images or {}
+
+    def begin(self, title):
+        return ""
+
+    def end(self):
+        return ""
+
+    def toc(self, title, entries):
+        """合并文件的开头：标题和目录，entries 为 [(锚点, 章节标题)]"""
+        lines = "".join(f"{i}. {name}\n" for i, (_, name) in enumerate(entries, 1))
+        return f"{title}\n\n{lines}\n"
+
+    def section(self, title, anchor):
+        """合并文件中一章的开头"""
+        self.page = 1
+        self.prefix = f"{anchor}-"
+        return "=" * 40 + f"\n{title}\n\n"
+
+    def section_end(self):
+        return "\n\n"
+
+    def merged_end(self):
+        """合并文件的结尾"""
+        return ""
+
+    def text(self, text):
+        return text
+
+    def inline(self, text):
+        """转换标题等行内文本中的注音"""
+        return self.text(text) if "[[rb:" not in text else "".join(self._inline(text))
+
+    def _inline(self, text):
+        pos = 0
+        for match in RUBY.finditer(text):
+            yield self.text(text[pos:match.start()])
+            yield self.ruby(match)
+            pos = match.end()
+        yield self.text(text[pos:])
+
+    def newpage(self, match):
+        self.page += 1
+        return "-" * 20 + line_end(match)
+
+    def chapter(self, match):
+        return self.inline(match["chapter_title"]) + line_end(match)
+
+    def ruby(self, match):
+        return f"{self.text(match['ruby_base'])}（{self.text(match['ruby_text'])}）"
+
+    def link(self, match):
+        text, url = match["link_text"], match["link_url"]
+        return url if not text or text == url else f"{text} ({url})"
+
+    def jump(self, match):
+        return f"→ P{match['jump_page']}"
+
+    def image(self, match):
+        return ARTWORK_URL.format(match["illust_id"])
+
+    def uploaded(self, match):
+        return match.group()
+
+    def local_image(self, match):
+        """插图的本地链接，没有下载时为 None"""
+        if match.lastgroup == "uploaded":
+            return self.images.get(image_key("uploadedimage", match["upload_id"]))
+        return self.images.get(image_key("pixivimage", match["illust_id"], match["illust_page"]))
+
+
+class MarkdownRenderer(TextRenderer):
+    def begin(self, title):
+        cover = self.images.get("cover")
+        return f"# {title}\n\n" + (f"![cover]({cover})\n\n" if cover else "")
+
+    def toc(self, title, entries):
+        lines = "".join(f"{i}. [{name}](#{anchor})\n" for i, (anchor, name) in enumerate(entries, 1))
+        return f"# {title}\n\n{lines}\n"
+
+    def section(self, title, anchor):
+        super().section(title, anchor)
+        return f'<a id="{anchor}"></a>\n\n## {title}\n\n'
+
+    def newpage(self, match):
+        self.page += 1
+        # 前面留空行，避免 --- 把上一行变成标题
+        return "\n---\n" + line_end(match)
+
+    def chapter(self, match):
+        return f"## {self.inline(match['chapter_title'])}" + line_end(match)
+
+    def link(self, match):
+        text, url = match["link_text"], safe_url(match["link_url"])
+        return f"[{text or url}]({url})" if url else text
+
+    def image(self, match):
+        local = self.local_image(match)
+        if local:
+            return f"![pixivimage:{match['illust_id']}]({local})"
+        url = ARTWORK_URL.format(match["illust_id"])
+        return f"[pixivimage:{match['illust_id']}]({url})"
+
+    def uploaded(self, match):
+        local = self.local_image(match)
+        return f"![uploadedimage:{match['upload_id']}]({local})" if local else match.group()
+
+
+class HTMLRenderer(TextRenderer):
+    # 空元素的写法，XHTML 中为 <br/>
+    BR = "<br>"
+    VOID = ">"
+
+    def begin(self, title):
+        title = escape_html(title)
+        cover = self.images.get("cover")
+        cover = f'<img class="cover" src="{escape_html(cover)}" alt="cover">' if cover else ""
+        return (f'<html><head><meta charset="utf-8"><title>{title}</title></head>'
+                f'<body><h1>{title}</h1>{cover}<div id="page-1">')
+
+    def end(self):
+        return "</div></body></html>"
+
+    def toc(self, title, entries):
+        title = escape_html(title)
+        items = "".join(f'<li><a href="#{anchor}">{escape_html(name)}</a></li>' for anchor, name in entries)
+        return (f'<html><head><meta charset="utf-8"><title>{title}</title></head>'
+                f'<body><h1>{title}</h1><nav id="toc"><ol>{items}</ol></nav>')
+
+    def section(self, title, anchor):
+        super().section(title, anchor)
+        return f'<section id="{anchor}"><h2>{escape_html(title)}</h2><div id="{self.prefix}page-1">'
+
+    def section_end(self):
+        return "</div></section>"
+
+    def merged_end(self):
+        return "</body></html>"
+
+    def text(self, text):
+        return escape_html(text).replace("\n", self.BR + "\n")
+
+    def newpage(self, match):
+        self.page += 1
+        return f'</div><hr{self.VOID}<div id="{self.prefix}page-{self.page}">'
+
+    def chapter(self, match):
+        return f"<h2>{self.inline(match['chapter_title'])}</h2>"
+
+    def ruby(self, match):
+        return f"<ruby>{escape_html(match['ruby_base'])}<rt>{escape_html(match['ruby_text'])}</rt></ruby>"
+
+    def link(self, match):
+        text, url = escape_html(match["link_text"]), safe_url(match["link_url"])
+        if not url:
+            return text
+        url = escape_html(url)
+        return f'<a href="{url}">{text or url}</a>'
+
+    def jump(self, match):
+        page = match["jump_page"]
+        return f'<a href="#{self.prefix}page-{page}">→ P{page}</a>'
+
+    def image(self, match):
+        illust_id = match["illust_id"]
+        local = self.local_image(match)
+        if local:
+            return f'<img class="pixivimage" src="{escape_html(local)}" alt="pixivimage:{illust_id}"{self.VOID}'
+        return f'<a class="pixivimage" href="{ARTWORK_URL.format(illust_id)}">[pixivimage:{illust_id}]</a>'
+
+    def uploaded(self, match):
+        local = self.local_image(match)
+        if local:
+            return (f'<img class="uploadedimage" src="{escape_html(local)}" '
+                    f'alt="uploadedimage:{match["upload_id"]}"{self.VOID}')
+        return escape_html(match.group())
+
+
+class XHTMLRenderer(HTMLRenderer):
+    """EPUB 的章节文档：格式良好的 XHTML，封面由 EPUB 单独提供"""
+    BR = "<br/>"
+    VOID = "/>"
+
+    def begin(self, title):
+        title = escape_html(title)
+        return ('<?xml version="1.0" encoding="utf-8"?>\n<!DOCTYPE html>\n'
+                '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops">'
+                f'<head><title>{title}</title></head><body><h1>{title}</h1><div id="page-1">')
+
+
+RENDERERS = {
+    "TXT": TextRenderer,
+    "HTML": HTMLRenderer,
+    "Markdown": MarkdownRenderer,
+    "EPUB": XHTMLRenderer,
+}
+
+
+def iter_markup(content, renderer, chunk_chars=CHUNK_CHARS):
+    """一次扫描转换正文，按约 chunk_chars 个输入字符一块生成输出"""
+    text = renderer.text
+    handlers = {tag: getattr(renderer, tag) for tag in TAGS}
+    parts = []
+    size = 0
+    pos = 0
+    # 末尾的 None 用于输出最后一个标记之后的文本
+    for match in chain(TOKEN.finditer(content), (None,)):
+        start = len(content) if match is None else match.start()
+        # 标记之间的长文本按块切分；转义和换行替换都是逐字符的，在任意位置切开都不影响结果
+        while pos < start:
+            end = min(start, pos + chunk_chars - size)
+            parts.append(text(content[pos:end]))
+            size += end - pos
+            pos = end
+            if size >= chunk_chars:
+                yield "".join(parts)
+                parts = []
+                size = 0
+        if match is None:
+            break
+        parts.append(handlers[match.lastgroup](match))
+        pos = match.end()
+        size += pos - start
+        if size >= chunk_chars:
+            yield "".join(parts)
+            parts = []
+            size = 0
+    if parts:
+        yield "".join(parts)
@@ -0,0 +1,212 @@
+"""系列合并输出：整个系列按目录顺序写成一个 TXT / HTML / Markdown 文件
+
+章节在线程池中乱序完成。轮到的章节直接流式写入正文临时文件；提前完成的章节
+编码后暂存在内存中，暂存总量超过上限时写入系列目录中的溢出文件，轮到时再按
+顺序复制到正文。全部完成后，在正文前面加上标题和带锚点的目录，替换旧文件。
+"""
+import os
+import shutil
+import hashlib
+import logging
+import threading
+
+from .formats import novel_extension, safe_filename
+from .markup import RENDERERS, TextRenderer
+
+# 乱序章节在内存中暂存的上限（字节），超过时写入溢出文件
+DEFAULT_MERGE_MEMORY = 64 * 1024 * 1024
+
+
+def chapter_anchor(novel_id):
+    return f"chapter-{novel_id}"
+
+
+def merged_path(series_dir, series_title, file_format):
+    return os.path.join(series_dir, f"{safe_filename(series_title)}.{novel_extension(file_format)}")
+
+
+class MergedWriter:
+    """按系列顺序拼接章节的重排缓冲；add_chapter / skip 可以在多个线程中调用"""
+
+    def __init__(self, path, title, file_format="TXT", memory_limit=DEFAULT_MERGE_MEMORY):
+        self.path = path
+        self.title = title
+        self.file_format = file_format
+        self.memory_limit = max(0, int(memory_limit))
+        self._lock = threading.Lock()
+        self.order = []       # 系列顺序的小说ID，随目录逐页到达追加
+        self.next = 0         # 下一个要写入正文的位置
+        self.writing = False  # 有线程正在把轮到的章节直接写入正文
+        self.pending = {}     # 提前完成的章节: 小说ID -> (标题, [字节块] 或 None, 溢出文件, 字节数)
+        self.skipped = set()  # 下载失败、不会到达的章节
+        self.written = []     # 已写入正文的 [(小说ID, 标题)]
+        self.buffered = 0
+        self.stats = {"direct": 0, "buffered": 0, "spilled": 0, "peak": 0}
+        self.body_path = path + ".body.tmp"
+        self.body = open(self.body_path, "wb")
+
+    def extend(self, novel_ids):
+        """按系列顺序追加一页章节"""
+        with self._lock:
+            self.order.extend(novel_ids)
+            self._drain()
+
+    def skip(self, novel_id):
+        """章节下载失败，后面的章节不再等待它"""
+        with self._lock:
+            self.skipped.add(novel_id)
+            self._drain()
+
+    def add_chapter(self, novel_id, title, chunks):
+        """写入或暂存一章，返回与 content_hash 相同的 SHA-256"""
+        with self._lock:
+            direct = self._is_next(novel_id) and not self.writing
+            if direct:
+                self.writing = True
+        if direct:
+            return self._write_next(novel_id, title, chunks)
+
+        # 提前完成的章节在锁外编码；每块先在锁内从内存上限中预留，预留失败时这一章改写入溢出文件
+        digest = hashlib.sha256()
+        parts = []
+        size = 0
+        reserved = 0
+        spill = None
+        try:
+            for chunk in chunks:
+                data = chunk.encode("utf-8")
+                digest.update(data)
+                size += len(data)
+                if spill is None and not self._reserve(len(data)):
+                    spill = open(self.spill_path(novel_id), "wb")
+                    spill.writelines(parts)
+                    parts = []
+                    self._release(reserved)
+                    reserved = 0
+                if spill is None:
+                    parts.append(data)
+                    reserved += len(data)
+                else:
+                    spill.write(data)
+        except BaseException:
+            self._release(reserved)
+            raise
+        finally:
+            if spill is not None:
+                spill.close()
+        with self._lock:
+            if spill is not None:
+                self.stats["spilled"] += 1
+                parts = None
+            self.stats["buffered"] += 1
+            self.pending[novel_id] = (title, parts, spill is not None, size)
+            self._drain()
+        return digest.hexdigest()
+
+    def _reserve(self, size):
+        """从内存上限中预留 size 字节，超过上限时返回 False"""
+        with self._lock:
+            if self.buffered + size > self.memory_limit:
+                return False
+            self.buffered += size
+            self.stats["peak"] = max(self.stats["peak"], self.buffered)
+            return True
+
+    def _release(self, size):
+        if size:
+            with self._lock:
+                self.buffered -= size
+
+    def _is_next(self, novel_id):
+        return self.next < len(self.order) and self.order[self.next] == novel_id
+
+    def _write_next(self, novel_id, title, chunks):
+        """把轮到的章节直接写入正文（同一时间只有一个线程写）"""
+        digest = hashlib.sha256()
+        start = self.body.tell()
+        ok = False
+        try:
+            for chunk in chunks:
+                data = chunk.encode("utf-8")
+                digest.update(data)
+                self.body.write(data)
+            ok = True
+        finally:
+            with self._lock:
+                if ok:
+                    self.written.append((novel_id, title))
+                    self.stats["direct"] += 1
+                else:
+                    # 写到一半失败：截掉这一章已写入的部分，按失败的章节跳过
+                    self.body.seek(start)
+                    self.body.truncate()
+                    self.skipped.add(novel_id)
+                self.writing = False
+                self.next += 1
+                self._drain()
+        return digest.hexdigest()
+
+    def _drain(self):
+        """按顺序写入已经到达的章节，遇到还没到达的章节时停止（持有锁时调用）"""
+        if self.writing:
+            return
+        while self.next < len(self.order):
+            novel_id = self.order[self.next]
+            if novel_id in self.pending:
+                self._write_pending(novel_id)
+            elif novel_id not in self.skipped:
+                break
+            self.next += 1
+
+    def _write_pending(self, novel_id):
+        title, parts, spilled, size = self.pending.pop(novel_id)
+        if spilled:
+            path = self.spill_path(novel_id)
+            with open(path, "rb") as f:
+                shutil.copyfileobj(f, self.body)
+            os.remove(path)
+        else:
+            self.body.writelines(parts)
+            self.buffered -= size
+        self.written.append((novel_id, title))
+
+    def spill_path(self, novel_id):
+        return f"{self.path}.{novel_id}.spill"
+
+    def finish(self):
+        """写入仍在暂存中的章节，加上标题和目录生成最终文件并替换旧文件；返回文件中的章节数"""
+        with self._lock:
+            # 前面有章节既没有到达也没有记为失败时（例如中途中断），其余章节仍按顺序写入
+            for novel_id in [novel_id for novel_id in self.order if novel_id in self.pending]:
+                self._write_pending(novel_id)
+            self.body.close()
+            written = list(self.written)
+        if not written:
+            logging.warning(f"系列《{self.title}》没有可合并的章节，保留原有文件")
+            self.abort()
+            return 0
+
+        renderer = RENDERERS.get(self.file_format, TextRenderer)()
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(renderer.toc(self.title, [(chapter_anchor(novel_id), title)
+                                              for novel_id, title in written]).encode("utf-8"))
+            with open(self.body_path, "rb") as body:
+                shutil.copyfileobj(body, f)
+            f.write(renderer.merged_end().encode("utf-8"))
+        os.replace(tmp_path, self.path)
+        os.remove(self.body_path)
+        stats = self.stats
+        logging.info(f"合并文件保存成功: {self.path}, {len(written)} 章; 乱序暂存 {stats['buffered']} 章"
+                     f"（其中 {stats['spilled']} 章写入溢出文件）, 内存暂存峰值 {stats['peak'] / 1048576:.1f} MB")
+        return len(written)
+
+    def abort(self):
+        """放弃本次合并，删除临时文件，保留旧文件"""
+        with self._lock:
+            self.body.close()
+            spilled = [novel_id for novel_id, entry in self.pending.items() if entry[2]]
+            self.pending.clear()
+        for path in [self.body_path] + [self.spill_path(novel_id) for novel_id in spilled]:
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,222 @@
+"""热路径计时和指标导出
+
+- 按阶段累计耗时：connect（DNS + TCP + TLS）、ttfb（发出请求到收到响应头）、body（读取响应体）、
+  decode（JSON 解析）、format（生成格式化内容，包括写入时逐块生成的部分）、write（编码并写入临时文件、
+  归档、EPUB 或合并文件，不含生成内容的时间）、fsync（每批文件落盘和重命名）
+- 按状态码统计响应数，统计接收和写入的字节数
+- snapshot 为可以写成 JSON 的字典；render_prometheus 把快照转换为 Prometheus 文本格式，
+  MetricsServer 在后台线程中提供 /metrics
+"""
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PHASES = ("connect", "ttfb", "body", "decode", "format", "write", "fsync")
+# Prometheus 直方图的桶上限（秒）
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROMETHEUS_PREFIX = "pixiv_novel"
+
+
+class PhaseTimer:
+    """单个阶段的次数、总耗时、最大耗时和直方图"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * len(BUCKETS)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+
+    def snapshot(self):
+        return {"count": self.count, "seconds": round(self.total, 6),
+                "mean_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+                "max_ms": round(self.max * 1000, 3), "buckets": list(self.buckets)}
+
+
+class Metrics:
+    """线程安全的进程内指标"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.phases = {phase: PhaseTimer() for phase in PHASES}
+        self.statuses = {}
+        self.bytes = {"received": 0, "written": 0}
+
+    def observe(self, phase, seconds):
+        with self._lock:
+            timer = self.phases.get(phase)
+            if timer is None:
+                timer = self.phases[phase] = PhaseTimer()
+            timer.observe(seconds)
+
+    @contextmanager
+    def timer(self, phase):
+        """记录 with 块的耗时（出错时同样记录）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(phase, time.perf_counter() - start)
+
+    @contextmanager
+    def write_timer(self, chunks):
+        """with 块中迭代返回的 chunks 并写入：生成每块内容的耗时记为 format，其余耗时记为 write"""
+        formatting = 0.0
+
+        def timed():
+            nonlocal formatting
+            iterator = iter(chunks)
+            while True:
+                start = time.perf_counter()
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    formatting += time.perf_counter() - start
+                yield chunk
+
+        start = time.perf_counter()
+        try:
+            yield timed()
+        finally:
+            self.observe("format", formatting)
+            self.observe("write", time.perf_counter() - start - formatting)
+
+    def add_status(self, status):
+        with self._lock:
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def add_bytes(self, kind, count):
+        with self._lock:
+            self.bytes[kind] = self.bytes.get(kind, 0) + count
+
+    def snapshot(self):
+        with self._lock:
+            return {"phases": {phase: timer.snapshot() for phase, timer in self.phases.items()},
+                    "requests": {"total": sum(self.statuses.values()),
+                                 "by_status": {str(status): count for status, count in sorted(self.statuses.items())}},
+                    "bytes": dict(self.bytes)}
+
+    def log(self):
+        snap = self.snapshot()
+        phases = ", ".join(f"{phase} {timer['count']} 次 {timer['seconds']:.2f} 秒"
+                           for phase, timer in snap["phases"].items() if timer["count"])
+        if phases:
+            logging.info(f"阶段耗时: {phases}")
+        logging.info(f"请求状态码: {snap['requests']['by_status']}, 接收 {snap['bytes']['received'] / 1048576:.1f} MB, "
+                     f"写入 {snap['bytes']['written'] / 1048576:.1f} MB")
+
+
+def write_snapshot(path, snapshot):
+    """把快照写成 JSON（先写临时文件再替换）"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+    logging.info(f"指标快照已写入: {path}")
+
+
+def prometheus_line(name, value, labels=None):
+    label_text = "{" + ",".join(f'{key}="{val}"' for key, val in labels.items()) + "}" if labels else ""
+    return f"{PROMETHEUS_PREFIX}_{name}{label_text} {value}"
+
+
+def render_prometheus(snapshot):
+    """把 snapshot 转换为 Prometheus 文本格式：阶段为直方图，其他数值为计数器或仪表"""
+    lines = [f"# TYPE {PROMETHEUS_PREFIX}_phase_seconds histogram"]
+    for phase, timer in snapshot.get("phases", {}).items():
+        cumulative = 0
+        for bound, count in zip(BUCKETS, timer["buckets"]):
+            cumulative += count
+            lines.append(prometheus_line("phase_seconds_bucket", cumulative, {"phase": phase, "le": bound}))
+        lines.append(prometheus_line("phase_seconds_bucket", timer["count"], {"phase": phase, "le": "+Inf"}))
+        lines.append(prometheus_line("phase_seconds_sum", timer["seconds"], {"phase": phase}))
+        lines.append(prometheus_line("phase_seconds_count", timer["count"], {"phase": phase}))
+    lines.append(f"# TYPE {PROMETHEUS_PREFIX}_responses_total counter")
+    for status, count in snapshot.get("requests", {}).get("by_status", {}).items():
+        lines.append(prometheus_line("responses_total", count, {"status": status}))
+    lines.append(f"# TYPE {PROMETHEUS_PREFIX}_bytes_total counter")
+    for kind, count in snapshot.get("bytes", {}).items():
+        lines.append(prometheus_line("bytes_total", count, {"kind": kind}))
+    # 其他组件的统计（连接、缓存、重试、限速、写线程……）按 组件_字段 输出；字典字段作为标签
+    for section, values in snapshot.items():
+        if section in ("phases", "requests", "bytes") or not isinstance(values, dict):
+            continue
+        for key, value in values.items():
+            name = section if key == section else f"{section}_{key}"
+            if isinstance(value, dict):
+                for label, count in value.items():
+                    if isinstance(count, (int, float)):
+                        lines.append(prometheus_line(name, count, {"kind": label}))
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                lines.append(prometheus_line(name, value))
+    return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    source = None  # 返回快照字典的可调用对象
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        try:
+            body = render_prometheus(self.source()).encode("utf-8")
+        except Exception as e:
+            logging.error(f"生成指标失败: {str(e)}", exc_info=True)
+            self.send_error(500)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsServer:
+    """在后台线程中提供 Prometheus /metrics 端点；source 为返回快照字典的可调用对象"""
+
+    def __init__(self, source, port, host="127.0.0.1"):
+        handler = type("BoundMetricsHandler", (MetricsHandler,), {"source": staticmethod(source)})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name="metrics-server", daemon=True)
+        self.thread.start()
+        logging.info(f"指标端点: http://{host}:{self.server.server_address[1]}/metrics")
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+_shared_metrics = None
+_shared_lock = threading.Lock()
+
+
+def get_metrics():
+    """返回进程内共享的指标"""
+    global _shared_metrics
+    with _shared_lock:
+        if _shared_metrics is None:
+            _shared_metrics = Metrics()
+        return _shared_metrics
@@ -0,0 +1,132 @@
+"""所有请求共享的自适应令牌桶限速器
+
+正常情况下以 rate 个请求/秒发放令牌，最多积累 burst 个；
+遇到 HTTP 429/503 时速率减半并遵守 Retry-After，之后每连续成功
+RECOVERY_INTERVAL 次才把速率加回一点，慢慢恢复到配置值。
+同一个限速器可同时用于线程（acquire）和 asyncio（acquire_async）。
+"""
+import time
+import asyncio
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+
+# 默认每秒请求数和突发数
+DEFAULT_RATE = 5.0
+DEFAULT_BURST = 10
+# 被限流后的最低速率
+MIN_RATE = 0.2
+# 没有 Retry-After 时的暂停秒数
+DEFAULT_PAUSE = 5.0
+# 连续成功多少次后恢复一次速率，以及每次恢复的比例
+RECOVERY_INTERVAL = 20
+RECOVERY_STEP = 0.1
+
+THROTTLE_STATUS = (429, 503)
+
+
+def parse_retry_after(value):
+    """解析 Retry-After（秒数或HTTP日期），返回秒数；无法解析时返回 None"""
+    if not value:
+        return None
+    value = str(value).strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """线程安全的自适应令牌桶；rate <= 0 表示不限速"""
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST, min_rate=MIN_RATE):
+        self._lock = threading.Lock()
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self.min_rate = min(min_rate, self.max_rate) if self.max_rate > 0 else 0
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.successes = 0
+        # 统计
+        self.throttles = 0
+        self.waits = 0
+        self.waited = 0.0
+
+    def _reserve(self):
+        """预订一个令牌，返回需要等待的秒数（令牌可以透支，保证先到先得）"""
+        with self._lock:
+            now = time.monotonic()
+            if self.rate <= 0:
+                return max(0.0, self.blocked_until - now)
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            wait = max(wait, self.blocked_until - now)
+            if wait > 0:
+                self.waits += 1
+                self.waited += wait
+            return wait
+
+    def acquire(self):
+        """阻塞直到可以发出下一个请求"""
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """acquire 的 asyncio 版本"""
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def on_response(self, status_code, retry_after=None):
+        """根据响应状态调整速率：429/503 降速并暂停，成功则缓慢恢复"""
+        with self._lock:
+            if status_code in THROTTLE_STATUS:
+                self.throttles += 1
+                self.successes = 0
+                pause = parse_retry_after(retry_after)
+                pause = DEFAULT_PAUSE if pause is None else pause
+                self.blocked_until = max(self.blocked_until, time.monotonic() + pause)
+                if self.max_rate > 0:
+                    self.rate = max(self.min_rate, self.rate / 2)
+                    self.tokens = min(self.tokens, 0.0)
+                logging.warning(f"触发限流 HTTP {status_code}: 暂停 {pause:.1f} 秒, "
+                                f"速率降至 {self.rate:.2f} 请求/秒 (累计限流 {self.throttles} 次)")
+                return
+
+            if status_code < 400 and self.rate < self.max_rate:
+                self.successes += 1
+                if self.successes >= RECOVERY_INTERVAL:
+                    self.successes = 0
+                    self.rate = min(self.max_rate, self.rate + self.max_rate * RECOVERY_STEP)
+                    logging.info(f"限速恢复: 当前速率 {self.rate:.2f}/{self.max_rate:.2f} 请求/秒")
+
+    def snapshot(self):
+        with self._lock:
+            return {"rate": round(self.rate, 3), "max_rate": self.max_rate, "burst": self.burst,
+                    "throttles": self.throttles, "waits": self.waits, "waited_seconds": round(self.waited, 3)}
+
+    def log(self):
+        snap = self.snapshot()
+        logging.info(f"限速统计: 当前速率 {snap['rate']}/{snap['max_rate']} 请求/秒, 限流 {snap['throttles']} 次, "
+                     f"等待 {snap['waits']} 次共 {snap['waited_seconds']} 秒")
+
+
+_shared_limiter = None
+_shared_lock = threading.Lock()
+
+
+def get_limiter(rate=None, burst=None):
+    """返回进程内共享的限速器；首次调用时按参数创建"""
+    global _shared_limiter
+    with _shared_lock:
+        if _shared_limiter is None:
+            _shared_limiter = RateLimiter(DEFAULT_RATE if rate is None else rate,
+                                          DEFAULT_BURST if burst is None else burst)
+        return _shared_limiter
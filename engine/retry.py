@@ -0,0 +1,198 @@
+"""瞬时错误的重试策略：按错误类别设置次数，带上限的指数退避 + 随机抖动
+
+错误类别：
+    connection  连接失败、连接被重置、响应体中断
+    timeout     连接或读取超时
+    server      HTTP 5xx
+    throttled   HTTP 429（暂停由限速器负责，这里只负责重试）
+    decode      JSON 解析失败（通常是响应体被截断）
+其他错误（404、API 返回错误等）不重试。整个批量任务共享一个重试预算，
+预算用完后不再重试，避免在服务端故障时无限拖长任务。
+"""
+import sys
+import time
+import random
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+
+import requests
+
+from .errors import InvalidResponseError
+
+
+def loaded_aiohttp():
+    """已导入的 aiohttp 模块，没有导入时返回 None
+
+    aiohttp 导入很慢（约 0.2 秒），只有异步管线需要；没有导入它时也不会出现它的异常，
+    所以这里不主动导入。
+    """
+    return sys.modules.get("aiohttp")
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts, base_delay, max_delay):
+        self.max_attempts = max_attempts  # 包括第一次请求在内的最多尝试次数
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt):
+        """第 attempt 次重试（从 1 开始）前的等待：full jitter"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+
+DEFAULT_POLICIES = {
+    "connection": RetryPolicy(5, 1.0, 30.0),
+    "timeout": RetryPolicy(4, 2.0, 30.0),
+    "server": RetryPolicy(4, 2.0, 60.0),
+    "throttled": RetryPolicy(6, 5.0, 120.0),
+    "decode": RetryPolicy(3, 1.0, 10.0),
+}
+
+
+def http_status(exc):
+    """取出 requests / aiohttp HTTP 错误中的状态码"""
+    response = getattr(exc, "response", None)
+    if response is not None and getattr(response, "status_code", None) is not None:
+        return response.status_code
+    aiohttp = loaded_aiohttp()
+    if aiohttp is not None and isinstance(exc, aiohttp.ClientResponseError):
+        return exc.status
+    return None
+
+
+def classify(exc):
+    """返回错误类别，不可重试时返回 None"""
+    if isinstance(exc, InvalidResponseError):
+        return "decode"
+    status = http_status(exc)
+    if status is not None:
+        if status == 429:
+            return "throttled"
+        if status >= 500:
+            return "server"
+        return None
+    if isinstance(exc, (requests.exceptions.Timeout, asyncio.TimeoutError, TimeoutError)):
+        return "timeout"
+    if isinstance(exc, (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError,
+                        ConnectionError)):
+        return "connection"
+    aiohttp = loaded_aiohttp()
+    if aiohttp is not None and isinstance(exc, (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError)):
+        return "connection"
+    return None
+
+
+class RetryBudget:
+    """一个批量任务内所有请求共享的重试次数上限"""
+
+    # 自动预算：条目数的一半，至少 20 次
+    RATIO = 0.5
+    MINIMUM = 20
+
+    def __init__(self, limit, items=None):
+        self._lock = threading.Lock()
+        self.limit = limit
+        self.items = items  # 自动预算按其计算的条目数；None 表示固定上限
+        self.used = 0
+
+    @classmethod
+    def for_items(cls, count):
+        return cls(max(cls.MINIMUM, int(count * cls.RATIO)), items=count)
+
+    def add_items(self, count):
+        """批量条目逐个到达时增加自动预算；固定上限不变"""
+        if self.items is None:
+            return
+        with self._lock:
+            self.items += count
+            self.limit = max(self.MINIMUM, int(self.items * self.RATIO))
+
+    def take(self):
+        with self._lock:
+            if self.used >= self.limit:
+                return False
+            self.used += 1
+            return True
+
+
+class Retrier:
+    """按类别重试函数调用；budget 为 None 时不限制总次数"""
+
+    def __init__(self, policies=None, budget=None):
+        self.policies = dict(DEFAULT_POLICIES, **(policies or {}))
+        self.budget = budget
+        self._lock = threading.Lock()
+        self.retries = {}
+        self.exhausted = 0
+
+    @contextmanager
+    def budget_scope(self, count, limit=None):
+        """为一个批量任务设置重试预算；嵌套调用（批量中的系列）沿用外层预算"""
+        if self.budget is not None:
+            yield self.budget
+            return
+        self.budget = RetryBudget(limit) if limit is not None else RetryBudget.for_items(count)
+        try:
+            yield self.budget
+        finally:
+            self.budget = None
+
+    def next_delay(self, exc, attempt):
+        """决定是否重试：返回等待秒数，不重试时返回 None"""
+        category = classify(exc)
+        if category is None:
+            return None
+        policy = self.policies[category]
+        if attempt >= policy.max_attempts:
+            return None
+        budget = self.budget
+        if budget is not None and not budget.take():
+            with self._lock:
+                self.exhausted += 1
+            logging.warning(f"重试预算已用完 ({budget.used}/{budget.limit})，不再重试: {str(exc)}")
+            return None
+        delay = policy.delay(attempt)
+        with self._lock:
+            self.retries[category] = self.retries.get(category, 0) + 1
+        logging.warning(f"请求失败 [{category}]，{delay:.1f} 秒后进行第 {attempt} 次重试: {str(exc)}")
+        return delay
+
+    def call(self, func, *args, **kwargs):
+        attempt = 1
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                delay = self.next_delay(e, attempt)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+            attempt += 1
+
+    async def call_async(self, func, *args, **kwargs):
+        """func 为协程函数"""
+        attempt = 1
+        while True:
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                delay = self.next_delay(e, attempt)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def snapshot(self):
+        with self._lock:
+            snap = {"retries": dict(self.retries), "budget_exhausted": self.exhausted}
+        if self.budget is not None:
+            snap["budget_used"] = self.budget.used
+            snap["budget_limit"] = self.budget.limit
+        return snap
+
+    def log(self):
+        snap = self.snapshot()
+        total = sum(snap["retries"].values())
+        logging.info(f"重试统计: 共 {total} 次 {snap['retries']}, 预算耗尽 {snap['budget_exhausted']} 次")
@@ -0,0 +1,138 @@
+"""共享的 HTTP 会话层：连接池、keep-alive、默认请求头和压缩
+
+所有 PixivAPI 实例默认共用同一个 requests.Session，避免每个请求都重新
+进行 TCP + TLS 握手。ConnectionStats 统计新建连接与复用连接的数量。
+"""
+import time
+import logging
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from .metrics import get_metrics
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+    "Referer": "https://www.pixiv.net/",
+    "Accept": "application/json",
+    "Accept-Encoding": "gzip, deflate",
+    "Connection": "keep-alive",
+}
+
+# 每个主机保持的最大连接数，应不小于并发下载线程数
+DEFAULT_POOL_SIZE = 16
+# (连接超时, 读取超时)，单位秒
+DEFAULT_TIMEOUT = (10, 60)
+
+
+class ConnectionStats:
+    """线程安全的连接计数：请求数、新建连接数，复用数 = 请求数 - 新建连接数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+
+    def add_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def add_connection(self):
+        with self._lock:
+            self.new_connections += 1
+
+    @property
+    def reused(self):
+        return max(0, self.requests - self.new_connections)
+
+    def snapshot(self):
+        with self._lock:
+            return {"requests": self.requests, "new_connections": self.new_connections,
+                    "reused": max(0, self.requests - self.new_connections)}
+
+    def log(self, label="HTTP"):
+        snap = self.snapshot()
+        ratio = snap["reused"] / snap["requests"] * 100 if snap["requests"] else 0
+        logging.info(f"{label} 连接统计: 请求 {snap['requests']}, 新建连接 {snap['new_connections']}, "
+                     f"复用 {snap['reused']} ({ratio:.1f}%)")
+
+
+def timed_connection(base, metrics):
+    """生成记录建立连接耗时（DNS + TCP + TLS）的连接类"""
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return base.connect(self)
+        finally:
+            metrics.observe("connect", time.perf_counter() - start)
+    return type(f"Timed{base.__name__}", (base,), {"connect": connect})
+
+
+def counting_pool(base, stats, metrics):
+    """生成在新建连接时计数的连接池类"""
+    def _new_conn(self):
+        stats.add_connection()
+        return base._new_conn(self)
+    return type(f"Counting{base.__name__}", (base,), {"_new_conn": _new_conn,
+                                                       "ConnectionCls": timed_connection(base.ConnectionCls, metrics)})
+
+
+class PooledAdapter(HTTPAdapter):
+    """带连接计数和计时的 HTTPAdapter"""
+
+    def __init__(self, stats, pool_size=DEFAULT_POOL_SIZE):
+        self.stats = stats
+        self.pool_size = pool_size
+        self.metrics = get_metrics()
+        super().__init__(pool_connections=4, pool_maxsize=pool_size)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": counting_pool(HTTPConnectionPool, self.stats, self.metrics),
+            "https": counting_pool(HTTPSConnectionPool, self.stats, self.metrics),
+        }
+
+    def send(self, request, **kwargs):
+        """流式请求在收到响应头时返回，耗时记为 ttfb（新建连接时包含建立连接的时间）"""
+        self.stats.add_request()
+        start = time.perf_counter()
+        response = super().send(request, **kwargs)
+        self.metrics.observe("ttfb", time.perf_counter() - start)
+        self.metrics.add_status(response.status_code)
+        return response
+
+
+def create_session(pool_size=DEFAULT_POOL_SIZE, headers=None):
+    """创建带连接池和统计的 Session，session.stats 为 ConnectionStats"""
+    session = requests.Session()
+    session.headers.update(headers or HEADERS)
+    session.stats = ConnectionStats()
+    mount_pool(session, pool_size)
+    logging.debug(f"创建HTTP会话: 连接池大小 {pool_size}")
+    return session
+
+
+def mount_pool(session, pool_size):
+    """为 session 挂载新的 PooledAdapter；已发出的请求继续使用原来的连接池，统计共用 session.stats"""
+    adapter = PooledAdapter(session.stats, pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+
+_shared_session = None
+_shared_lock = threading.Lock()
+
+
+def get_session(pool_size=None):
+    """返回进程内共享的 Session；首次调用时按 pool_size 创建，之后要求更大的连接池时换用更大的适配器"""
+    global _shared_session
+    with _shared_lock:
+        if _shared_session is None:
+            _shared_session = create_session(pool_size or DEFAULT_POOL_SIZE)
+        elif pool_size and pool_size > _shared_session.get_adapter("https://").pool_size:
+            mount_pool(_shared_session, pool_size)
+            logging.info(f"HTTP连接池扩大到 {pool_size}")
+        return _shared_session
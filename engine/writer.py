@@ -0,0 +1,221 @@
+"""后台写文件线程：下载线程只把要写的文件放入有界队列，不等待磁盘
+
+- 每个文件先写入同目录下唯一的隐藏临时文件，完成后原子重命名；最终文件名下不会出现写了一半的文件，
+  同一批中目标路径相同的文件也不会共用临时文件
+- 写线程一次取出队列中已有的多个文件：全部写完后再逐个 fsync、重命名，最后每个目录 fsync 一次，
+  慢速磁盘（NAS）上多个文件共用一次等待
+- 目录在第一次写入时创建，之后不再检查
+- 队列中的文件数或正文总字符数达到上限时 write 等待（背压），避免下载远快于磁盘时堆积过多待写的正文
+- 内容只在写线程中生成一遍，写入时同时计算 SHA-256，通过 write 返回的 Future 交给调用方
+"""
+import os
+import time
+import queue
+import hashlib
+import logging
+import itertools
+import threading
+from concurrent.futures import Future
+
+from .metrics import get_metrics
+# 等待写入的文件数上限
+DEFAULT_QUEUE_SIZE = 64
+# 等待写入的正文总字符数上限；单个更大的正文在队列为空时仍可放入
+DEFAULT_QUEUE_CHARS = 32 * 1024 * 1024
+# 每批最多写入的文件数
+DEFAULT_BATCH_SIZE = 32
+
+
+_temp_ids = itertools.count()
+
+
+def open_temp(path):
+    """在目标目录中创建唯一的隐藏临时文件，返回 (临时路径, 文件对象)
+
+    与 tempfile.mkstemp 一样以 O_EXCL 创建，但权限按 umask 设置，重命名后与直接创建的文件相同。
+    """
+    directory, name = os.path.split(path)
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+    while True:
+        tmp_path = os.path.join(directory, f".{name}.{os.getpid()}-{next(_temp_ids)}.tmp")
+        try:
+            fd = os.open(tmp_path, flags, 0o666)
+        except FileExistsError:
+            continue
+        return tmp_path, os.fdopen(fd, "wb")
+
+
+def write_error(written):
+    """written 为 write 返回的 Future（没有交给写线程时为 None）；写入失败时返回错误信息，否则返回 None
+
+    在 close 之后调用，此时 Future 都已完成。
+    """
+    if written is None:
+        return None
+    error = written.exception()
+    return None if error is None else str(error)
+
+
+def fsync_directory(directory):
+    """使目录中的重命名落盘；Windows 不支持打开目录，跳过"""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(directory or ".", os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class FileWriter:
+    """单个后台线程按批写入文件；线程在第一次写入时启动，close 后退出"""
+
+    def __init__(self, queue_size=DEFAULT_QUEUE_SIZE, batch_size=DEFAULT_BATCH_SIZE, fsync=True,
+                 queue_chars=DEFAULT_QUEUE_CHARS):
+        self.queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self.batch_size = max(1, int(batch_size))
+        self.fsync = fsync
+        self.queue_chars = max(1, int(queue_chars))
+        self._queued_chars = 0
+        self._space = threading.Condition()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._directories = set()  # 已经确认存在的目录
+        self.stats = {"files": 0, "batches": 0, "failed": 0}
+        self.metrics = get_metrics()
+
+    def write(self, path, chunks, size=0):
+        """把文件交给写线程，返回 Future：文件重命名到最终路径后得到内容的 SHA-256，写入失败时为异常（见 write_error）
+
+        chunks 为返回逐块字符串的可调用对象，在写线程中调用；size 为正文的大致字符数，用于限制队列占用的内存。
+        """
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run, name="file-writer", daemon=True)
+                self._thread.start()
+        with self._space:
+            self._space.wait_for(lambda: not self._queued_chars or self._queued_chars + size <= self.queue_chars)
+            self._queued_chars += size
+        future = Future()
+        self.queue.put((path, chunks, size, future))
+        return future
+
+    def run(self):
+        stop = False
+        while not stop:
+            item = self.queue.get()
+            batch = []
+            # 取出队列中已有的其他文件，一起写入和 fsync；None 表示 close
+            while True:
+                if item is None:
+                    stop = True
+                else:
+                    batch.append(item)
+                if stop or len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            try:
+                if batch:
+                    self.write_batch(batch)
+            except Exception as e:
+                logging.error(f"写文件线程出错: {str(e)}", exc_info=True)
+                for _, _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                with self._space:
+                    self._queued_chars -= sum(size for _, _, size, _ in batch)
+                    self._space.notify_all()
+                for _ in range(len(batch) + stop):
+                    self.queue.task_done()
+                # 等待下一批时不再引用已写入的正文
+                item = batch = None
+
+    def write_batch(self, batch):
+        """写入一批文件：全部写入临时文件 -> 逐个 fsync 并重命名 -> 每个目录 fsync 一次 -> 通知调用方"""
+        staged = []
+        for path, chunks, _, future in batch:
+            tmp_path = f = None
+            try:
+                with self.metrics.write_timer(chunks()) as timed:
+                    self.ensure_directory(os.path.dirname(path))
+                    tmp_path, f = open_temp(path)
+                    digest = hashlib.sha256()
+                    size = 0
+                    for chunk in timed:
+                        data = chunk.encode("utf-8")
+                        digest.update(data)
+                        size += len(data)
+                        f.write(data)
+                staged.append((path, tmp_path, f, digest.hexdigest(), future))
+                self.metrics.add_bytes("written", size)
+            except Exception as e:
+                if f is not None:
+                    f.close()
+                self.fail(path, tmp_path, e, future)
+        start = time.perf_counter()
+        directories = set()
+        replaced = []
+        for path, tmp_path, f, sha256, future in staged:
+            try:
+                try:
+                    if self.fsync:
+                        f.flush()
+                        os.fsync(f.fileno())
+                finally:
+                    f.close()
+                os.replace(tmp_path, path)
+                directories.add(os.path.dirname(path))
+                replaced.append((future, sha256))
+            except OSError as e:
+                self.fail(path, tmp_path, e, future)
+        if self.fsync:
+            for directory in directories:
+                try:
+                    fsync_directory(directory)
+                except OSError as e:
+                    logging.warning(f"目录 fsync 失败: {directory}: {str(e)}")
+        if staged:
+            self.metrics.observe("fsync", time.perf_counter() - start)
+        for future, sha256 in replaced:
+            future.set_result(sha256)
+        written = len(replaced)
+        with self._lock:
+            self.stats["files"] += written
+            self.stats["batches"] += 1
+        logging.debug("写入 %d/%d 个文件", written, len(batch))
+
+    def ensure_directory(self, directory):
+        if not directory or directory in self._directories:
+            return
+        if not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+            logging.info(f"创建下载目录: {directory}")
+        self._directories.add(directory)
+
+    def fail(self, path, tmp_path, error, future):
+        logging.error(f"文件写入失败: {path}: {str(error)}")
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        with self._lock:
+            self.stats["failed"] += 1
+        future.set_exception(error)
+
+    def close(self):
+        """等待队列中的文件全部写完，结束写线程（下次 write 时重新启动）"""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None:
+            self.queue.put(None)
+            thread.join()
+
+    def log(self):
+        with self._lock:
+            stats = dict(self.stats)
+        if stats["batches"]:
+            logging.info(f"写文件统计: {stats['files']} 个文件, {stats['batches']} 批"
+                         f"{', 按批 fsync' if self.fsync else ''}, 失败 {stats['failed']}")